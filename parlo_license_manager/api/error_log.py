@@ -0,0 +1,46 @@
+import threading
+from contextlib import contextmanager
+
+import frappe
+
+
+class DeferredErrorLog:
+    """
+    Error logging for API clients shared by worker threads
+    frappe.log_error inserts through the request's database connection,
+    which is not thread-safe. Inside defer_errors() errors are kept and
+    written from the calling thread when the block exits.
+    """
+
+    def _init_error_log(self):
+        self._error_lock = threading.Lock()
+        self._deferring = 0
+        self._deferred_errors = []
+
+    @contextmanager
+    def defer_errors(self):
+        with self._error_lock:
+            self._deferring += 1
+        try:
+            yield self
+        finally:
+            with self._error_lock:
+                self._deferring -= 1
+                deferring = self._deferring
+            if not deferring:
+                self.flush_errors()
+
+    def log_error(self, message, title):
+        with self._error_lock:
+            if self._deferring:
+                self._deferred_errors.append((message, title))
+                return
+        frappe.log_error(message, title)
+
+    def flush_errors(self):
+        """Write the deferred errors; call from the thread owning the connection"""
+        with self._error_lock:
+            errors, self._deferred_errors = self._deferred_errors, []
+
+        for message, title in errors:
+            frappe.log_error(message, title)
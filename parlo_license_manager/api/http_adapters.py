@@ -0,0 +1,38 @@
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+from parlo_license_manager.api.http_session import _record
+
+# Connection pools of the shared session, kept apart from api.http_session
+# so requests / urllib3 load on first use instead of at import time
+
+
+class _CountingPoolMixin:
+    """Count connection checkouts and new connections per host"""
+
+    def _get_conn(self, timeout=None):
+        _record(self.host, "requests")
+        return super()._get_conn(timeout=timeout)
+
+    def _new_conn(self):
+        _record(self.host, "misses")
+        return super()._new_conn()
+
+
+class CountingHTTPConnectionPool(_CountingPoolMixin, HTTPConnectionPool):
+    pass
+
+
+class CountingHTTPSConnectionPool(_CountingPoolMixin, HTTPSConnectionPool):
+    pass
+
+
+class PooledHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter whose connection pools report hit/miss counters"""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": CountingHTTPConnectionPool,
+            "https": CountingHTTPSConnectionPool,
+        }
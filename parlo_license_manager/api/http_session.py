@@ -0,0 +1,106 @@
+import os
+import threading
+
+import frappe
+
+# Process-wide pooled session shared by ParloAPI and MillionVerifierAPI.
+# requests is only imported when the first session is built (see
+# api.http_adapters), so importing this module stays cheap.
+# Pool sizing can be tuned from site_config.json:
+#   parlo_http_pool_connections - number of per-host pools kept alive
+#   parlo_http_pool_maxsize     - keep-alive connections kept per host
+#   parlo_http_pool_block       - block instead of opening extra connections
+#                                 once a host reaches pool_maxsize
+DEFAULT_POOL_CONNECTIONS = 10
+DEFAULT_POOL_MAXSIZE = 20
+
+_session = None
+_session_pid = None
+_session_lock = threading.Lock()
+
+_stats = {}
+_stats_lock = threading.Lock()
+
+
+def _record(host, key):
+    with _stats_lock:
+        host_stats = _stats.setdefault(host, {"requests": 0, "hits": 0, "misses": 0})
+        host_stats[key] += 1
+
+
+def _build_session():
+    import requests
+    from parlo_license_manager.api.http_adapters import PooledHTTPAdapter
+
+    pool_connections = int(frappe.conf.get("parlo_http_pool_connections") or DEFAULT_POOL_CONNECTIONS)
+    pool_maxsize = int(frappe.conf.get("parlo_http_pool_maxsize") or DEFAULT_POOL_MAXSIZE)
+    pool_block = bool(frappe.conf.get("parlo_http_pool_block"))
+
+    adapter = PooledHTTPAdapter(
+        pool_connections=pool_connections,
+        pool_maxsize=pool_maxsize,
+        pool_block=pool_block
+    )
+
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers["Connection"] = "keep-alive"
+    return session
+
+
+def get_session():
+    """
+    Get the process-wide keep-alive session
+    A new session is built after fork so workers never share sockets
+    """
+    global _session, _session_pid
+
+    pid = os.getpid()
+    if _session is not None and _session_pid == pid:
+        return _session
+
+    with _session_lock:
+        if _session is None or _session_pid != pid:
+            _session = _build_session()
+            _session_pid = pid
+            with _stats_lock:
+                _stats.clear()
+
+    return _session
+
+
+def reset_session():
+    """Close the pooled session so the next call rebuilds it with fresh settings"""
+    global _session, _session_pid
+
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+        _session = None
+        _session_pid = None
+
+
+def get_pool_stats():
+    """
+    Get connection reuse counters for this process
+    Returns: dict of host -> requests, hits (reused), misses (new connections)
+    """
+    with _stats_lock:
+        stats = {host: dict(values) for host, values in _stats.items()}
+
+    for values in stats.values():
+        values["hits"] = max(0, values["requests"] - values["misses"])
+        values["hit_ratio"] = round(values["hits"] / values["requests"], 4) if values["requests"] else 0
+
+    return stats
+
+
+@frappe.whitelist()
+def get_http_pool_stats():
+    """Expose HTTP connection pool counters for monitoring"""
+    frappe.only_for("System Manager")
+    return {
+        "pid": os.getpid(),
+        "hosts": get_pool_stats()
+    }
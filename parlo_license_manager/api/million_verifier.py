@@ -1,24 +1,228 @@
 import frappe
-import requests
+import csv
+import io
+import json
+import threading
+import time
+from contextlib import contextmanager
+from datetime import timedelta
 from urllib.parse import quote
+from parlo_license_manager.api import resilience
+from parlo_license_manager.api.error_log import DeferredErrorLog
+from parlo_license_manager.api.http_session import get_session
+from parlo_license_manager.utils.email_prefilter import email_key
 
-class MillionVerifierAPI:
+# Verification results are stored in Parlo Email Verification and fronted
+# by Redis. How long a result is trusted depends on the result; override
+# per result with million_verifier_cache_ttl in site_config.json, e.g.
+# {"million_verifier_cache_ttl": {"ok": 2592000, "unknown": 3600}}
+VERIFICATION_DOCTYPE = "Parlo Email Verification"
+VERIFICATION_CACHE_PREFIX = "million_verifier"
+VERIFICATION_TTL = {
+    "ok": 90 * 24 * 60 * 60,
+    "disposable": 90 * 24 * 60 * 60,
+    "invalid": 30 * 24 * 60 * 60,
+    "catch_all": 7 * 24 * 60 * 60,
+    "unknown": 24 * 60 * 60,
+}
+LOOKUP_CHUNK = 500
+
+# Bulk (file based) verification. Both endpoints can be pointed elsewhere
+# with million_verifier_url / million_verifier_bulk_url, e.g. at the local
+# stand-in server in parlo_license_manager.benchmarks.stand_in
+BULK_API_URL = "https://bulkapi.millionverifier.com/bulkapi/v2/"
+BULK_POLL_INTERVAL = 5
+BULK_TIMEOUT = 30 * 60
+
+def _cache_key(email):
+    return f"{VERIFICATION_CACHE_PREFIX}:{email_key(email)}"
+
+def get_verification_ttl(result):
+    """Seconds a verification result stays valid, or None if it is not stored"""
+    ttl = dict(VERIFICATION_TTL, **(frappe.conf.get("million_verifier_cache_ttl") or {}))
+    return ttl.get(result)
+
+def _to_verification(data):
+    """Shape returned by verify_email for a raw Million Verifier payload"""
+    return {
+        "valid": data.get("result") in ["ok", "valid"],
+        "result": data.get("result"),
+        "data": data
+    }
+
+def load_verifications(emails):
+    """
+    Load unexpired stored verifications for many emails
+    Returns: dict of normalized email -> verify_email style result
+    """
+    found = {}
+    emails = list({email_key(e) for e in emails if e})
+    now = frappe.utils.now()
+
+    for i in range(0, len(emails), LOOKUP_CHUNK):
+        chunk = emails[i:i + LOOKUP_CHUNK]
+        rows = frappe.db.sql(f"""
+            SELECT name, payload, expires_on
+            FROM `tab{VERIFICATION_DOCTYPE}`
+            WHERE name IN ({', '.join(['%s'] * len(chunk))})
+            AND expires_on > %s
+        """, (*chunk, now), as_dict=True)
+
+        for row in rows:
+            try:
+                found[row.name] = _to_verification(json.loads(row.payload or "{}"))
+            except ValueError:
+                continue
+
+    return found
+
+def save_verifications(verifications):
+    """
+    Persist verification payloads, replacing any stored result
+    verifications: dict of email -> raw Million Verifier payload
+    """
+    now = frappe.utils.now_datetime()
+    user = frappe.session.user
+    rows = {}
+
+    for email, data in verifications.items():
+        email = email_key(email)
+        ttl = get_verification_ttl(data.get("result"))
+        if not email or not ttl:
+            continue
+
+        rows[email] = [
+            email, now, now, user, user, 0,
+            email, data.get("result"), 1 if _to_verification(data)["valid"] else 0,
+            now, now + timedelta(seconds=ttl), json.dumps(data)
+        ]
+
+    if not rows:
+        return 0
+
+    names = list(rows)
+    for i in range(0, len(names), LOOKUP_CHUNK):
+        chunk = names[i:i + LOOKUP_CHUNK]
+        frappe.db.sql(f"""
+            DELETE FROM `tab{VERIFICATION_DOCTYPE}`
+            WHERE name IN ({', '.join(['%s'] * len(chunk))})
+        """, tuple(chunk))
+
+    frappe.db.bulk_insert(
+        VERIFICATION_DOCTYPE,
+        ["name", "creation", "modified", "owner", "modified_by", "docstatus",
+         "email", "result", "valid", "verified_on", "expires_on", "payload"],
+        list(rows.values()),
+        chunk_size=LOOKUP_CHUNK
+    )
+    return len(rows)
+
+def purge_expired_verifications():
+    """Scheduled: delete stored verifications past their expiry"""
+    frappe.db.sql(f"DELETE FROM `tab{VERIFICATION_DOCTYPE}` WHERE expires_on <= %s", frappe.utils.now())
+    frappe.db.commit()
+
+class MillionVerifierAPI(DeferredErrorLog):
     """Handler for Million Verifier email validation API"""
-    
+
     def __init__(self):
         # Try to get from Parlo Settings first, then fall back to site config
         settings = None
         if frappe.db.exists("Singles", "Parlo Settings"):
             settings = frappe.get_single("Parlo Settings")
-        
-        self.base_url = "https://api.millionverifier.com/api/v3/"
+
+        self.base_url = frappe.conf.get("million_verifier_url") or "https://api.millionverifier.com/api/v3/"
         self.api_key = settings.million_verifier_api_key if settings else frappe.conf.get("million_verifier_api_key", "OzXxxxxxxxxxxES")
-    
-    def verify_email(self, email):
+        self.bulk_url = frappe.conf.get("million_verifier_bulk_url") or BULK_API_URL
+
+        # Batch state, see batch(); one instance is shared by the validation threads
+        self._lock = threading.Lock()
+        self._in_batch = False
+        self._known = {}
+        self._unsaved = {}
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self._init_error_log()
+
+    @contextmanager
+    def batch(self, emails):
+        """
+        Verify many emails with one store lookup and one store write
+        Stored results are loaded up front; inside the block verify_email
+        does not touch the database, so it is safe from worker threads.
+        New results are persisted from the calling thread on exit.
+        """
+        self._known = load_verifications(emails)
+        self._in_batch = True
+        try:
+            yield self
+        finally:
+            self._in_batch = False
+            self._known = {}
+            self.flush()
+
+    def flush(self):
+        """Persist results verified inside a batch"""
+        with self._lock:
+            unsaved, self._unsaved = self._unsaved, {}
+
+        if unsaved:
+            try:
+                save_verifications(unsaved)
+                frappe.db.commit()
+            except Exception as e:
+                self.log_error(f"Million Verifier store error: {str(e)}", "Email Validation")
+
+    def get_stored(self, email):
+        """Stored verification for email from the batch, Redis or the database"""
+        email = email_key(email)
+        if email in self._known:
+            return self._known[email]
+
+        cached = frappe.cache().get_value(_cache_key(email))
+        if cached:
+            return cached
+
+        if not self._in_batch:
+            return load_verifications([email]).get(email)
+
+        return None
+
+    def store(self, email, data):
+        """Record a fresh verification payload in Redis and the store"""
+        ttl = get_verification_ttl(data.get("result"))
+        if not ttl:
+            return
+
+        frappe.cache().set_value(_cache_key(email), _to_verification(data), expires_in_sec=ttl)
+
+        if self._in_batch:
+            with self._lock:
+                self._unsaved[email_key(email)] = data
+        else:
+            try:
+                save_verifications({email: data})
+            except Exception as e:
+                self.log_error(f"Million Verifier store error: {str(e)}", "Email Validation")
+
+    def verify_email(self, email, use_cache=True):
         """
         Verify if email is valid
+        Stored results are returned without spending an API credit
         Returns: dict with validation result
         """
+        import requests
+
+        if use_cache:
+            stored = self.get_stored(email)
+            with self._lock:
+                if stored:
+                    self.cache_hits += 1
+                else:
+                    self.cache_misses += 1
+            if stored:
+                return dict(stored, cached=True)
+
         try:
             url = self.base_url
             params = {
@@ -26,31 +230,151 @@ class MillionVerifierAPI:
                 "email": email,
                 "timeout": 10
             }
-            
-            response = requests.get(url, params=params, timeout=15)
-            
+
+            # Each check spends a credit, so it is not retried
+            response = resilience.call("million_verifier", lambda: get_session().get(url, params=params, timeout=15))
+
             if response.status_code == 200:
                 data = response.json()
-                return {
-                    "valid": data.get("result") in ["ok", "valid"],
-                    "result": data.get("result"),
-                    "data": data
-                }
+                self.store(email, data)
+                return _to_verification(data)
             else:
                 return {
                     "valid": False,
                     "error": f"API returned status {response.status_code}"
                 }
-                
+
+        except resilience.ResilienceError as e:
+            return {"valid": False, "error": str(e)}
         except requests.exceptions.Timeout:
-            frappe.log_error("Million Verifier timeout", "Email Validation")
+            self.log_error("Million Verifier timeout", "Email Validation")
             return {"valid": False, "error": "Validation timeout - treating as valid for now"}
         except Exception as e:
-            frappe.log_error(f"Million Verifier error: {str(e)}", "Email Validation")
+            self.log_error(f"Million Verifier error: {str(e)}", "Email Validation")
             return {"valid": False, "error": str(e)}
 
+    def submit_bulk(self, emails):
+        """
+        Upload emails as one bulk verification file
+        Returns: file_id of the bulk job
+        """
+        content = "\n".join(emails).encode("utf-8")
+        response = resilience.call("million_verifier_bulk", lambda: get_session().post(
+            f"{self.bulk_url}upload",
+            params={"key": self.api_key},
+            files={"file_contents": ("emails.txt", content, "text/plain")},
+            timeout=60
+        ))
+        response.raise_for_status()
+
+        data = response.json()
+        if not data.get("file_id"):
+            raise Exception(data.get("error") or "Bulk upload was not accepted")
+        return data["file_id"]
+
+    def get_bulk_status(self, file_id):
+        """Status of a bulk job (in_progress, finished, canceled or error)"""
+        response = resilience.call("million_verifier_bulk", lambda: get_session().get(
+            f"{self.bulk_url}fileinfo",
+            params={"key": self.api_key, "file_id": file_id},
+            timeout=15
+        ), idempotent=True)
+        response.raise_for_status()
+        return response.json()
+
+    def download_bulk_results(self, file_id):
+        """
+        Fetch the results of a finished bulk job
+        Returns: dict of normalized email -> raw result row
+        """
+        response = resilience.call("million_verifier_bulk", lambda: get_session().get(
+            f"{self.bulk_url}download",
+            params={"key": self.api_key, "file_id": file_id, "filter": "all"},
+            timeout=60
+        ), idempotent=True)
+        response.raise_for_status()
+
+        results = {}
+        for row in csv.DictReader(io.StringIO(response.content.decode("utf-8-sig"))):
+            row = {(k or "").strip().lower(): (v or "").strip() for k, v in row.items()}
+            if row.get("email"):
+                results[email_key(row["email"])] = row
+        return results
+
+    def verify_emails_bulk(self, emails, poll_interval=None, timeout=None):
+        """
+        Verify many emails with a single bulk job
+        Stored results are reused; the rest are submitted as one file and
+        polled until finished. Returns: dict of normalized email ->
+        verify_email style result. Raises if the job fails or times out.
+        Blocks for up to BULK_TIMEOUT, so only call it from background jobs.
+        """
+        emails = list(dict.fromkeys(email_key(e) for e in emails if e))
+
+        # One store lookup up front and one write for the new results
+        with self.batch(emails):
+            return self._verify_emails_bulk(emails, poll_interval, timeout)
+
+    def _verify_emails_bulk(self, emails, poll_interval=None, timeout=None):
+        results = {}
+        pending = []
+
+        for email in emails:
+            stored = self.get_stored(email)
+            if stored:
+                results[email] = dict(stored, cached=True)
+            else:
+                pending.append(email)
+
+        with self._lock:
+            self.cache_hits += len(results)
+            self.cache_misses += len(pending)
+
+        if not pending:
+            return results
+
+        poll_interval = poll_interval or frappe.conf.get("million_verifier_bulk_poll_interval") or BULK_POLL_INTERVAL
+        timeout = timeout or frappe.conf.get("million_verifier_bulk_timeout") or BULK_TIMEOUT
+
+        file_id = self.submit_bulk(pending)
+        deadline = time.monotonic() + timeout
+
+        while True:
+            status = self.get_bulk_status(file_id).get("status")
+            if status == "finished":
+                break
+            if status in ("canceled", "error"):
+                raise Exception(f"Bulk verification {file_id} ended with status {status}")
+            if time.monotonic() >= deadline:
+                raise Exception(f"Bulk verification {file_id} did not finish in {timeout}s")
+            time.sleep(poll_interval)
+
+        rows = self.download_bulk_results(file_id)
+        for email in pending:
+            data = rows.get(email)
+            if not data:
+                results[email] = {"valid": False, "error": "Missing from bulk verification results"}
+                continue
+
+            self.store(email, data)
+            results[email] = _to_verification(data)
+
+        return results
+
+    def get_cache_stats(self):
+        """Stored verification hits and misses of this instance"""
+        with self._lock:
+            hits, misses = self.cache_hits, self.cache_misses
+
+        lookups = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": round(hits / lookups, 4) if lookups else 0
+        }
+
 @frappe.whitelist()
 def validate_email(email):
     """Validate email using Million Verifier API"""
     api = MillionVerifierAPI()
-    return api.verify_email(email)
\ No newline at end of file
+    return api.verify_email(email)
@@ -1,26 +1,95 @@
 import frappe
-import requests
 import json
+import re
+import threading
+import time
 from frappe import _
+from parlo_license_manager.api import resilience
+from parlo_license_manager.api.error_log import DeferredErrorLog
+from parlo_license_manager.api.http_session import get_session
+from parlo_license_manager.permissions import clear_access_context
 
-class ParloAPI:
+# Cached search_user results; TTLs (seconds) can be overridden with
+# parlo_search_cache_ttl and parlo_search_negative_cache_ttl in site_config.json
+SEARCH_CACHE_PREFIX = "parlo_user_search"
+SEARCH_CACHE_TTL = 6 * 60 * 60
+SEARCH_NEGATIVE_CACHE_TTL = 15 * 60
+
+def _search_cache_key(email=None, phone_number=None):
+    """Cache key for a search by normalized email, else normalized phone"""
+    if email:
+        return f"{SEARCH_CACHE_PREFIX}:email:{email.strip().lower()}"
+    if phone_number:
+        phone = re.sub(r"[^\d+]", "", str(phone_number))
+        return f"{SEARCH_CACHE_PREFIX}:phone:{phone}"
+    return None
+
+def _search_cache_ttl(status_code):
+    """TTL for a search result, or None when it must not be cached"""
+    if status_code == 200:
+        return int(frappe.conf.get("parlo_search_cache_ttl") or SEARCH_CACHE_TTL)
+    if status_code == 404:
+        return int(frappe.conf.get("parlo_search_negative_cache_ttl") or SEARCH_NEGATIVE_CACHE_TTL)
+    # 5xx, timeouts and auth errors are transient
+    return None
+
+def invalidate_search_cache(email=None, phone_number=None):
+    """Drop cached search results for a user"""
+    cache = frappe.cache()
+    if email:
+        cache.delete_value(_search_cache_key(email=email))
+    if phone_number:
+        cache.delete_value(_search_cache_key(phone_number=phone_number))
+
+class ParloAPI(DeferredErrorLog):
     """Handler for Parlo API integration"""
     
     def __init__(self):
+        # Search cache counters; one instance is shared by the validation threads
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self._stats_lock = threading.Lock()
+        self._init_error_log()
+
         # Try to get from Parlo Settings first, then fall back to site config
         settings = None
         if frappe.db.exists("Singles", "Parlo Settings"):
             settings = frappe.get_single("Parlo Settings")
         
-        self.base_url = "https://cms.parlo.london/api/v1"
+        # parlo_api_url can point at the local stand-in in parlo_license_manager.benchmarks.stand_in
+        self.base_url = frappe.conf.get("parlo_api_url") or "https://cms.parlo.london/api/v1"
         self.api_key = settings.parlo_api_key if settings else frappe.conf.get("parlo_api_key", "test1")
         self.session_cookie = settings.parlo_session_cookie if settings else frappe.conf.get("parlo_session_cookie", "")
     
-    def search_user(self, email=None, phone_number=None):
+    def search_user(self, email=None, phone_number=None, use_cache=True):
         """
         Search for user in Parlo system
+        Found (200) and not found (404) results are cached per email/phone
         Returns: dict with status_code and response
         """
+        key = _search_cache_key(email=email, phone_number=phone_number) if use_cache else None
+        if key:
+            cached = frappe.cache().get_value(key)
+            with self._stats_lock:
+                if cached:
+                    self.cache_hits += 1
+                else:
+                    self.cache_misses += 1
+            if cached:
+                return cached
+        
+        result = self._search_user(email=email, phone_number=phone_number)
+        
+        ttl = key and _search_cache_ttl(result["status_code"])
+        if ttl:
+            frappe.cache().set_value(key, result, expires_in_sec=ttl)
+        
+        return result
+    
+    def _search_user(self, email=None, phone_number=None):
+        """Search for user in Parlo system without the cache"""
+        import requests
+        
         try:
             url = f"{self.base_url}/users/search"
             params = {}
@@ -36,7 +105,11 @@ class ParloAPI:
             if self.session_cookie:
                 headers["Cookie"] = f"SESSION={self.session_cookie}"
             
-            response = requests.get(url, params=params, headers=headers, timeout=10)
+            response = resilience.call(
+                "parlo_search",
+                lambda: get_session().get(url, params=params, headers=headers, timeout=10),
+                idempotent=True
+            )
             
             return {
                 "status_code": response.status_code,
@@ -45,10 +118,12 @@ class ParloAPI:
                 "message": self._get_message_for_status(response.status_code)
             }
             
+        except resilience.ResilienceError as e:
+            return self._rejected(e)
         except requests.exceptions.Timeout:
             return {"status_code": 408, "success": False, "message": "Request timeout"}
         except Exception as e:
-            frappe.log_error(f"Parlo search error: {str(e)}", "Parlo API")
+            self.log_error(f"Parlo search error: {str(e)}", "Parlo API")
             return {"status_code": 500, "success": False, "message": str(e)}
     
     def redeem_agent(self, email=None, phone_number=None):
@@ -56,6 +131,8 @@ class ParloAPI:
         Redeem agent access for user
         Returns: dict with status_code and response
         """
+        import requests
+        
         try:
             url = f"{self.base_url}/agents/redeem"
             
@@ -76,12 +153,17 @@ class ParloAPI:
             if self.session_cookie:
                 headers["Cookie"] = f"SESSION={self.session_cookie}"
             
-            response = requests.post(
+            # Redeeming is not idempotent, so it is never retried
+            response = resilience.call("parlo_redeem", lambda: get_session().post(
                 url, 
                 json=data, 
                 headers=headers, 
                 timeout=10
-            )
+            ))
+            
+            if response.status_code == 200:
+                # Cached search results no longer reflect the user
+                invalidate_search_cache(email=email, phone_number=phone_number)
             
             return {
                 "status_code": response.status_code,
@@ -90,12 +172,31 @@ class ParloAPI:
                 "message": self._get_message_for_status(response.status_code)
             }
             
+        except resilience.ResilienceError as e:
+            return self._rejected(e)
         except requests.exceptions.Timeout:
             return {"status_code": 408, "success": False, "message": "Request timeout"}
         except Exception as e:
-            frappe.log_error(f"Parlo redeem error: {str(e)}", "Parlo API")
+            self.log_error(f"Parlo redeem error: {str(e)}", "Parlo API")
             return {"status_code": 500, "success": False, "message": str(e)}
     
+    def _rejected(self, error):
+        """Result for a call the rate limiter or circuit breaker turned away"""
+        status_code = 429 if isinstance(error, resilience.RateLimitedError) else 503
+        return {"status_code": status_code, "success": False, "message": str(error)}
+    
+    def get_cache_stats(self):
+        """Search cache hits and misses of this instance"""
+        with self._stats_lock:
+            hits, misses = self.cache_hits, self.cache_misses
+        
+        lookups = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": round(hits / lookups, 4) if lookups else 0
+        }
+    
     def _get_message_for_status(self, status_code):
         """Get user-friendly message for status code"""
         messages = {
@@ -206,6 +307,10 @@ def assign_user_to_organization(user_email, organization_name):
         # Store user's default organization in session
         frappe.cache().hset("user_default_org", user_email, organization_name)
         
+        # Roles and memberships changed; permission checks later in this
+        # request must not reuse the earlier access context
+        clear_access_context()
+        
         return True
         
     except Exception as e:
@@ -220,78 +325,49 @@ def authenticate_user(email=None, phone_number=None, campaign_code=None, organiz
     if phone_number and not phone_number.startswith("+"):
         phone_number = "+971" + phone_number.lstrip('0')
     
+    from parlo_license_manager.utils.auth_provisioning import (
+        get_linked_organization,
+        queue_provisioning,
+        record_latency,
+    )
+    
     api = ParloAPI()
     
     # First try to redeem agent access
+    started = time.monotonic()
     result = api.redeem_agent(email=email, phone_number=phone_number)
+    record_latency("redeem", time.monotonic() - started)
     
     if result["success"]:
         # User authenticated successfully
         user_data = result.get("data", {})
         
-        # Determine organization
+        # Only the indexed reads stay inline, so returning users land on
+        # their organization; the default organization for new users is
+        # resolved by the provisioning job
         target_organization = None
-        
-        # Priority 1: Explicitly provided organization
-        if organization:
-            if frappe.db.exists("Organization", organization):
-                target_organization = organization
-        
-        # Priority 2: Organization from campaign code
-        if not target_organization and campaign_code:
+        if organization and frappe.db.exists("Organization", organization):
+            target_organization = organization
+        elif campaign_code:
             target_organization = get_organization_from_campaign_code(campaign_code)
         
-        # Priority 3: Check if user already has an organization assigned
         if not target_organization and email:
-            # Check if user exists and has a contact linked to an organization
-            contact = frappe.db.sql("""
-                SELECT dl.link_name
-                FROM `tabContact` c
-                JOIN `tabDynamic Link` dl ON dl.parent = c.name
-                WHERE c.user = %s 
-                AND dl.link_doctype = 'Organization'
-                AND EXISTS (
-                    SELECT 1 FROM `tabOrganization` o 
-                    WHERE o.name = dl.link_name 
-                    AND o.has_parlo_license = 1
-                )
-                LIMIT 1
-            """, email, as_dict=True)
-            
-            if contact:
-                target_organization = contact[0].link_name
-        
-        # Priority 4: Get default organization
-        if not target_organization:
-            target_organization = get_default_organization()
+            target_organization = get_linked_organization(email)
         
-        # Create or update user in Frappe
         if email:
-            user_exists = frappe.db.exists("User", email)
-            
-            if not user_exists:
+            # The User must exist to open a session; the Contact, the
+            # organization link and the Organization Member role are
+            # provisioned in the background, once per email
+            if not frappe.db.exists("User", email):
                 user = frappe.new_doc("User")
                 user.email = email
                 user.first_name = user_data.get("first_name", email.split('@')[0])
                 user.last_name = user_data.get("last_name", "")
                 user.enabled = 1
                 user.user_type = "Website User"
-                
-                # Add Organization Member role
-                user.append("roles", {"role": "Organization Member"})
                 user.insert(ignore_permissions=True)
-            else:
-                user = frappe.get_doc("User", email)
             
-            # Assign user to organization if found
-            if target_organization:
-                assign_user_to_organization(email, target_organization)
-            else:
-                # Log warning that no organization was found
-                frappe.log_error(
-                    f"User {email} authenticated but no organization assigned. Campaign code: {campaign_code}",
-                    "Organization Assignment Warning"
-                )
+            queue_provisioning(email, target_organization, campaign_code)
         
         # Prepare redirect URL
         redirect_url = "/parlo-dashboard"
@@ -0,0 +1,250 @@
+import random
+import time
+
+import frappe
+
+from parlo_license_manager.utils.instrumentation import record_http
+
+# Resilience layer shared by ParloAPI and MillionVerifierAPI.
+# Every outbound call goes through call(endpoint, ...), which applies
+#   - a token bucket per endpoint, kept in Redis so the provider quota
+#     holds across all workers
+#   - a circuit breaker per endpoint, also in Redis: after
+#     failure_threshold consecutive failures calls fail fast for
+#     reset_timeout seconds, then a single probe is let through (half-open)
+#   - jittered exponential retries, only for endpoints marked idempotent
+# Settings per endpoint can be overridden in site_config.json, e.g.
+# {"parlo_resilience": {"parlo_search": {"rate": 50, "burst": 100}}}
+ENDPOINTS = {
+    "parlo_search": {"rate": 20, "burst": 40, "retries": 2},
+    "parlo_redeem": {"rate": 10, "burst": 20, "retries": 0},
+    "million_verifier": {"rate": 20, "burst": 40, "retries": 0},
+    "million_verifier_bulk": {"rate": 2, "burst": 5, "retries": 2},
+}
+DEFAULTS = {
+    "failure_threshold": 5,
+    "reset_timeout": 30,
+    "probe_timeout": 15,
+    "max_wait": 5,
+    "retry_base": 0.25,
+    "retry_cap": 4,
+}
+
+BUCKET_KEY = "parlo_rate_bucket:{0}"
+BREAKER_KEY = "parlo_breaker:{0}"
+STATS_KEY = "parlo_resilience_stats"
+
+# Refill and take one token; returns the seconds to wait when empty
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local data = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(data[1]) or burst
+local ts = tonumber(data[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 60)
+return tostring(wait)
+"""
+
+# closed / open / half_open; half_open claims the single probe
+BREAKER_ALLOW_SCRIPT = """
+local threshold = tonumber(ARGV[1])
+local reset_timeout = tonumber(ARGV[2])
+local probe_timeout = tonumber(ARGV[3])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local failures = tonumber(redis.call('HGET', KEYS[1], 'failures') or '0')
+if failures < threshold then
+    return 'closed'
+end
+local opened_at = tonumber(redis.call('HGET', KEYS[1], 'opened_at') or '0')
+local probe_until = tonumber(redis.call('HGET', KEYS[1], 'probe_until') or '0')
+if now - opened_at < reset_timeout or probe_until > now then
+    return 'open'
+end
+redis.call('HSET', KEYS[1], 'probe_until', tostring(now + probe_timeout))
+return 'half_open'
+"""
+
+# Count a failure; (re)open once the threshold is reached
+BREAKER_FAILURE_SCRIPT = """
+local threshold = tonumber(ARGV[1])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local failures = redis.call('HINCRBY', KEYS[1], 'failures', 1)
+if failures >= threshold then
+    redis.call('HSET', KEYS[1], 'opened_at', tostring(now), 'probe_until', '0')
+end
+redis.call('EXPIRE', KEYS[1], 24 * 60 * 60)
+return failures
+"""
+
+
+class ResilienceError(Exception):
+    """Call rejected before reaching the provider"""
+
+
+class CircuitOpenError(ResilienceError):
+    pass
+
+
+class RateLimitedError(ResilienceError):
+    pass
+
+
+def get_endpoint_settings(endpoint):
+    overrides = (frappe.conf.get("parlo_resilience") or {}).get(endpoint) or {}
+    return dict(DEFAULTS, **ENDPOINTS.get(endpoint, {}), **overrides)
+
+
+def _key(pattern, endpoint):
+    return frappe.cache().make_key(pattern.format(endpoint))
+
+
+def _decode(value):
+    return value.decode() if isinstance(value, bytes) else value
+
+
+def _hgetall(key):
+    """Raw hash read; RedisWrapper.hgetall would unpickle the values"""
+    pipe = frappe.cache().pipeline()
+    pipe.hgetall(key)
+    return {_decode(k): _decode(v) for k, v in pipe.execute()[0].items()}
+
+
+def _count(endpoint, event):
+    pipe = frappe.cache().pipeline()
+    pipe.hincrby(frappe.cache().make_key(STATS_KEY), f"{endpoint}:{event}", 1)
+    pipe.execute()
+
+
+def acquire_token(endpoint, settings):
+    """Wait for a token of the endpoint's bucket, up to max_wait seconds"""
+    deadline = time.monotonic() + settings["max_wait"]
+
+    while True:
+        wait = float(frappe.cache().eval(
+            TOKEN_BUCKET_SCRIPT, 1, _key(BUCKET_KEY, endpoint), settings["rate"], settings["burst"]
+        ))
+        if not wait:
+            return
+
+        if time.monotonic() + wait > deadline:
+            _count(endpoint, "rate_limited")
+            raise RateLimitedError(f"{endpoint} rate limit reached")
+
+        time.sleep(wait)
+
+
+def _allow(endpoint, settings):
+    return _decode(frappe.cache().eval(
+        BREAKER_ALLOW_SCRIPT, 1, _key(BREAKER_KEY, endpoint),
+        settings["failure_threshold"], settings["reset_timeout"], settings["probe_timeout"]
+    ))
+
+
+def _record_failure(endpoint, settings):
+    frappe.cache().eval(BREAKER_FAILURE_SCRIPT, 1, _key(BREAKER_KEY, endpoint), settings["failure_threshold"])
+
+
+def _record_success(endpoint):
+    frappe.cache().delete(_key(BREAKER_KEY, endpoint))
+
+
+def _is_failure(response):
+    """Provider-side failures count against the breaker; 4xx answers do not"""
+    return response.status_code >= 500
+
+
+def _is_retryable(response):
+    return response.status_code >= 500 or response.status_code == 429
+
+
+def _backoff(attempt, settings):
+    """Full jitter: uniform in [0, min(cap, base * 2^attempt)]"""
+    return random.uniform(0, min(settings["retry_cap"], settings["retry_base"] * (2 ** attempt)))
+
+
+def call(endpoint, request, idempotent=False):
+    """
+    Run request() (returning a requests.Response) under the endpoint's
+    rate limit and circuit breaker
+    Idempotent calls are retried on timeouts, connection errors, 5xx and
+    429. Raises CircuitOpenError or RateLimitedError without calling out.
+    """
+    import requests
+
+    settings = get_endpoint_settings(endpoint)
+    retries = settings["retries"] if idempotent else 0
+    attempt = 0
+
+    while True:
+        state = _allow(endpoint, settings)
+        if state == "open":
+            _count(endpoint, "circuit_open")
+            raise CircuitOpenError(f"{endpoint} is unavailable, retry later")
+
+        acquire_token(endpoint, settings)
+
+        started = time.perf_counter()
+        try:
+            response = request()
+        except (requests.exceptions.Timeout, requests.exceptions.ConnectionError):
+            record_http(endpoint, time.perf_counter() - started)
+            _record_failure(endpoint, settings)
+            if attempt >= retries:
+                raise
+        else:
+            record_http(endpoint, time.perf_counter() - started, response.status_code)
+            if _is_failure(response):
+                _record_failure(endpoint, settings)
+            else:
+                _record_success(endpoint)
+
+            if attempt >= retries or not _is_retryable(response):
+                return response
+
+        _count(endpoint, "retried")
+        time.sleep(_backoff(attempt, settings))
+        attempt += 1
+
+
+def get_breaker_state(endpoint):
+    """Breaker state of an endpoint without claiming the half-open probe"""
+    settings = get_endpoint_settings(endpoint)
+    breaker = {k: float(v) for k, v in _hgetall(_key(BREAKER_KEY, endpoint)).items()}
+
+    failures = int(breaker.get("failures", 0))
+    state = "closed"
+    if failures >= settings["failure_threshold"]:
+        remaining = settings["reset_timeout"] - (time.time() - breaker.get("opened_at", 0))
+        state = "open" if remaining > 0 else "half_open"
+
+    return {"state": state, "consecutive_failures": failures}
+
+
+@frappe.whitelist()
+def get_resilience_stats():
+    """Breaker state and rejected / retried call counts per endpoint"""
+    frappe.only_for("System Manager")
+
+    counts = {k: int(v) for k, v in _hgetall(frappe.cache().make_key(STATS_KEY)).items()}
+
+    return {
+        endpoint: dict(
+            get_breaker_state(endpoint),
+            rate_limited=counts.get(f"{endpoint}:rate_limited", 0),
+            circuit_open=counts.get(f"{endpoint}:circuit_open", 0),
+            retried=counts.get(f"{endpoint}:retried", 0)
+        )
+        for endpoint in ENDPOINTS
+    }
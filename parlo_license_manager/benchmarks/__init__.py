@@ -0,0 +1 @@
+"""Benchmarks for Parlo License Manager"""
\ No newline at end of file
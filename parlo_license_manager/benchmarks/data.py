@@ -0,0 +1,209 @@
+"""
+Seeded synthetic data for the benchmark suite
+
+    bench --site <site> execute parlo_license_manager.benchmarks.data.generate --kwargs "{'scale': '100k'}"
+    bench --site <site> execute parlo_license_manager.benchmarks.data.clear
+
+Creates "Bench Org NNN" organizations (campaign BENCH-NNN), allocated
+Contacts with email / phone child rows, organization links and Parlo
+Whitelist rows (written the way bulk allocation writes them), Leads on
+the bench campaigns, and a license manager user for the first
+organization. The same seed and scale always give the same data.
+"""
+import random
+
+import frappe
+
+from parlo_license_manager.utils.bulk_allocation import _get_chunk_size, _insert_chunk
+from parlo_license_manager.utils.license_generator import reserve_license_numbers, update_used_licenses
+from parlo_license_manager.utils.license_stats import get_license_stats
+from parlo_license_manager.utils.search_index import index_leads
+
+# Contacts (and as many Leads) per scale
+SCALES = {"10k": 10_000, "100k": 100_000, "1M": 1_000_000}
+CONTACTS_PER_ORGANIZATION = 10_000
+ORGANIZATION_PREFIX = "Bench Org"
+CAMPAIGN_PREFIX = "BENCH-"
+LEAD_PREFIX = "BENCH-LEAD-"
+BENCH_MANAGER = "bench-manager@parlo-bench.test"
+EMAIL_DOMAIN = "parlo-bench.test"
+
+FIRST_NAMES = ("Aisha", "Omar", "Fatima", "Yousef", "Maryam", "Ali", "Noor", "Hassan", "Layla", "Khalid",
+               "Sara", "Ahmed", "Huda", "Tariq", "Rania", "Samir", "Dina", "Karim", "Lina", "Zaid")
+LAST_NAMES = ("Haddad", "Khoury", "Nasser", "Saleh", "Mansour", "Aziz", "Hamdan", "Farouk", "Qasim", "Rahman",
+              "Sabbagh", "Jaber", "Darwish", "Issa", "Mahmoud", "Najjar", "Obeid", "Rashid", "Sharif", "Yassin")
+LEAD_STATUSES = (("Lead", 0.5), ("Open", 0.25), ("Replied", 0.1), ("Converted", 0.1), ("Do Not Contact", 0.05))
+
+
+def organization_name(index):
+    return f"{ORGANIZATION_PREFIX} {index:03d}"
+
+
+def bench_organizations():
+    return frappe.get_all("Organization", filters={"name": ["like", f"{ORGANIZATION_PREFIX} %"]}, pluck="name")
+
+
+def _person(rng, i):
+    first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+    return first, last, f"{first.lower()}.{last.lower()}.{i}@{EMAIL_DOMAIN}", f"+9715{i:08d}"
+
+
+def ensure_organization(index, licenses):
+    """Bench organization index, with at least licenses available"""
+    name = organization_name(index)
+    if frappe.db.exists("Organization", name):
+        org = frappe.get_doc("Organization", name)
+    else:
+        org = frappe.get_doc({
+            "doctype": "Organization",
+            "organization_name": name,
+            "has_parlo_license": 1,
+            "campaign_code": f"{CAMPAIGN_PREFIX}{index:03d}",
+            "license_prefix": f"B{index:03d}-",
+            "license_status": "Active",
+        })
+
+    org.total_licenses = max(org.total_licenses or 0, (org.used_licenses or 0) + licenses)
+    org.save(ignore_permissions=True)
+    return org
+
+
+def _ensure_manager(organization):
+    if not frappe.db.exists("User", BENCH_MANAGER):
+        user = frappe.get_doc({
+            "doctype": "User",
+            "email": BENCH_MANAGER,
+            "first_name": "Bench",
+            "last_name": "Manager",
+            "user_type": "Website User",
+            "send_welcome_email": 0,
+            "roles": [{"role": "License Manager"}],
+        })
+        user.insert(ignore_permissions=True)
+
+    org = frappe.get_doc("Organization", organization)
+    if BENCH_MANAGER not in [m.user for m in org.license_managers]:
+        org.append("license_managers", {"user": BENCH_MANAGER, "email": BENCH_MANAGER})
+        org.save(ignore_permissions=True)
+
+
+def _insert_contacts(org, first, count, rng):
+    """Allocated Contacts with child rows and Whitelist rows, chunk by chunk"""
+    chunk_size = _get_chunk_size()
+    has_whitelist = bool(frappe.db.exists("DocType", "Parlo Whitelist"))
+    license_numbers = reserve_license_numbers(org.name, count)
+    frappe.db.commit()
+
+    for start in range(0, count, chunk_size):
+        items = []
+        for offset in range(start, min(count, start + chunk_size)):
+            first_name, last_name, email, phone = _person(rng, first + offset)
+            items.append({
+                "index": offset,
+                "data": {"first_name": first_name, "last_name": last_name, "email": email, "phone": phone},
+                "full_name": f"{first_name} {last_name} {first + offset}",
+                "license_number": license_numbers[offset],
+            })
+
+        _insert_chunk(items, org.name, org.campaign_code, has_whitelist, chunk_size)
+        update_used_licenses(org.name, len(items))
+        frappe.db.commit()
+
+
+def _insert_leads(campaign_code, first, count, rng):
+    chunk_size = _get_chunk_size()
+    statuses, weights = zip(*LEAD_STATUSES)
+    now = frappe.utils.now()
+    user = frappe.session.user
+
+    for start in range(0, count, chunk_size):
+        rows = []
+        for offset in range(start, min(count, start + chunk_size)):
+            first_name, last_name, email, phone = _person(rng, first + offset)
+            rows.append([
+                f"{LEAD_PREFIX}{first + offset:08d}", now, now, user, user, 0,
+                f"{first_name} {last_name}", first_name, last_name, email.replace("@", ".lead@"),
+                phone.replace("+9715", "+9716", 1), rng.choices(statuses, weights)[0],
+                campaign_code, 1 if rng.random() < 0.7 else 0
+            ])
+
+        frappe.db.bulk_insert(
+            "Lead",
+            ["name", "creation", "modified", "owner", "modified_by", "docstatus",
+             "lead_name", "first_name", "last_name", "email_id", "mobile_no", "status",
+             "campaign_code", "parlo_verified"],
+            rows,
+            chunk_size=chunk_size
+        )
+        index_leads([row[0] for row in rows])
+        frappe.db.commit()
+
+
+def generate(scale="10k", seed=0):
+    """Populate the site with bench data for a scale (10k, 100k or 1M)"""
+    total = SCALES[scale] if scale in SCALES else int(scale)
+    rng = random.Random(seed)
+    organizations = max(1, -(-total // CONTACTS_PER_ORGANIZATION))
+
+    existing = set(bench_organizations())
+    for index in range(1, organizations + 1):
+        count = min(CONTACTS_PER_ORGANIZATION, total - (index - 1) * CONTACTS_PER_ORGANIZATION)
+        first = (index - 1) * CONTACTS_PER_ORGANIZATION
+
+        if organization_name(index) in existing:
+            continue
+
+        org = ensure_organization(index, count)
+        frappe.db.commit()
+        _insert_contacts(org, first, count, rng)
+        _insert_leads(org.campaign_code, first, count, rng)
+        get_license_stats(org.name, force_refresh=True)
+        print(f"{org.name}: {count} contacts, {count} leads")
+
+    _ensure_manager(organization_name(1))
+    frappe.db.commit()
+    return get_scale()
+
+
+def get_scale():
+    """Row counts of the bench data on this site"""
+    organizations = bench_organizations()
+    if not organizations:
+        return {"organizations": 0, "contacts": 0, "leads": 0}
+
+    return {
+        "organizations": len(organizations),
+        "contacts": frappe.db.count("Contact", {"license_organization": ["in", organizations]}),
+        "leads": frappe.db.count("Lead", {"name": ["like", f"{LEAD_PREFIX}%"]}),
+    }
+
+
+def clear():
+    """Delete all bench data"""
+    organizations = bench_organizations()
+
+    for organization in organizations:
+        contacts = frappe.db.sql_list("SELECT name FROM `tabContact` WHERE license_organization = %s", organization)
+        for start in range(0, len(contacts), 1000):
+            chunk = contacts[start:start + 1000]
+            placeholders = ", ".join(["%s"] * len(chunk))
+            for doctype in ("Contact Email", "Contact Phone", "Dynamic Link"):
+                frappe.db.sql(f"DELETE FROM `tab{doctype}` WHERE parenttype = 'Contact' AND parent IN ({placeholders})", tuple(chunk))
+            frappe.db.sql(f"DELETE FROM `tabParlo Search Term` WHERE reference_doctype = 'Contact' AND reference_name IN ({placeholders})", tuple(chunk))
+            frappe.db.sql(f"DELETE FROM `tabContact` WHERE name IN ({placeholders})", tuple(chunk))
+            frappe.db.commit()
+
+        frappe.db.sql("DELETE FROM `tabParlo Whitelist` WHERE organization = %s", organization)
+        frappe.delete_doc("Organization", organization, ignore_permissions=True, force=True)
+        frappe.db.commit()
+
+    frappe.db.sql("""
+        DELETE FROM `tabParlo Search Term`
+        WHERE reference_doctype = 'Lead' AND reference_name LIKE %s
+    """, f"{LEAD_PREFIX}%")
+    frappe.db.sql("DELETE FROM `tabLead` WHERE name LIKE %s", f"{LEAD_PREFIX}%")
+
+    if frappe.db.exists("User", BENCH_MANAGER):
+        frappe.delete_doc("User", BENCH_MANAGER, ignore_permissions=True, force=True)
+
+    frappe.db.commit()
@@ -0,0 +1,228 @@
+"""
+Load test the sign-in, bulk validation and bulk allocation paths against
+the local Parlo / Million Verifier stand-ins
+
+    bench --site <site> execute parlo_license_manager.benchmarks.load_test.run \
+        --kwargs "{'requests': 200, 'concurrency': 16, 'latency': ['lognormal', 0.08, 0.5], 'error_rates': {'500': 0.01}}"
+
+Each scenario runs `requests` operations on `concurrency` threads, every
+operation with its own site connection, and reports throughput and
+latency percentiles. Sign-ins and validations are rolled back.
+Allocations commit in chunks like the real thing and so go to a
+dedicated "Parlo Load Test" organization (phone-only records, so no
+welcome emails are queued). Do not run this against a production site.
+"""
+import json
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import frappe
+
+from parlo_license_manager.benchmarks.stand_in import MillionVerifierStandIn, ParloStandIn, site_config
+
+SCENARIOS = ("authenticate", "validate_bulk_upload", "process_bulk_allocation")
+LOAD_TEST_ORGANIZATION = "Parlo Load Test"
+LOAD_TEST_CAMPAIGN = "PARLO-LOAD-TEST"
+
+
+def percentile(ordered, fraction):
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def summarize(latencies, errors, elapsed):
+    """Throughput and latency percentiles (ms) of one scenario"""
+    ordered = sorted(latencies)
+    total = len(ordered)
+    return {
+        "requests": total,
+        "errors": sum(errors.values()),
+        "error_kinds": dict(errors),
+        "duration_s": round(elapsed, 3),
+        "throughput_rps": round(total / elapsed, 2) if elapsed else None,
+        "p50_ms": percentile(ordered, 0.5),
+        "p90_ms": percentile(ordered, 0.9),
+        "p99_ms": percentile(ordered, 0.99),
+        "max_ms": ordered[-1] if ordered else None,
+    }
+
+
+def ensure_load_test_organization(licenses_needed):
+    """The load test organization, with at least licenses_needed available"""
+    if frappe.db.exists("Organization", LOAD_TEST_ORGANIZATION):
+        org = frappe.get_doc("Organization", LOAD_TEST_ORGANIZATION)
+    else:
+        org = frappe.get_doc({
+            "doctype": "Organization",
+            "organization_name": LOAD_TEST_ORGANIZATION,
+            "has_parlo_license": 1,
+            "campaign_code": LOAD_TEST_CAMPAIGN,
+            "license_status": "Active",
+            "total_licenses": 0,
+        })
+
+    if (org.available_licenses or 0) < licenses_needed:
+        org.total_licenses = (org.used_licenses or 0) + licenses_needed
+
+    org.save(ignore_permissions=True)
+    frappe.db.commit()
+    return org.name
+
+
+def upload_csv(users, rows, rng, unknown_ratio=0.2):
+    """Upload sheet mixing known Parlo users with unknown phone numbers"""
+    lines = ["phonenumber,full_name,email"]
+    for i in range(rows):
+        if rng.random() < unknown_ratio:
+            lines.append(f"+9717{rng.randrange(10 ** 8):08d},Unknown {i},")
+        else:
+            user = rng.choice(users)
+            lines.append(f"{user['phoneNumber']},{user['first_name']} {user['last_name']},{user['email']}")
+    return "\n".join(lines)
+
+
+def allocation_records(rows, first_phone):
+    """Validated, phone-only records with unique numbers"""
+    return [{
+        "row": i + 1,
+        "name": f"Load Test {first_phone + i}",
+        "phone": f"+9716{(first_phone + i) % 10 ** 8:08d}",
+        "email": "",
+        "valid": True,
+        "errors": [],
+    } for i in range(rows)]
+
+
+class LoadTest:
+    """Runs scenarios on worker threads, each operation on its own connection"""
+
+    def __init__(self, parlo, conf, rows, seed):
+        self.site = frappe.local.site
+        self.sites_path = frappe.local.sites_path
+        self.parlo = parlo
+        self.conf = conf
+        self.rows = rows
+        self.rng = random.Random(seed)
+        self.organization = None
+
+    def _connect(self):
+        frappe.init(site=self.site, sites_path=self.sites_path)
+        frappe.connect()
+        frappe.local.conf.update(self.conf)
+        frappe.set_user("Administrator")
+
+    def _timed(self, operation):
+        """Run one operation; returns (ms, error kind or None)"""
+        self._connect()
+        try:
+            started = time.monotonic()
+            try:
+                result = operation()
+            except Exception as e:
+                result = {"success": False, "error": type(e).__name__}
+            elapsed = (time.monotonic() - started) * 1000
+
+            frappe.db.rollback()
+            if result.get("success"):
+                return elapsed, None
+            return elapsed, str(result.get("status_code") or result.get("error") or "failed")[:80]
+        finally:
+            frappe.destroy()
+
+    def operations(self, scenario, requests):
+        """The operations of a scenario, built up front so every thread does only the call"""
+        from parlo_license_manager.api.parlo_integration import authenticate_user
+        from parlo_license_manager.utils.bulk_upload import process_bulk_allocation, validate_bulk_upload
+
+        if scenario == "authenticate":
+            users = self.parlo.users
+            return [
+                (lambda user=users[i % len(users)]: authenticate_user(email=user["email"]))
+                for i in range(requests)
+            ]
+
+        if scenario == "validate_bulk_upload":
+            return [
+                (lambda content=upload_csv(self.parlo.users, self.rows, self.rng):
+                    validate_bulk_upload(content, self.organization, filename="load_test.csv"))
+                for _ in range(requests)
+            ]
+
+        if scenario == "process_bulk_allocation":
+            first_phone = self.rng.randrange(10 ** 8)
+            return [
+                (lambda records=allocation_records(self.rows, first_phone + i * self.rows):
+                    process_bulk_allocation(records, self.organization))
+                for i in range(requests)
+            ]
+
+        raise ValueError(f"Unknown scenario: {scenario}")
+
+    def run_scenario(self, scenario, requests, concurrency):
+        operations = self.operations(scenario, requests)
+        errors = {}
+        latencies = []
+
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="parlo-load") as executor:
+            for elapsed, error in executor.map(self._timed, operations):
+                latencies.append(round(elapsed, 1))
+                if error:
+                    errors[error] = errors.get(error, 0) + 1
+
+        return summarize(latencies, errors, time.monotonic() - started)
+
+
+def run(scenarios=SCENARIOS, requests=100, concurrency=8, rows=50, users=1000,
+        latency=None, error_rates=None, timeout_delay=15, seed=0, output=None):
+    """
+    Run the load test; returns (and optionally writes to output) the report
+    latency / error_rates: see parlo_license_manager.benchmarks.stand_in
+    """
+    if isinstance(scenarios, str):
+        scenarios = [scenarios]
+    requests, concurrency, rows = int(requests), int(concurrency), int(rows)
+    error_rates = {k if k == "timeout" else int(k): float(v) for k, v in (error_rates or {}).items()}
+    options = {
+        "latency": tuple(latency) if isinstance(latency, list) else latency,
+        "error_rates": error_rates,
+        "timeout_delay": timeout_delay,
+        "seed": seed,
+    }
+
+    report = {
+        "config": {
+            "requests": requests, "concurrency": concurrency, "rows": rows,
+            "users": users, "latency": latency, "error_rates": error_rates,
+        },
+        "scenarios": {},
+    }
+
+    with ParloStandIn(users=int(users), **options) as parlo, MillionVerifierStandIn(**options) as verifier:
+        load_test = LoadTest(parlo, site_config(parlo, verifier), rows, seed)
+
+        if set(scenarios) & {"validate_bulk_upload", "process_bulk_allocation"}:
+            load_test.organization = ensure_load_test_organization(requests * rows * 2)
+
+        for scenario in scenarios:
+            parlo.faults.clear()
+            verifier.faults.clear()
+
+            result = load_test.run_scenario(scenario, requests, concurrency)
+            result["stand_in_faults"] = {
+                "parlo": {str(k): v for k, v in parlo.faults.items()},
+                "million_verifier": {str(k): v for k, v in verifier.faults.items()},
+            }
+            report["scenarios"][scenario] = result
+
+            print(f"{scenario}: {result['requests']} requests, {result['errors']} errors, "
+                  f"{result['throughput_rps']} req/s, p50 {result['p50_ms']} ms, "
+                  f"p90 {result['p90_ms']} ms, p99 {result['p99_ms']} ms")
+
+    if output:
+        with open(output, "w") as f:
+            json.dump(report, f, indent=1)
+
+    return report
@@ -0,0 +1,125 @@
+"""
+Queries issued by the Contact and Lead permission hooks for one list view
+
+    bench --site <site> execute parlo_license_manager.benchmarks.permissions.run \
+        --kwargs "{'user': 'manager@example.com', 'output': 'permissions-new.json', 'baseline': 'permissions-old.json'}"
+
+A list view runs the query hook once and the has_permission hook once per
+row. The hooks are the ones this app registers in hooks.py, so the same
+file measures any commit. For "before" numbers, check out the baseline
+commit, copy this file into parlo_license_manager/benchmarks/ there, next
+to an empty __init__.py (it needs nothing but frappe), run it with output,
+then pass that report as baseline on the new commit. Both reports record their commit. Hook calls
+that raise are counted as errors and do not stop the list view.
+"""
+import json
+from contextlib import contextmanager
+
+import frappe
+
+APP = "parlo_license_manager"
+FIELDS = {"Contact": "license_organization", "Lead": "campaign_code"}
+
+
+@contextmanager
+def count_calls():
+    """Count database queries and role lookups made inside the block"""
+    counts = {"queries": 0, "role_lookups": 0}
+    sql, get_roles = frappe.db.sql, frappe.get_roles
+
+    def counting_sql(*args, **kwargs):
+        counts["queries"] += 1
+        return sql(*args, **kwargs)
+
+    def counting_get_roles(*args, **kwargs):
+        counts["role_lookups"] += 1
+        return get_roles(*args, **kwargs)
+
+    frappe.db.sql, frappe.get_roles = counting_sql, counting_get_roles
+    try:
+        yield counts
+    finally:
+        frappe.db.sql, frappe.get_roles = sql, get_roles
+
+
+def get_hooks(doctype):
+    """(query hook, has_permission hook) this app registers for doctype"""
+    query = frappe.get_hooks("permission_query_conditions", app_name=APP)[doctype][-1]
+    permission = frappe.get_hooks("has_permission", app_name=APP)[doctype][-1]
+    return frappe.get_attr(query), frappe.get_attr(permission)
+
+
+def _clear_access_context():
+    # Request-scoped since the shared access context; absent before it
+    clear = getattr(frappe.get_module(f"{APP}.permissions"), "clear_access_context", None)
+    if clear:
+        clear()
+
+
+def list_view(doctype, user, rows):
+    """Run the permission hooks of one list view; returns the call counts"""
+    query_hook, permission_hook = get_hooks(doctype)
+    _clear_access_context()
+    errors = []
+
+    def call(hook, *args):
+        try:
+            hook(*args)
+        except Exception as e:
+            # Read-only; rolling back keeps the transaction usable on Postgres
+            frappe.db.rollback()
+            errors.append(f"{hook.__name__}: {e}")
+
+    with count_calls() as counts:
+        call(query_hook, user)
+        for row in rows:
+            call(permission_hook, row, user, "read")
+
+    _clear_access_context()
+    return dict(counts, rows=len(rows), errors=len(errors), first_error=errors[0] if errors else None)
+
+
+def run(user=None, page_length=20, output=None, baseline=None):
+    """
+    Call counts per list view for Contact and Lead; returns the report
+    output: path to write the JSON report to
+    baseline: report (or path) of another commit to show as "before"
+    """
+    from frappe.utils.change_log import get_app_last_commit_ref
+
+    user = user or frappe.session.user
+    report = {
+        "meta": {
+            "commit": get_app_last_commit_ref(APP),
+            "site": frappe.local.site,
+            "user": user,
+            "page_length": int(page_length),
+        },
+        "list_views": {},
+    }
+
+    for doctype, field in FIELDS.items():
+        rows = frappe.get_all(doctype, fields=["name", field], limit=int(page_length))
+        report["list_views"][doctype] = list_view(doctype, user, rows)
+
+    if output:
+        with open(output, "w") as f:
+            json.dump(report, f, indent=1)
+
+    if isinstance(baseline, str):
+        with open(baseline) as f:
+            baseline = json.load(f)
+
+    print(f"as {user}, commit {report['meta']['commit']}"
+          + (f", baseline {baseline['meta']['commit']}" if baseline else ""))
+    for doctype, counts in report["list_views"].items():
+        results = [("after", counts)]
+        if baseline and doctype in baseline["list_views"]:
+            results.insert(0, ("before", baseline["list_views"][doctype]))
+
+        print(f"{doctype} list view ({counts['rows']} rows)")
+        for label, result in results:
+            errors = f"  errors: {result['errors']} ({result['first_error']})" if result["errors"] else ""
+            print(f"  {label:6}  queries: {result['queries']:4}  role lookups: {result['role_lookups']:4}{errors}")
+
+    return report
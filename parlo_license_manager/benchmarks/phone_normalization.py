@@ -0,0 +1,58 @@
+"""
+Micro-benchmark: scalar vs vectorized E164 phone validation
+
+Run with:
+    python -m parlo_license_manager.benchmarks.phone_normalization [count]
+"""
+import random
+import sys
+import time
+
+from parlo_license_manager.utils.license_generator import validate_phone_e164, validate_phones_e164
+
+def generate_phone_numbers(count, seed=42):
+    """Mix of E164, local UAE, formatted and invalid numbers"""
+    rng = random.Random(seed)
+    numbers = []
+    for _ in range(count):
+        digits = "".join(rng.choice("0123456789") for _ in range(8))
+        kind = rng.random()
+        if kind < 0.4:
+            numbers.append(f"+9715{digits}")
+        elif kind < 0.7:
+            numbers.append(f"05{digits}")
+        elif kind < 0.9:
+            numbers.append(f"(05) {digits[:3]}-{digits[3:]}")
+        else:
+            numbers.append(rng.choice(["", "n/a", "+0" + digits, digits * 3]))
+    return numbers
+
+def _time(func, *args):
+    start = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - start
+
+def run(count=100000):
+    """Print throughput of the scalar and batch validators on count numbers"""
+    import pandas as pd
+
+    numbers = generate_phone_numbers(int(count))
+    series = pd.Series(numbers)
+
+    # Warm up pandas string machinery
+    validate_phones_e164(series.head(1000))
+
+    results = {
+        "scalar": _time(lambda: [validate_phone_e164(n) for n in numbers]),
+        "batch (list)": _time(validate_phones_e164, numbers),
+        "batch (Series)": _time(validate_phones_e164, series),
+    }
+
+    print(f"E164 validation of {len(numbers):,} numbers")
+    for name, seconds in results.items():
+        print(f"  {name:<16} {seconds:8.3f}s  {len(numbers) / seconds:12,.0f} numbers/s")
+
+    return results
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
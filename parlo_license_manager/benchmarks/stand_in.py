@@ -0,0 +1,351 @@
+import argparse
+import csv
+import io
+import itertools
+import json
+import math
+import random
+import threading
+import time
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# Local stand-ins for the remote APIs so tests and load tests can run
+# offline. Million Verifier results are derived from the address itself:
+#   local part starting with "bad"     -> invalid
+#   local part starting with "unknown" -> unknown
+#   domain starting with "catchall."   -> catch_all
+#   anything else                      -> ok
+# Parlo knows a seeded set of fixture users (see parlo_fixture_users).
+#
+# Every stand-in can add latency and inject errors:
+#   latency      - seconds, or ("fixed", s), ("uniform", low, high),
+#                  ("lognormal", median, sigma), ("normal", mean, stdev)
+#   error_rates  - {status or "timeout": probability}, e.g.
+#                  {500: 0.01, 409: 0.02, "timeout": 0.005}; a timeout
+#                  holds the response for timeout_delay seconds
+#
+# Run both as a standalone server for manual or load testing:
+#   python -m parlo_license_manager.benchmarks.stand_in --users 5000 \
+#       --latency lognormal:0.08:0.5 --errors 500=0.01,timeout=0.005
+FIXTURE_DOMAIN = "parlo-stand-in.test"
+
+
+def latency_distribution(spec):
+    """Callable rng -> seconds for a latency spec (see module comment)"""
+    if not spec:
+        return lambda rng: 0
+    if isinstance(spec, (int, float)):
+        return lambda rng: spec
+
+    kind, *args = spec
+    args = [float(a) for a in args]
+    if kind == "fixed":
+        return lambda rng: args[0]
+    if kind == "uniform":
+        return lambda rng: rng.uniform(args[0], args[1])
+    if kind == "lognormal":
+        # median of the distribution and sigma of the underlying normal
+        return lambda rng: rng.lognormvariate(math.log(args[0]), args[1])
+    if kind == "normal":
+        return lambda rng: max(0, rng.gauss(args[0], args[1]))
+    raise ValueError(f"Unknown latency distribution: {kind}")
+
+
+def parlo_fixture_users(count, seed=0):
+    """Deterministic Parlo users: email, E164 phone and names"""
+    rng = random.Random(seed)
+    return [{
+        "id": i + 1,
+        "email": f"user{i:06d}@{FIXTURE_DOMAIN}",
+        "phoneNumber": f"+9715{rng.randrange(10 ** 8):08d}",
+        "first_name": f"User{i:06d}",
+        "last_name": "Fixture",
+    } for i in range(count)]
+
+
+def million_verifier_result(email):
+    local, _, domain = (email or "").strip().lower().partition("@")
+    if not domain:
+        return "invalid"
+    if local.startswith("bad"):
+        return "invalid"
+    if local.startswith("unknown"):
+        return "unknown"
+    if domain.startswith("catchall."):
+        return "catch_all"
+    return "ok"
+
+
+def _parse_multipart_file(content_type, body):
+    """Return the content of the first file part of a multipart body"""
+    message = BytesParser(policy=HTTP).parsebytes(
+        f"Content-Type: {content_type}\r\n\r\n".encode() + body
+    )
+    for part in message.iter_parts():
+        if part.get_filename():
+            return part.get_payload(decode=True)
+    return b""
+
+
+class StandInServer:
+    """Threaded HTTP server on a local port; use as a context manager"""
+
+    def __init__(self, latency=None, error_rates=None, timeout_delay=15, seed=0, port=0):
+        self.hits = {}
+        self.faults = {}
+        self._lock = threading.Lock()
+        self._rng = random.Random(seed)
+        self._latency = latency_distribution(latency)
+        self.error_rates = dict(error_rates or {})
+        self.timeout_delay = timeout_delay
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), self._handler_class())
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        host, port = self.server.server_address
+        return f"http://{host}:{port}"
+
+    def count(self, path):
+        with self._lock:
+            self.hits[path] = self.hits.get(path, 0) + 1
+
+    def draw_fault(self):
+        """(delay in seconds, injected status / "timeout" / None) for one request"""
+        with self._lock:
+            delay = self._latency(self._rng)
+            roll = self._rng.random()
+
+        for fault, rate in self.error_rates.items():
+            if roll < rate:
+                with self._lock:
+                    self.faults[fault] = self.faults.get(fault, 0) + 1
+                return delay, fault
+            roll -= rate
+        return delay, None
+
+    def handle(self, method, path, query, headers, body):
+        """Return (status, content_type, body); overridden per stand-in"""
+        return 404, "application/json", {"error": "Not found"}
+
+    def _handler_class(self):
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _dispatch(self, method):
+                parsed = urlparse(self.path)
+                query = {k: v[-1] for k, v in parse_qs(parsed.query).items()}
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length) if length else b""
+
+                stand_in.count(parsed.path)
+                delay, fault = stand_in.draw_fault()
+                if fault == "timeout":
+                    delay += stand_in.timeout_delay
+                if delay:
+                    time.sleep(delay)
+
+                if fault and fault != "timeout":
+                    status, content_type, payload = int(fault), "application/json", {"error": "Injected failure"}
+                else:
+                    status, content_type, payload = stand_in.handle(method, parsed.path, query, self.headers, body)
+                if not isinstance(payload, (bytes, str)):
+                    payload = json.dumps(payload)
+                if isinstance(payload, str):
+                    payload = payload.encode("utf-8")
+
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_GET(self):
+                self._dispatch("GET")
+
+            def do_POST(self):
+                self._dispatch("POST")
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+class MillionVerifierStandIn(StandInServer):
+    """
+    Million Verifier single (/api/v3/) and bulk (/bulkapi/v2/) endpoints
+    Bulk jobs report in_progress for polls_until_finished polls.
+    """
+
+    def __init__(self, polls_until_finished=1, **options):
+        super().__init__(**options)
+        self.polls_until_finished = polls_until_finished
+        self.files = {}
+        self._ids = itertools.count(1)
+
+    @property
+    def single_url(self):
+        return f"{self.url}/api/v3/"
+
+    @property
+    def bulk_url(self):
+        return f"{self.url}/bulkapi/v2/"
+
+    def handle(self, method, path, query, headers, body):
+        if path == "/api/v3/":
+            email = query.get("email", "")
+            return 200, "application/json", {"email": email, "result": million_verifier_result(email)}
+
+        if path == "/bulkapi/v2/upload" and method == "POST":
+            content = _parse_multipart_file(headers.get("Content-Type"), body).decode("utf-8")
+            emails = [line.strip() for line in content.splitlines() if line.strip()]
+            file_id = str(next(self._ids))
+            self.files[file_id] = {"emails": emails, "polls": 0}
+            return 200, "application/json", {"file_id": file_id, "status": "in_progress", "total_rows": len(emails)}
+
+        job = self.files.get(query.get("file_id"))
+        if path.startswith("/bulkapi/v2/") and not job:
+            return 200, "application/json", {"error": "File not found"}
+
+        if path == "/bulkapi/v2/fileinfo":
+            job["polls"] += 1
+            finished = job["polls"] > self.polls_until_finished
+            return 200, "application/json", {
+                "file_id": query.get("file_id"),
+                "status": "finished" if finished else "in_progress",
+                "percent": 100 if finished else 50,
+                "total_rows": len(job["emails"])
+            }
+
+        if path == "/bulkapi/v2/download":
+            output = io.StringIO()
+            writer = csv.writer(output)
+            writer.writerow(["email", "quality", "result", "free", "role"])
+            for email in job["emails"]:
+                result = million_verifier_result(email)
+                writer.writerow([email, "good" if result == "ok" else "bad", result, "no", "no"])
+            return 200, "text/csv", output.getvalue()
+
+        return super().handle(method, path, query, headers, body)
+
+
+class ParloStandIn(StandInServer):
+    """
+    Parlo /api/v1/users/search and /api/v1/agents/redeem over seeded users
+    Unknown users get 404, a missing x-api-key on redeem gets 401.
+    """
+
+    def __init__(self, users=1000, seed=0, **options):
+        super().__init__(seed=seed, **options)
+        self.users = parlo_fixture_users(users, seed)
+        self.by_email = {u["email"]: u for u in self.users}
+        self.by_phone = {u["phoneNumber"]: u for u in self.users}
+        self.redeemed = set()
+
+    @property
+    def base_url(self):
+        return f"{self.url}/api/v1"
+
+    def find(self, email=None, phone_number=None):
+        if email:
+            return self.by_email.get(email.strip().lower())
+        if phone_number:
+            return self.by_phone.get(phone_number.strip())
+        return None
+
+    def handle(self, method, path, query, headers, body):
+        if path == "/api/v1/users/search" and method == "GET":
+            user = self.find(query.get("email"), query.get("phoneNumber"))
+            if not user:
+                return 404, "application/json", {"error": "User not found"}
+            return 200, "application/json", user
+
+        if path == "/api/v1/agents/redeem" and method == "POST":
+            if not headers.get("x-api-key"):
+                return 401, "application/json", {"error": "Unauthorized"}
+
+            data = json.loads(body or b"{}")
+            user = self.find(data.get("email"), data.get("phoneNumber"))
+            if not user:
+                return 404, "application/json", {"error": "User not found"}
+
+            with self._lock:
+                self.redeemed.add(user["id"])
+            return 200, "application/json", user
+
+        return super().handle(method, path, query, headers, body)
+
+
+def site_config(parlo, million_verifier):
+    """site_config.json keys pointing the app at running stand-ins"""
+    return {
+        "parlo_api_url": parlo.base_url,
+        "million_verifier_url": million_verifier.single_url,
+        "million_verifier_bulk_url": million_verifier.bulk_url,
+    }
+
+
+def _parse_latency(value):
+    if not value:
+        return None
+    kind, *args = value.split(":")
+    return (kind, *args) if args else float(kind)
+
+
+def _parse_errors(value):
+    rates = {}
+    for item in filter(None, (value or "").split(",")):
+        fault, rate = item.split("=")
+        rates[fault if fault == "timeout" else int(fault)] = float(rate)
+    return rates
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the Parlo and Million Verifier stand-ins")
+    parser.add_argument("--users", type=int, default=1000, help="seeded Parlo users")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--latency", help="e.g. 0.05, uniform:0.02:0.2 or lognormal:0.08:0.5")
+    parser.add_argument("--errors", help="e.g. 500=0.01,409=0.02,timeout=0.005")
+    parser.add_argument("--timeout-delay", type=float, default=15)
+    parser.add_argument("--parlo-port", type=int, default=0)
+    parser.add_argument("--million-verifier-port", type=int, default=0)
+    args = parser.parse_args()
+
+    options = {
+        "latency": _parse_latency(args.latency),
+        "error_rates": _parse_errors(args.errors),
+        "timeout_delay": args.timeout_delay,
+        "seed": args.seed,
+    }
+    parlo = ParloStandIn(users=args.users, port=args.parlo_port, **options)
+    million_verifier = MillionVerifierStandIn(port=args.million_verifier_port, **options)
+
+    with parlo, million_verifier:
+        print(json.dumps(site_config(parlo, million_verifier), indent=1))
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+"""
+Import time and memory of the app's modules
+
+    python -m parlo_license_manager.benchmarks.startup [--output startup.json] [--baseline old.json]
+
+Run with the bench's Python. Every module is imported in a fresh
+interpreter that has already imported frappe (as every web and RQ worker
+has), and reports the import time, the RSS it added and the heavy
+dependencies it pulled in. Heavy dependencies must only load on first use
+of the paths that need them (bulk upload, Excel export, outbound HTTP),
+so any module importing one is a regression; so is a module whose import
+time grew by more than the threshold against a baseline report. The exit
+status is 1 when there are regressions.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+PACKAGE = "parlo_license_manager"
+PRELOAD = ("frappe", "frappe.model.document")
+HEAVY = ("pandas", "numpy", "pyarrow", "openpyxl", "xlsxwriter", "requests", "urllib3")
+# Modules that exist to hold a heavy dependency and are only imported on first use
+LAZY_MODULES = {f"{PACKAGE}.api.http_adapters": ("requests", "urllib3")}
+SKIP_DIRS = {"tests", "benchmarks", "patches", "__pycache__", "public", "templates"}
+REGRESSION_THRESHOLD = 0.25
+MIN_REGRESSION_MS = 10
+
+# Runs in the fresh interpreter; argv holds comma-separated preload, heavy
+# and module lists
+CHILD = """
+import importlib, json, sys, time
+
+def rss_kb():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+preload, heavy, modules = (arg.split(",") if arg else [] for arg in sys.argv[1:4])
+for name in preload:
+    importlib.import_module(name)
+
+loaded, rss = set(sys.modules), rss_kb()
+started = time.perf_counter()
+for name in modules:
+    importlib.import_module(name)
+
+print(json.dumps({
+    "import_ms": round((time.perf_counter() - started) * 1000, 2),
+    "rss_kb": rss_kb() - rss,
+    "heavy": sorted(m for m in heavy if m in sys.modules and m not in loaded),
+}))
+"""
+
+
+def discover_modules():
+    """hooks and every importable module of the app, tests and benchmarks aside"""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    modules = []
+
+    for path, dirs, files in os.walk(root):
+        dirs[:] = sorted(d for d in dirs if d not in SKIP_DIRS)
+        package = os.path.relpath(path, os.path.dirname(root)).replace(os.sep, ".")
+        for filename in sorted(files):
+            if not filename.endswith(".py") or filename.startswith("test_"):
+                continue
+            name = filename[:-3]
+            modules.append(package if name == "__init__" else f"{package}.{name}")
+
+    return modules
+
+
+def measure(modules):
+    """Import modules together in a fresh interpreter; returns import_ms, rss_kb and heavy"""
+    if isinstance(modules, str):
+        modules = [modules]
+
+    result = subprocess.run(
+        [sys.executable, "-c", CHILD, ",".join(PRELOAD), ",".join(HEAVY), ",".join(modules)],
+        capture_output=True, text=True
+    )
+    if result.returncode:
+        return {"error": result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "import failed"}
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def check(report, baseline=None, threshold=REGRESSION_THRESHOLD):
+    """Modules that pull in heavy dependencies, fail to import or got slower than baseline"""
+    regressions = {}
+
+    for name, result in report["modules"].items():
+        if result.get("error"):
+            regressions[name] = f"import failed: {result['error']}"
+        elif set(result["heavy"]) - set(LAZY_MODULES.get(name, ())):
+            regressions[name] = f"imports {', '.join(result['heavy'])}"
+        elif baseline and name in baseline["modules"] and "import_ms" in baseline["modules"][name]:
+            before, after = baseline["modules"][name]["import_ms"], result["import_ms"]
+            if after - before > max(MIN_REGRESSION_MS, before * threshold):
+                regressions[name] = f"import time {before} -> {after} ms"
+
+    return regressions
+
+
+def run(modules=None, output=None, baseline=None, threshold=REGRESSION_THRESHOLD):
+    """Measure every module, and all but the lazy ones together; returns the report"""
+    from parlo_license_manager.benchmarks.suite import get_commit_of
+
+    modules = modules or discover_modules()
+    report = {
+        "meta": {
+            "commit": get_commit_of(os.path.dirname(os.path.abspath(__file__))),
+            "python": sys.version.split()[0],
+            "preload": list(PRELOAD),
+            "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
+        },
+        "modules": {name: measure(name) for name in modules},
+        "all": measure([name for name in modules if name not in LAZY_MODULES]),
+    }
+
+    if isinstance(baseline, str):
+        with open(baseline) as f:
+            baseline = json.load(f)
+    report["regressions"] = check(report, baseline, threshold)
+
+    if output:
+        with open(output, "w") as f:
+            json.dump(report, f, indent=1)
+
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--output")
+    parser.add_argument("--baseline")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD)
+    args = parser.parse_args()
+
+    report = run(output=args.output, baseline=args.baseline, threshold=args.threshold)
+
+    for name, result in sorted(report["modules"].items(), key=lambda item: -item[1].get("import_ms", 0)):
+        if result.get("error"):
+            print(f"{name:<70} error: {result['error']}")
+        else:
+            heavy = f"  [{', '.join(result['heavy'])}]" if result["heavy"] else ""
+            print(f"{name:<70} {result['import_ms']:8.1f} ms {result['rss_kb'] / 1024:7.1f} MB{heavy}")
+
+    everything = report["all"]
+    if not everything.get("error"):
+        print(f"{'all modules':<70} {everything['import_ms']:8.1f} ms {everything['rss_kb'] / 1024:7.1f} MB")
+
+    for name, reason in report["regressions"].items():
+        print(f"REGRESSION {name}: {reason}")
+
+    sys.exit(1 if report["regressions"] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,274 @@
+"""
+Benchmark suite for the license workflows
+
+    bench --site <site> execute parlo_license_manager.benchmarks.data.generate --kwargs "{'scale': '100k'}"
+    bench --site <site> execute parlo_license_manager.benchmarks.suite.run \
+        --kwargs "{'output': 'bench-new.json', 'baseline': 'bench-old.json'}"
+
+Times the dashboard, search, allocation, bulk upload, permission hook and
+license count paths against the data from benchmarks.data. Every
+benchmark runs once to warm up and then `repeat` times; the report holds
+min / median / p90 / max milliseconds and the median query count, plus
+the commit and data scale it was taken at, so reports of two commits can
+be compared with compare(). Read-only benchmarks are rolled back.
+allocate_license and bulk allocation commit like the real thing, adding
+phone-only Contacts (no welcome emails) to the first bench organization.
+Do not run this against a production site.
+"""
+import json
+import os
+import random
+import subprocess
+import time
+
+import frappe
+
+from parlo_license_manager.benchmarks import data
+from parlo_license_manager.benchmarks.load_test import allocation_records, percentile, upload_csv
+from parlo_license_manager.benchmarks.permissions import count_calls, list_view
+from parlo_license_manager.benchmarks.stand_in import MillionVerifierStandIn, ParloStandIn, site_config
+
+BULK_ROWS = 200
+SEARCH_TERMS = ("aisha", "khoury", "omar.h", "0000042", "+97150000")
+REGRESSION_THRESHOLD = 0.25
+
+# name -> (function(suite), commits)
+BENCHMARKS = {}
+
+
+def benchmark(name, commits=False):
+    def register(func):
+        BENCHMARKS[name] = (func, commits)
+        return func
+    return register
+
+
+class Suite:
+    """State shared by the benchmarks of one run"""
+
+    def __init__(self, repeat, seed):
+        self.repeat = repeat
+        self.rng = random.Random(seed)
+        self.organization = data.organization_name(1)
+        self.campaign_code = frappe.db.get_value("Organization", self.organization, "campaign_code")
+        self.parlo_users = []
+        self.next_phone = self.rng.randrange(10 ** 7)
+
+    def phones(self, count):
+        """First number of a block of count unused allocation phone numbers"""
+        first, self.next_phone = self.next_phone, self.next_phone + count
+        return first
+
+    def time(self, func, commits):
+        """Warm up, then time func repeat times; returns the benchmark result"""
+        timings, queries = [], []
+
+        for i in range(self.repeat + 1):
+            with count_calls() as counts:
+                started = time.perf_counter()
+                func(self)
+                elapsed = (time.perf_counter() - started) * 1000
+
+            if not commits:
+                frappe.db.rollback()
+            if i:
+                timings.append(elapsed)
+                queries.append(counts["queries"])
+
+        timings.sort()
+        return {
+            "runs": len(timings),
+            "min_ms": round(timings[0], 2),
+            "median_ms": round(percentile(timings, 0.5), 2),
+            "p90_ms": round(percentile(timings, 0.9), 2),
+            "max_ms": round(timings[-1], 2),
+            "queries": percentile(sorted(queries), 0.5),
+        }
+
+
+@benchmark("dashboard_get_context")
+def dashboard_get_context(suite):
+    from parlo_license_manager.www.parlo_dashboard import get_context
+
+    frappe.set_user(data.BENCH_MANAGER)
+    frappe.form_dict.organization = suite.organization
+    try:
+        get_context(frappe._dict())
+    finally:
+        frappe.form_dict.pop("organization", None)
+        frappe.set_user("Administrator")
+
+
+@benchmark("search_contacts_and_leads")
+def search_contacts_and_leads(suite):
+    from parlo_license_manager.www.parlo_dashboard import search_contacts_and_leads
+
+    for term in SEARCH_TERMS:
+        search_contacts_and_leads(term, suite.organization)
+
+
+@benchmark("allocate_license", commits=True)
+def allocate_license(suite):
+    from parlo_license_manager.utils.license_generator import allocate_license
+
+    record = allocation_records(1, suite.phones(1))[0]
+    result = allocate_license({"first_name": record["name"], "phone": record["phone"]}, suite.organization)
+    if not result.get("success"):
+        frappe.throw(result.get("error") or "allocate_license failed")
+
+
+@benchmark("validate_bulk_upload")
+def validate_bulk_upload(suite):
+    from parlo_license_manager.utils.bulk_upload import validate_bulk_upload
+
+    content = upload_csv(suite.parlo_users, BULK_ROWS, suite.rng)
+    result = validate_bulk_upload(content, suite.organization, filename="benchmark.csv")
+    if not result.get("success"):
+        frappe.throw(result.get("error") or "validate_bulk_upload failed")
+
+
+@benchmark("process_bulk_allocation", commits=True)
+def process_bulk_allocation(suite):
+    from parlo_license_manager.utils.bulk_upload import process_bulk_allocation
+
+    result = process_bulk_allocation(allocation_records(BULK_ROWS, suite.phones(BULK_ROWS)), suite.organization)
+    if not result.get("success"):
+        frappe.throw(result.get("error") or "process_bulk_allocation failed")
+
+
+@benchmark("permission_hooks_contact")
+def permission_hooks_contact(suite):
+    rows = frappe.get_all("Contact", filters={"license_organization": suite.organization},
+        fields=["name", "license_organization"], limit=20)
+    list_view("Contact", data.BENCH_MANAGER, rows)
+
+
+@benchmark("permission_hooks_lead")
+def permission_hooks_lead(suite):
+    rows = frappe.get_all("Lead", filters={"campaign_code": suite.campaign_code},
+        fields=["name", "campaign_code"], limit=20)
+    list_view("Lead", data.BENCH_MANAGER, rows)
+
+
+@benchmark("update_license_counts", commits=True)
+def update_license_counts(suite):
+    from parlo_license_manager.utils.organization import update_license_counts
+
+    update_license_counts(suite.organization)
+
+
+def get_commit():
+    """Commit of the app checkout, with a "+dirty" suffix for local changes"""
+    return get_commit_of(os.path.dirname(frappe.get_app_path("parlo_license_manager")))
+
+
+def get_commit_of(path):
+    try:
+        commit = subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=path, text=True).strip()
+        dirty = subprocess.check_output(["git", "status", "--porcelain", "--untracked-files=no"], cwd=path, text=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return f"{commit}+dirty" if dirty.strip() else commit
+
+
+def compare(report, baseline, threshold=REGRESSION_THRESHOLD):
+    """
+    Median changes of report against baseline (reports or paths to them)
+    Benchmarks more than threshold slower are listed as regressions.
+    """
+    report, baseline = (_load(r) for r in (report, baseline))
+    changes, regressions = {}, []
+
+    for name, result in report["benchmarks"].items():
+        before = baseline["benchmarks"].get(name)
+        if not before or not before.get("median_ms"):
+            continue
+
+        change = result["median_ms"] / before["median_ms"] - 1
+        changes[name] = {
+            "before_ms": before["median_ms"],
+            "after_ms": result["median_ms"],
+            "change": round(change, 3),
+            "queries_before": before.get("queries"),
+            "queries_after": result.get("queries"),
+        }
+        if change > threshold:
+            regressions.append(name)
+
+    return {
+        "baseline_commit": baseline["meta"].get("commit"),
+        "commit": report["meta"].get("commit"),
+        "same_scale": baseline["meta"].get("scale") == report["meta"].get("scale"),
+        "threshold": threshold,
+        "changes": changes,
+        "regressions": regressions,
+    }
+
+
+def _load(report):
+    if isinstance(report, str):
+        with open(report) as f:
+            return json.load(f)
+    return report
+
+
+def run(repeat=5, only=None, output=None, baseline=None, threshold=REGRESSION_THRESHOLD, seed=0):
+    """
+    Run the suite (or the benchmarks named in only); returns the report
+    output: path to write the JSON report to
+    baseline: report (or path) of another commit to compare against
+    """
+    if not data.bench_organizations():
+        frappe.throw("No bench data on this site, run parlo_license_manager.benchmarks.data.generate first")
+
+    if isinstance(only, str):
+        only = [only]
+    names = [name for name in BENCHMARKS if not only or name in only]
+    repeat = int(repeat)
+
+    frappe.set_user("Administrator")
+    suite = Suite(repeat, seed)
+
+    # Headroom for the committing benchmarks
+    data.ensure_organization(1, (repeat + 1) * (BULK_ROWS + 1))
+    frappe.db.commit()
+
+    report = {
+        "meta": {
+            "commit": get_commit(),
+            "site": frappe.local.site,
+            "timestamp": frappe.utils.now(),
+            "repeat": repeat,
+            "seed": seed,
+            "scale": data.get_scale(),
+        },
+        "benchmarks": {},
+    }
+
+    with ParloStandIn(seed=seed) as parlo, MillionVerifierStandIn(seed=seed) as verifier:
+        suite.parlo_users = parlo.users
+        conf = site_config(parlo, verifier)
+        previous = {key: frappe.local.conf.get(key) for key in conf}
+        frappe.local.conf.update(conf)
+
+        try:
+            for name in names:
+                func, commits = BENCHMARKS[name]
+                result = suite.time(func, commits)
+                report["benchmarks"][name] = result
+                print(f"{name}: median {result['median_ms']} ms, p90 {result['p90_ms']} ms, "
+                      f"{result['queries']} queries")
+        finally:
+            frappe.local.conf.update(previous)
+
+    if baseline:
+        report["comparison"] = compare(report, baseline, float(threshold))
+        for name in report["comparison"]["regressions"]:
+            change = report["comparison"]["changes"][name]
+            print(f"REGRESSION {name}: {change['before_ms']} -> {change['after_ms']} ms")
+
+    if output:
+        with open(output, "w") as f:
+            json.dump(report, f, indent=1)
+
+    return report
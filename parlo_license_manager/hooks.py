@@ -41,4 +41,69 @@ permission_query_conditions = {
 has_permission = {
     "Contact": "parlo_license_manager.permissions.contact_permission",
     "Lead": "parlo_license_manager.permissions.lead_permission"
-}
\ No newline at end of file
+}
+
+# Document Events
+# ---------------
+
+doc_events = {
+    "Organization": {
+        "on_update": [
+            "parlo_license_manager.utils.access_map.on_organization_change",
+            "parlo_license_manager.utils.organization.clear_license_managers_cache"
+        ],
+        "on_trash": [
+            "parlo_license_manager.utils.access_map.on_organization_change",
+            "parlo_license_manager.utils.organization.clear_license_managers_cache"
+        ]
+    },
+    "Contact": {
+        "on_update": [
+            "parlo_license_manager.utils.search_index.update_contact_index",
+            "parlo_license_manager.utils.access_map.on_contact_change"
+        ],
+        "on_trash": [
+            "parlo_license_manager.utils.search_index.remove_document_index",
+            "parlo_license_manager.utils.access_map.on_contact_change"
+        ]
+    },
+    "Lead": {
+        "on_update": [
+            "parlo_license_manager.utils.search_index.update_lead_index",
+            "parlo_license_manager.utils.license_stats.update_lead_stats"
+        ],
+        "on_trash": [
+            "parlo_license_manager.utils.search_index.remove_document_index",
+            "parlo_license_manager.utils.license_stats.update_lead_stats"
+        ]
+    },
+    "User": {
+        "on_update": [
+            "parlo_license_manager.utils.access_map.on_user_change",
+            "parlo_license_manager.utils.organization.clear_license_managers_cache"
+        ],
+        "on_trash": [
+            "parlo_license_manager.utils.access_map.on_user_change",
+            "parlo_license_manager.utils.organization.clear_license_managers_cache"
+        ]
+    }
+}
+
+# Request Events
+# --------------
+# Per-endpoint timing, DB and HTTP metrics (utils.instrumentation)
+
+before_request = ["parlo_license_manager.utils.instrumentation.start_request"]
+after_request = ["parlo_license_manager.utils.instrumentation.end_request"]
+
+# Scheduled Tasks
+# ---------------
+
+scheduler_events = {
+    "all": [
+        "parlo_license_manager.utils.welcome_email.drain_welcome_emails"
+    ],
+    "daily": [
+        "parlo_license_manager.api.million_verifier.purge_expired_verifications"
+    ]
+}
@@ -6,6 +6,7 @@ def after_install():
     # Organization is now a proper DocType, no need for custom fields
     create_contact_custom_fields()
     create_lead_custom_fields()
+    create_dashboard_indexes()
     create_custom_roles()
     create_workspace()
     # Web forms will be created via fixtures or manually
@@ -14,6 +15,7 @@ def after_migrate():
     """Called after app migration"""
     create_contact_custom_fields()
     create_lead_custom_fields()
+    create_dashboard_indexes()
     update_organization_available_licenses()
 
 def create_contact_custom_fields():
@@ -118,6 +120,18 @@ def create_lead_custom_fields():
     except Exception as e:
         frappe.log_error(f"Error creating Lead custom fields: {str(e)}", "Installation")
 
+def create_dashboard_indexes():
+    """Indexes backing the keyset-paginated dashboard lists"""
+    
+    try:
+        frappe.db.add_index("Contact", ["license_organization", "creation", "name"],
+            index_name="parlo_license_org_creation")
+        frappe.db.add_index("Lead", ["campaign_code", "creation", "name"],
+            index_name="parlo_campaign_creation")
+        frappe.db.commit()
+    except Exception as e:
+        frappe.log_error(f"Error creating dashboard indexes: {str(e)}", "Installation")
+
 def create_custom_roles():
     """Create custom roles for the app"""
     
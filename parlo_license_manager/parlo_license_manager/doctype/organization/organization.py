@@ -4,6 +4,7 @@
 import frappe
 from frappe.model.document import Document
 from frappe import _
+from parlo_license_manager.utils.license_stats import update_organization_stats
 
 class Organization(Document):
     def validate(self):
@@ -44,6 +45,7 @@ class Organization(Document):
     def on_update(self):
         # Clear cache for organization
         frappe.cache().hdel("organization_data", self.name)
+        update_organization_stats(self)
         
         # Update permissions for license managers
         if self.has_value_changed("license_managers"):
@@ -96,18 +98,19 @@ class Organization(Document):
         if not self.has_parlo_license:
             frappe.throw(_("Parlo License is not enabled for this organization"))
         
+        from parlo_license_manager.utils.license_generator import reserve_license_series, format_license_number
+        
         if not self.license_prefix:
             self.validate()  # This will auto-generate prefix
+            self.db_set("license_prefix", self.license_prefix, update_modified=False)
         
-        # Increment series
-        self.current_license_series = (self.current_license_series or 0) + 1
-        next_number = self.current_license_series
-        
-        # Format license number with prefix and padded number
-        license_number = f"{self.license_prefix}{str(next_number).zfill(5)}"
+        # Increment series atomically so concurrent callers never share a number
+        first, next_number = reserve_license_series(self.name, 1)
+        # The reservation bumped modified; keep this doc saveable
+        self.current_license_series, self.modified = frappe.db.get_value(
+            "Organization", self.name, ["current_license_series", "modified"])
         
-        self.save(ignore_permissions=True)
-        return license_number
+        return format_license_number(self.license_prefix, next_number)
     
     @staticmethod
     def get_active_organizations():
@@ -49,6 +49,19 @@ class TestOrganization(unittest.TestCase):
         self.org.update_license_count(increment=False, count=1)
         self.assertEqual(self.org.used_licenses, initial_used)
     
+    def test_license_stats(self):
+        """Test cached license stats and forced refresh"""
+        from parlo_license_manager.utils.license_stats import get_license_stats
+        
+        stats = get_license_stats(self.org.name, force_refresh=True)
+        self.assertEqual(stats["total_licenses"], self.org.total_licenses)
+        self.assertEqual(stats["available_licenses"], self.org.available_licenses)
+        self.assertEqual(stats["computed_at"], stats["updated_at"])
+        
+        cached = get_license_stats(self.org.name)
+        self.assertEqual(cached["computed_at"], stats["computed_at"])
+        self.assertGreaterEqual(cached["age"], 0)
+    
     def tearDown(self):
         # Clean up test data if needed
         pass
@@ -4,7 +4,6 @@
 import frappe
 from frappe.model.document import Document
 from frappe import _
-from parlo_license_manager.api.parlo_integration import authenticate_user as parlo_authenticate
 
 class ParloAuthenticationLog(Document):
     def validate(self):
@@ -32,6 +31,8 @@ class ParloAuthenticationLog(Document):
     
     def authenticate_with_parlo(self):
         """Authenticate user with Parlo API"""
+        from parlo_license_manager.api.parlo_integration import authenticate_user as parlo_authenticate
+        
         try:
             # Call Parlo authentication
             result = parlo_authenticate(
@@ -0,0 +1,13 @@
+import frappe
+from frappe.model.document import Document
+
+class ParloEmailVerification(Document):
+    def autoname(self):
+        """Name by normalized email so lookups match regardless of case"""
+        self.email = (self.email or "").strip().lower()
+        self.name = self.email
+
+    def validate(self):
+        """Set verification time if not set"""
+        if not self.verified_on:
+            self.verified_on = frappe.utils.now()
@@ -0,0 +1,19 @@
+import frappe
+import unittest
+from parlo_license_manager.api.million_verifier import load_verifications, save_verifications
+
+class TestParloEmailVerification(unittest.TestCase):
+    def test_store_roundtrip(self):
+        save_verifications({"Verified@Example.com": {"result": "ok", "email": "Verified@Example.com"}})
+
+        stored = load_verifications(["verified@example.com"])
+        self.assertTrue(stored["verified@example.com"]["valid"])
+        self.assertEqual(stored["verified@example.com"]["result"], "ok")
+
+    def test_unstored_results(self):
+        # Results without a TTL (e.g. error) are not persisted
+        save_verifications({"broken@example.com": {"result": "error"}})
+        self.assertFalse(load_verifications(["broken@example.com"]))
+
+    def tearDown(self):
+        frappe.db.rollback()
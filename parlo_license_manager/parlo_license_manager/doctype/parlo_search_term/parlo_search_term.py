@@ -0,0 +1,13 @@
+import frappe
+from frappe.model.document import Document
+
+class ParloSearchTerm(Document):
+    """One searchable term of a Contact or Lead, see utils.search_index"""
+    pass
+
+def on_doctype_update():
+    """Composite indexes for prefix lookups and per-document maintenance"""
+    frappe.db.add_index("Parlo Search Term", ["reference_doctype", "scope", "kind", "term"],
+        index_name="lookup")
+    frappe.db.add_index("Parlo Search Term", ["reference_doctype", "reference_name"],
+        index_name="reference")
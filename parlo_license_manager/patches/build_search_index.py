@@ -0,0 +1,8 @@
+import frappe
+from parlo_license_manager.utils.search_index import rebuild_search_index
+
+def execute():
+    """Index existing license holders and campaign leads for dashboard search"""
+    
+    frappe.reload_doc("parlo_license_manager", "doctype", "parlo_search_term")
+    rebuild_search_index()
@@ -1,150 +1,178 @@
+import functools
+
 import frappe
+from parlo_license_manager.utils.access_map import LICENSE_MANAGER, ORGANIZATION_MEMBER, get_user_access
+from parlo_license_manager.utils.instrumentation import span
 
-def contact_query(user):
+class AccessContext:
+    """
+    Roles and organization access of one user, computed once per request
+    A list view calls the permission hooks once per row; every hook reads
+    from the same context, which looks the user up in the access map once.
+    """
+
+    def __init__(self, user):
+        self.user = user
+
+    @functools.cached_property
+    def roles(self):
+        return frozenset(frappe.get_roles(self.user))
+
+    @property
+    def is_system_manager(self):
+        return "System Manager" in self.roles
+
+    @property
+    def is_member(self):
+        return ORGANIZATION_MEMBER in self.roles
+
+    @functools.cached_property
+    def organizations(self):
+        """organization -> {role, campaign_code} from the access map"""
+        return get_user_access(self.user)
+
+    def _orgs(self, role):
+        return frozenset(org for org, access in self.organizations.items() if access["role"] == role)
+
+    @functools.cached_property
+    def managed_orgs(self):
+        """Organizations where the user is a license manager"""
+        return self._orgs(LICENSE_MANAGER)
+
+    @functools.cached_property
+    def member_orgs(self):
+        """Organizations linked to the user's Contact (read only)"""
+        return self._orgs(ORGANIZATION_MEMBER) if self.is_member else frozenset()
+
+    @property
+    def readable_orgs(self):
+        return self.managed_orgs | self.member_orgs
+
+    def _campaign_codes(self, orgs):
+        return frozenset(
+            self.organizations[org]["campaign_code"] for org in orgs
+            if self.organizations[org]["campaign_code"]
+        )
+
+    @functools.cached_property
+    def managed_campaign_codes(self):
+        return self._campaign_codes(self.managed_orgs)
+
+    @functools.cached_property
+    def campaign_codes(self):
+        return self._campaign_codes(self.readable_orgs)
+
+def get_access_context(user=None):
+    """Request-scoped AccessContext for user (defaults to the session user)"""
+    user = user or frappe.session.user
+
+    contexts = getattr(frappe.local, "parlo_access_contexts", None)
+    if contexts is None:
+        contexts = frappe.local.parlo_access_contexts = {}
+
+    if user not in contexts:
+        contexts[user] = AccessContext(user)
+    return contexts[user]
+
+def clear_access_context():
+    """Forget the contexts of this request, e.g. after changing roles or memberships"""
+    frappe.local.parlo_access_contexts = {}
+
+def _contact_query(user):
     """Permission query for Contact based on organization"""
-    
-    if not user:
-        user = frappe.session.user
-    
+
+    access = get_access_context(user)
+
     # System Manager can see all
-    if "System Manager" in frappe.get_roles(user):
+    if access.is_system_manager:
         return None
-    
-    # License Manager can see contacts from their organizations
-    if "License Manager" in frappe.get_roles(user):
-        # Get organizations where user is a license manager
-        orgs = frappe.db.sql_list("""
-            SELECT name FROM `tabOrganization`
-            WHERE has_parlo_license = 1
-            AND license_managers LIKE %s
-        """, f"%{user}%")
-        
-        if orgs:
-            return f"(`tabContact`.license_organization IN ({','.join(['%s']*len(orgs))}))", tuple(orgs)
-    
-    # Organization Member can see contacts from their organization
-    if "Organization Member" in frappe.get_roles(user):
-        # Get user's contact
-        contact = frappe.db.get_value("Contact", {"user": user}, "name")
-        if contact:
-            # Get organizations linked to user's contact
-            orgs = frappe.db.sql_list("""
-                SELECT link_name FROM `tabDynamic Link`
-                WHERE parent = %s
-                AND link_doctype = 'Organization'
-            """, contact)
-            
-            if orgs:
-                return f"(`tabContact`.license_organization IN ({','.join(['%s']*len(orgs))}))", tuple(orgs)
-    
+
+    # License Manager can see contacts from their organizations,
+    # Organization Member from the organizations linked to their contact
+    orgs = sorted(access.readable_orgs)
+    if orgs:
+        return f"(`tabContact`.license_organization IN ({','.join(['%s']*len(orgs))}))", tuple(orgs)
+
     # Default: no access
     return "(1=0)"
 
-def contact_permission(doc, user, permission_type):
+def _contact_permission(doc, user, permission_type):
     """Permission check for individual Contact"""
-    
-    if not user:
-        user = frappe.session.user
-    
+
+    access = get_access_context(user)
+
     # System Manager has full access
-    if "System Manager" in frappe.get_roles(user):
+    if access.is_system_manager:
         return True
-    
+
     # Check if user has access to the organization
     if doc.license_organization:
         # License Manager check
-        if "License Manager" in frappe.get_roles(user):
-            org = frappe.get_doc("Organization", doc.license_organization)
-            if org.license_managers and user in org.license_managers:
-                return True
-        
+        if doc.license_organization in access.managed_orgs:
+            return True
+
         # Organization Member check (read only)
-        if "Organization Member" in frappe.get_roles(user) and permission_type == "read":
-            contact = frappe.db.get_value("Contact", {"user": user}, "name")
-            if contact:
-                orgs = frappe.db.sql_list("""
-                    SELECT link_name FROM `tabDynamic Link`
-                    WHERE parent = %s
-                    AND link_doctype = 'Organization'
-                    AND link_name = %s
-                """, (contact, doc.license_organization))
-                
-                if orgs:
-                    return True
-    
+        if permission_type == "read" and doc.license_organization in access.member_orgs:
+            return True
+
     return False
 
-def lead_query(user):
+def _lead_query(user):
     """Permission query for Lead based on campaign code"""
-    
-    if not user:
-        user = frappe.session.user
-    
+
+    access = get_access_context(user)
+
     # System Manager can see all
-    if "System Manager" in frappe.get_roles(user):
+    if access.is_system_manager:
         return None
-    
+
     # Get campaign codes from organizations user has access to
-    campaign_codes = get_user_campaign_codes(user)
-    
+    campaign_codes = sorted(access.campaign_codes)
+
     if campaign_codes:
         return f"(`tabLead`.campaign_code IN ({','.join(['%s']*len(campaign_codes))}))", tuple(campaign_codes)
-    
+
     # Default: no access
     return "(1=0)"
 
-def lead_permission(doc, user, permission_type):
+def _lead_permission(doc, user, permission_type):
     """Permission check for individual Lead"""
-    
-    if not user:
-        user = frappe.session.user
-    
+
+    access = get_access_context(user)
+
     # System Manager has full access
-    if "System Manager" in frappe.get_roles(user):
+    if access.is_system_manager:
+        return True
+
+    # License Manager has full access to their campaigns
+    if doc.campaign_code in access.managed_campaign_codes:
+        return True
+
+    # Organization Member has read access only
+    if permission_type == "read" and doc.campaign_code in access.campaign_codes:
         return True
-    
-    # Check if user has access to the campaign code
-    if doc.campaign_code:
-        campaign_codes = get_user_campaign_codes(user)
-        if doc.campaign_code in campaign_codes:
-            # License Manager has full access
-            if "License Manager" in frappe.get_roles(user):
-                return True
-            # Organization Member has read access only
-            if "Organization Member" in frappe.get_roles(user) and permission_type == "read":
-                return True
-    
+
     return False
 
+# Hooks registered in hooks.py; each call is timed as a span of the request
+# trace (utils.instrumentation)
+def contact_query(user):
+    with span("permissions.contact_query"):
+        return _contact_query(user)
+
+def contact_permission(doc, user, permission_type):
+    with span("permissions.contact_permission"):
+        return _contact_permission(doc, user, permission_type)
+
+def lead_query(user):
+    with span("permissions.lead_query"):
+        return _lead_query(user)
+
+def lead_permission(doc, user, permission_type):
+    with span("permissions.lead_permission"):
+        return _lead_permission(doc, user, permission_type)
+
 def get_user_campaign_codes(user):
     """Get campaign codes from organizations user has access to"""
-    
-    campaign_codes = []
-    
-    # License Manager
-    if "License Manager" in frappe.get_roles(user):
-        codes = frappe.db.sql_list("""
-            SELECT DISTINCT campaign_code 
-            FROM `tabOrganization`
-            WHERE has_parlo_license = 1
-            AND license_managers LIKE %s
-            AND campaign_code IS NOT NULL
-        """, f"%{user}%")
-        campaign_codes.extend(codes)
-    
-    # Organization Member
-    if "Organization Member" in frappe.get_roles(user):
-        contact = frappe.db.get_value("Contact", {"user": user}, "name")
-        if contact:
-            codes = frappe.db.sql_list("""
-                SELECT DISTINCT o.campaign_code
-                FROM `tabDynamic Link` dl
-                JOIN `tabOrganization` o ON o.name = dl.link_name
-                WHERE dl.parent = %s
-                AND dl.link_doctype = 'Organization'
-                AND o.has_parlo_license = 1
-                AND o.campaign_code IS NOT NULL
-            """, contact)
-            campaign_codes.extend(codes)
-    
-    return list(set(campaign_codes))  # Remove duplicates
\ No newline at end of file
+
+    return list(get_access_context(user).campaign_codes)
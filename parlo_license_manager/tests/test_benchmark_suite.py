@@ -0,0 +1,21 @@
+import unittest
+from parlo_license_manager.benchmarks.suite import compare
+
+def report(commit, **medians):
+    return {
+        "meta": {"commit": commit, "scale": {"contacts": 10000}},
+        "benchmarks": {name: {"median_ms": ms, "queries": 3} for name, ms in medians.items()},
+    }
+
+class TestCompare(unittest.TestCase):
+    def test_flags_regressions_over_threshold(self):
+        result = compare(report("b", search=130.0, dashboard=10.0, new=5.0), report("a", search=100.0, dashboard=20.0))
+
+        self.assertEqual(result["regressions"], ["search"])
+        self.assertEqual(result["changes"]["dashboard"]["change"], -0.5)
+        self.assertNotIn("new", result["changes"])
+        self.assertTrue(result["same_scale"])
+
+    def test_threshold(self):
+        result = compare(report("b", search=120.0), report("a", search=100.0), threshold=0.1)
+        self.assertEqual(result["regressions"], ["search"])
@@ -0,0 +1,44 @@
+import threading
+import unittest
+from unittest.mock import patch
+
+import frappe
+from parlo_license_manager.api.million_verifier import MillionVerifierAPI
+from parlo_license_manager.api.parlo_integration import ParloAPI
+from parlo_license_manager.utils.bulk_validation import validate_records
+
+class FlakyParloAPI(ParloAPI):
+    """Raises for one number, logs an API error for another, finds the rest"""
+
+    def _search_user(self, email=None, phone_number=None):
+        if phone_number == "+971500000002":
+            raise RuntimeError("worker exploded")
+        if phone_number == "+971500000003":
+            self.log_error("Parlo search error: boom", "Parlo API")
+            return {"status_code": 500, "success": False, "message": "boom"}
+        return {"status_code": 200, "success": True, "data": {}, "message": "Found"}
+
+class TestBulkValidationWorkers(unittest.TestCase):
+    def test_worker_errors_are_logged_from_calling_thread(self):
+        records = [
+            {"row": i, "phone": f"+97150000000{i}", "email": "", "valid": False, "errors": []}
+            for i in range(1, 6)
+        ]
+        logged = []
+
+        def log_error(message=None, title=None, *args, **kwargs):
+            logged.append((threading.current_thread(), title))
+
+        with patch.object(frappe, "log_error", log_error):
+            validate_records(records, max_workers=4, parlo_api=FlakyParloAPI(), verifier_api=MillionVerifierAPI())
+
+        self.assertFalse(records[1]["valid"])
+        self.assertIn("Validation error: worker exploded", records[1]["errors"])
+        self.assertFalse(records[2]["valid"])
+        self.assertTrue(all(records[i]["valid"] for i in (0, 3, 4)))
+
+        self.assertEqual(sorted(title for _thread, title in logged), ["Bulk Validation", "Parlo API"])
+        self.assertTrue(all(thread is threading.current_thread() for thread, _title in logged))
+
+    def tearDown(self):
+        frappe.db.rollback()
@@ -0,0 +1,36 @@
+import unittest
+from unittest.mock import patch
+
+from parlo_license_manager.utils import email_prefilter
+
+try:
+    import dns.resolver
+except ImportError:
+    dns = None
+
+class FakeResolver:
+    def __init__(self, answers):
+        self.answers = answers
+
+    def resolve(self, domain, record_type):
+        answer = self.answers[record_type]
+        if isinstance(answer, Exception):
+            raise answer
+        return answer
+
+@unittest.skipIf(dns is None, "dnspython is not installed")
+class TestDomainAcceptsMail(unittest.TestCase):
+    def check(self, mx, a):
+        with patch.object(email_prefilter, "_get_resolver", lambda: FakeResolver({"MX": mx, "A": a})):
+            return email_prefilter.domain_accepts_mail("example.com")
+
+    def test_no_nameservers_is_unknown(self):
+        self.assertIsNone(self.check(dns.resolver.NoNameservers(), ["1.2.3.4"]))
+        self.assertIsNone(self.check(dns.resolver.NoAnswer(), dns.resolver.NoNameservers()))
+
+    def test_implicit_mx(self):
+        self.assertTrue(self.check(dns.resolver.NoAnswer(), ["1.2.3.4"]))
+
+    def test_no_records(self):
+        self.assertFalse(self.check(dns.resolver.NoAnswer(), dns.resolver.NoAnswer()))
+        self.assertFalse(self.check(dns.resolver.NXDOMAIN(), ["1.2.3.4"]))
@@ -0,0 +1,43 @@
+import frappe
+import unittest
+from parlo_license_manager import permissions
+from parlo_license_manager.utils import instrumentation
+
+class TestInstrumentation(unittest.TestCase):
+    def test_bucket_index(self):
+        buckets = instrumentation.SECONDS_BUCKETS
+        self.assertEqual(instrumentation.bucket_index(0.001, buckets), 0)
+        self.assertEqual(instrumentation.bucket_index(0.3, buckets), buckets.index(0.5))
+        self.assertEqual(instrumentation.bucket_index(60, buckets), len(buckets))
+
+    def test_render_prometheus_is_cumulative(self):
+        fields = {
+            "request_duration_seconds|utils.organization.get_organization_license_info|0": "2",
+            "request_duration_seconds|utils.organization.get_organization_license_info|3": "1",
+            "request_duration_seconds|utils.organization.get_organization_license_info|sum": "0.06",
+            "request_duration_seconds|utils.organization.get_organization_license_info|count": "3",
+        }
+        text = instrumentation.render_prometheus(fields)
+        selector = 'endpoint="utils.organization.get_organization_license_info"'
+
+        self.assertIn("# TYPE parlo_request_duration_seconds histogram", text)
+        self.assertIn(f'parlo_request_duration_seconds_bucket{{{selector},le="0.005"}} 2', text)
+        self.assertIn(f'parlo_request_duration_seconds_bucket{{{selector},le="0.025"}} 2', text)
+        self.assertIn(f'parlo_request_duration_seconds_bucket{{{selector},le="0.05"}} 3', text)
+        self.assertIn(f'parlo_request_duration_seconds_bucket{{{selector},le="+Inf"}} 3', text)
+        self.assertIn(f"parlo_request_duration_seconds_count{{{selector}}} 3", text)
+
+    def test_permission_hooks_are_spans(self):
+        trace = instrumentation.Trace("test", sample=False)
+        frappe.local.parlo_trace = trace
+        try:
+            row = frappe._dict(name="x", license_organization="Some Organization")
+            permissions.contact_query("Administrator")
+            for _ in range(3):
+                permissions.contact_permission(row, "Administrator", "read")
+        finally:
+            frappe.local.parlo_trace = None
+            permissions.clear_access_context()
+
+        self.assertEqual(trace.hooks["permissions.contact_query"]["calls"], 1)
+        self.assertEqual(trace.hooks["permissions.contact_permission"]["calls"], 3)
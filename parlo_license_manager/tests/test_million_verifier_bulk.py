@@ -0,0 +1,49 @@
+import frappe
+import unittest
+from parlo_license_manager.api.million_verifier import MillionVerifierAPI
+from parlo_license_manager.benchmarks.stand_in import MillionVerifierStandIn
+from parlo_license_manager.utils.bulk_validation import resolve_deferred_verifications
+
+class TestMillionVerifierBulk(unittest.TestCase):
+    def setUp(self):
+        self.stand_in = MillionVerifierStandIn(polls_until_finished=2).start()
+        self._conf = dict(frappe.local.conf)
+        frappe.local.conf.million_verifier_url = self.stand_in.single_url
+        frappe.local.conf.million_verifier_bulk_url = self.stand_in.bulk_url
+        frappe.local.conf.million_verifier_bulk_poll_interval = 0.01
+        # Results are stored, so use fresh addresses on every run
+        self.suffix = frappe.generate_hash(length=8)
+
+    def test_bulk_job(self):
+        api = MillionVerifierAPI()
+        good, bad, unknown = (f"{prefix}-{self.suffix}@example.com" for prefix in ("good", "bad", "unknown"))
+        results = api.verify_emails_bulk([good, bad.upper(), unknown])
+
+        self.assertTrue(results[good]["valid"])
+        self.assertFalse(results[bad]["valid"])
+        self.assertEqual(results[unknown]["result"], "unknown")
+
+        # One job for the whole batch, polled until finished
+        self.assertEqual(self.stand_in.hits["/bulkapi/v2/upload"], 1)
+        self.assertEqual(self.stand_in.hits["/bulkapi/v2/fileinfo"], 3)
+        self.assertNotIn("/api/v3/", self.stand_in.hits)
+
+    def test_merge_into_records(self):
+        records = [
+            {"row": 1, "phone": "", "email": f"fine-{self.suffix}@example.com", "valid": False, "errors": [], "_verify_email": True},
+            {"row": 2, "phone": "", "email": f"bad-{self.suffix}@example.com", "valid": False, "errors": [], "_verify_email": True},
+            {"row": 3, "phone": "", "email": "other@example.com", "valid": True, "errors": []},
+        ]
+        resolve_deferred_verifications(records, MillionVerifierAPI())
+
+        self.assertTrue(records[0]["valid"])
+        self.assertEqual(records[0]["validation_method"], "Email - Million Verifier Valid")
+        self.assertFalse(records[1]["valid"])
+        self.assertTrue(records[1]["errors"])
+        self.assertNotIn("_verify_email", records[0])
+
+    def tearDown(self):
+        self.stand_in.stop()
+        frappe.local.conf.clear()
+        frappe.local.conf.update(self._conf)
+        frappe.db.rollback()
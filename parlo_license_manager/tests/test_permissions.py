@@ -0,0 +1,24 @@
+import frappe
+import unittest
+from parlo_license_manager import permissions
+from parlo_license_manager.benchmarks.permissions import count_calls
+
+class TestAccessContext(unittest.TestCase):
+    def setUp(self):
+        permissions.clear_access_context()
+
+    def test_context_is_shared_within_request(self):
+        self.assertIs(permissions.get_access_context("Administrator"), permissions.get_access_context("Administrator"))
+
+    def test_roles_looked_up_once(self):
+        row = frappe._dict(name="x", license_organization="Some Organization")
+        with count_calls() as counts:
+            permissions.contact_query("Administrator")
+            for _ in range(20):
+                permissions.contact_permission(row, "Administrator", "read")
+
+        self.assertEqual(counts["role_lookups"], 1)
+        self.assertEqual(counts["queries"], 0)
+
+    def tearDown(self):
+        permissions.clear_access_context()
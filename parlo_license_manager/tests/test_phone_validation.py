@@ -0,0 +1,39 @@
+import unittest
+
+from parlo_license_manager.utils import license_generator
+from parlo_license_manager.utils.license_generator import validate_phone_e164, validate_phones_e164
+
+try:
+    import pandas as pd
+    import pyarrow  # noqa: F401
+except ImportError:
+    pd = None
+
+PHONES = [
+    "+971501234567", "0501234567", "(05) 012-34567", "501234567", "+0501234567", "", "n/a", None,
+    # Arabic-Indic, Extended Arabic-Indic and fullwidth digits
+    "+٩٧١٥٠١٢٣٤٥٦٧", "٠٥٠١٢٣٤٥٦٧", "+971۵۰۱۲۳۴۵۶۷", "０５０１２３４５６７", "05٠1234567",
+]
+
+@unittest.skipIf(pd is None, "pandas with pyarrow is not installed")
+class TestValidatePhonesE164(unittest.TestCase):
+    def test_scalar_and_vectorized_paths_agree(self):
+        phones = PHONES * (license_generator.VECTORIZE_THRESHOLD // len(PHONES) + 1)
+        self.assertGreaterEqual(len(phones), license_generator.VECTORIZE_THRESHOLD)
+
+        scalar = [validate_phone_e164(p) for p in phones]
+        small_formatted, small_valid = validate_phones_e164(PHONES)
+        large_formatted, large_valid = validate_phones_e164(phones)
+        series_formatted, series_valid = validate_phones_e164(pd.Series(phones, dtype=object))
+
+        self.assertEqual(small_valid, [ok for ok, _f in scalar[:len(PHONES)]])
+        self.assertEqual(small_formatted, [f for _ok, f in scalar[:len(PHONES)]])
+        self.assertEqual(large_valid, [ok for ok, _f in scalar])
+        self.assertEqual(large_formatted, [f for _ok, f in scalar])
+        self.assertEqual(series_valid.tolist(), large_valid)
+        self.assertEqual(series_formatted.tolist(), large_formatted)
+
+    def test_non_ascii_digits_are_not_phone_digits(self):
+        formatted, valid = validate_phones_e164(["+٩٧١٥٠١٢٣٤٥٦٧", "+971501234567"])
+        self.assertEqual(valid, [False, True])
+        self.assertEqual(formatted, [None, "+971501234567"])
@@ -0,0 +1,57 @@
+import frappe
+import time
+import unittest
+from parlo_license_manager.api import resilience
+from parlo_license_manager.api.http_session import get_session
+from parlo_license_manager.benchmarks.stand_in import StandInServer
+
+class FailingStandIn(StandInServer):
+    """Answers 500 until healthy is set"""
+
+    healthy = False
+
+    def handle(self, method, path, query, headers, body):
+        if self.healthy:
+            return 200, "application/json", {"ok": True}
+        return 500, "application/json", {"error": "down"}
+
+class TestResilience(unittest.TestCase):
+    def setUp(self):
+        self.stand_in = FailingStandIn().start()
+        self._conf = dict(frappe.local.conf)
+        self.endpoint = f"test_{frappe.generate_hash(length=8)}"
+        frappe.local.conf.parlo_resilience = {self.endpoint: {
+            "rate": 100, "burst": 100, "retries": 2, "failure_threshold": 3,
+            "reset_timeout": 0.2, "retry_base": 0.01
+        }}
+
+    def request(self):
+        return get_session().get(f"{self.stand_in.url}/check", timeout=5)
+
+    def test_retries_then_opens(self):
+        response = resilience.call(self.endpoint, self.request, idempotent=True)
+        self.assertEqual(response.status_code, 500)
+        self.assertEqual(self.stand_in.hits["/check"], 3)
+
+        # Threshold reached: fail fast without calling out
+        with self.assertRaises(resilience.CircuitOpenError):
+            resilience.call(self.endpoint, self.request)
+        self.assertEqual(self.stand_in.hits["/check"], 3)
+        self.assertEqual(resilience.get_breaker_state(self.endpoint)["state"], "open")
+
+    def test_half_open_probe_closes(self):
+        resilience.call(self.endpoint, self.request, idempotent=True)
+        self.stand_in.healthy = True
+
+        time.sleep(0.3)
+        self.assertEqual(resilience.call(self.endpoint, self.request).status_code, 200)
+        self.assertEqual(resilience.get_breaker_state(self.endpoint)["state"], "closed")
+
+    def test_not_idempotent_not_retried(self):
+        resilience.call(self.endpoint, self.request)
+        self.assertEqual(self.stand_in.hits["/check"], 1)
+
+    def tearDown(self):
+        self.stand_in.stop()
+        frappe.local.conf.clear()
+        frappe.local.conf.update(self._conf)
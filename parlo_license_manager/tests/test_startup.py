@@ -0,0 +1,15 @@
+import unittest
+from parlo_license_manager.benchmarks import startup
+
+class TestStartup(unittest.TestCase):
+    def test_no_heavy_imports(self):
+        """Importing the app must not load pandas, requests & co. before they are used"""
+        modules = [m for m in startup.discover_modules() if m not in startup.LAZY_MODULES]
+        result = startup.measure(modules)
+
+        self.assertNotIn("error", result)
+        self.assertEqual(result["heavy"], [])
+
+    def test_hooks_import_alone(self):
+        result = startup.measure("parlo_license_manager.hooks")
+        self.assertEqual(result["heavy"], [])
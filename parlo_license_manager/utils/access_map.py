@@ -0,0 +1,136 @@
+import time
+
+import frappe
+
+# Materialized map of the organizations each user can see, kept in one
+# Redis hash with a field per user:
+#   {"built_at": ..., "access": {organization: {"role": LICENSE_MANAGER | ORGANIZATION_MEMBER,
+#                                               "campaign_code": ...}}}
+# An entry is built with two keyed queries on first use and dropped by the
+# Organization, Contact and User hooks below, so permission checks and the
+# dashboard do a single lookup instead of scanning Organization.
+# Changes the hooks cannot see (a Has Role row edited without saving the
+# User, db_set on an Organization) are picked up once the entry is older
+# than parlo_access_map_ttl seconds (site_config.json); the hash itself
+# expires after ACCESS_MAP_KEY_TTL without writes.
+ACCESS_MAP_KEY = "parlo_user_access"
+DEFAULT_ACCESS_TTL = 10 * 60
+ACCESS_MAP_KEY_TTL = 24 * 60 * 60
+LICENSE_MANAGER = "License Manager"
+ORGANIZATION_MEMBER = "Organization Member"
+
+
+def build_user_access(user):
+    """Organizations user can see, by role, from the database"""
+    access = {}
+
+    # Members: organizations linked to the user's Contact
+    for organization, campaign_code in frappe.db.sql("""
+        SELECT DISTINCT o.name, o.campaign_code
+        FROM `tabContact` c
+        JOIN `tabDynamic Link` dl ON dl.parent = c.name
+            AND dl.parenttype = 'Contact'
+            AND dl.link_doctype = 'Organization'
+        JOIN `tabOrganization` o ON o.name = dl.link_name
+        WHERE c.user = %s
+        AND o.has_parlo_license = 1
+    """, user):
+        access[organization] = {"role": ORGANIZATION_MEMBER, "campaign_code": campaign_code}
+
+    # Managers: listed in the organization's license managers table and
+    # holding the License Manager role; this takes precedence over membership
+    if LICENSE_MANAGER in frappe.get_roles(user):
+        for organization, campaign_code in frappe.db.sql("""
+            SELECT DISTINCT o.name, o.campaign_code
+            FROM `tabOrganization Admin User` au
+            JOIN `tabOrganization` o ON o.name = au.parent
+            WHERE au.parenttype = 'Organization'
+            AND au.parentfield = 'license_managers'
+            AND au.user = %s
+            AND o.has_parlo_license = 1
+        """, user):
+            access[organization] = {"role": LICENSE_MANAGER, "campaign_code": campaign_code}
+
+    return access
+
+
+def get_user_access(user=None):
+    """Organizations user can see: dict of organization -> {role, campaign_code}"""
+    user = user or frappe.session.user
+    ttl = int(frappe.conf.get("parlo_access_map_ttl") or DEFAULT_ACCESS_TTL)
+
+    entry = frappe.cache().hget(ACCESS_MAP_KEY, user)
+    if entry is None or "built_at" not in entry or time.time() - entry["built_at"] > ttl:
+        entry = {"built_at": time.time(), "access": build_user_access(user)}
+        frappe.cache().hset(ACCESS_MAP_KEY, user, entry)
+        frappe.cache().expire(frappe.cache().make_key(ACCESS_MAP_KEY), ACCESS_MAP_KEY_TTL)
+
+    return entry["access"]
+
+
+def _now_and_after_commit(callback):
+    """Run callback now and again once the transaction commits"""
+    callback()
+
+    # A concurrent rebuild before the commit would still see the old rows
+    hooks = getattr(frappe.db, "after_commit", None)
+    if hooks is not None:
+        hooks.add(callback)
+
+
+def invalidate_user_access(*users):
+    users = [user for user in users if user]
+
+    def drop():
+        for user in users:
+            frappe.cache().hdel(ACCESS_MAP_KEY, user)
+
+    if users:
+        _now_and_after_commit(drop)
+
+
+def get_organization_users(organization):
+    """Users whose access depends on organization: its license managers and member Contacts' users"""
+    return set(frappe.db.sql_list("""
+        SELECT user FROM `tabOrganization Admin User`
+        WHERE parenttype = 'Organization'
+        AND parentfield = 'license_managers'
+        AND parent = %s
+        UNION
+        SELECT c.user
+        FROM `tabDynamic Link` dl
+        JOIN `tabContact` c ON c.name = dl.parent
+        WHERE dl.parenttype = 'Contact'
+        AND dl.link_doctype = 'Organization'
+        AND dl.link_name = %s
+        AND COALESCE(c.user, '') != ''
+    """, (organization, organization)))
+
+
+def on_organization_change(doc, method=None):
+    """Organization saved or deleted: its managers, members or campaign may have changed"""
+    users = get_organization_users(doc.name)
+    users.update(row.user for row in doc.get("license_managers") or [])
+
+    # Managers removed by this save are no longer in the table
+    before = doc.get_doc_before_save() if method != "on_trash" else None
+    if before:
+        users.update(row.user for row in before.get("license_managers") or [])
+
+    invalidate_user_access(*users)
+
+
+def on_contact_change(doc, method=None):
+    """doc_events hook: a Contact's user or organization links changed"""
+    users = {doc.get("user")}
+
+    before = doc.get_doc_before_save() if method != "on_trash" else None
+    if before:
+        users.add(before.get("user"))
+
+    invalidate_user_access(*users)
+
+
+def on_user_change(doc, method=None):
+    """doc_events hook: a User's roles changed or the User was deleted"""
+    invalidate_user_access(doc.name)
@@ -0,0 +1,164 @@
+import json
+import time
+
+import frappe
+
+# Sign-in keeps only the Parlo redeem call, the keyed organization reads
+# and the session inline. The default organization for new users, the
+# Contact link and the Organization Member role are applied by
+# provision_user on the "short" queue.
+# Idempotency per email: parlo_auth_provision_claim:<email> is held from
+# queueing until the job finishes, and parlo_auth_provision:<email> keeps
+# the state of the last run. Sign-ins do not queue another job while one
+# is pending, or after one completed for the same organization or when
+# the sign-in names none.
+PROVISION_KEY = "parlo_auth_provision:{0}"
+CLAIM_KEY = "parlo_auth_provision_claim:{0}"
+PROVISION_TTL = 24 * 60 * 60
+CLAIM_TTL = 10 * 60
+
+# Recent sign-in latencies per stage, newest first, for p50/p99 reporting
+LATENCY_KEY = "parlo_auth_latency:{0}"
+LATENCY_SAMPLES = 1000
+LATENCY_STAGES = ("redeem", "session", "total")
+
+
+def _key(pattern, email):
+    return frappe.cache().make_key(pattern.format((email or "").strip().lower()))
+
+
+def get_provisioning_state(email):
+    """Last provisioning state for email: dict with status and organization, or None"""
+    value = frappe.cache().get(_key(PROVISION_KEY, email))
+    return json.loads(value) if value else None
+
+
+def _set_state(email, status, organization, **extra):
+    state = dict(extra, status=status, organization=organization, at=time.time())
+    frappe.cache().set(_key(PROVISION_KEY, email), json.dumps(state), ex=PROVISION_TTL)
+
+
+def is_provisioning(email):
+    """True while a provisioning job for email is queued or running"""
+    return bool(frappe.cache().get(_key(CLAIM_KEY, email)))
+
+
+def queue_provisioning(email, organization=None, campaign_code=None):
+    """
+    Queue provision_user for email unless it is pending or already done
+    Returns: True if a job was queued
+    """
+    state = get_provisioning_state(email)
+    if state and state["status"] == "done" and organization in (None, state.get("organization")):
+        # Without an explicit organization the job would resolve the same one again
+        return False
+
+    # Claim the email; a concurrent sign-in for the same email sees the claim
+    if not frappe.cache().set(_key(CLAIM_KEY, email), 1, ex=CLAIM_TTL, nx=True):
+        return False
+
+    _set_state(email, "queued", organization)
+
+    frappe.enqueue(
+        "parlo_license_manager.utils.auth_provisioning.provision_user",
+        queue="short",
+        enqueue_after_commit=True,
+        email=email,
+        organization=organization,
+        campaign_code=campaign_code
+    )
+    return True
+
+
+def get_linked_organization(email):
+    """Licensed organization the user's Contact is already linked to, or None"""
+    linked = frappe.db.sql("""
+        SELECT dl.link_name
+        FROM `tabContact` c
+        JOIN `tabDynamic Link` dl ON dl.parent = c.name
+        JOIN `tabOrganization` o ON o.name = dl.link_name
+        WHERE c.user = %s
+        AND dl.link_doctype = 'Organization'
+        AND o.has_parlo_license = 1
+        LIMIT 1
+    """, email)
+    return linked[0][0] if linked else None
+
+
+def resolve_organization(email, organization=None, campaign_code=None):
+    """Organization for a signed-in user: explicit, campaign, existing link, then default"""
+    from parlo_license_manager.api.parlo_integration import (
+        get_default_organization,
+        get_organization_from_campaign_code,
+    )
+
+    if organization and frappe.db.exists("Organization", organization):
+        return organization
+
+    if campaign_code:
+        target = get_organization_from_campaign_code(campaign_code)
+        if target:
+            return target
+
+    if email:
+        linked = get_linked_organization(email)
+        if linked:
+            return linked
+
+    return get_default_organization()
+
+
+def provision_user(email, organization=None, campaign_code=None):
+    """Background job: assign a signed-in user to their organization"""
+    from parlo_license_manager.api.parlo_integration import assign_user_to_organization
+
+    _set_state(email, "running", organization)
+
+    try:
+        target = resolve_organization(email, organization, campaign_code)
+
+        if target:
+            assign_user_to_organization(email, target)
+        else:
+            frappe.log_error(
+                f"User {email} authenticated but no organization assigned. Campaign code: {campaign_code}",
+                "Organization Assignment Warning"
+            )
+
+        frappe.db.commit()
+        _set_state(email, "done", target)
+
+    except Exception as e:
+        frappe.db.rollback()
+        _set_state(email, "failed", organization, error=str(e))
+        frappe.log_error(f"Error provisioning {email}: {str(e)}", "Organization Assignment")
+
+    finally:
+        frappe.cache().delete(_key(CLAIM_KEY, email))
+
+
+def record_latency(stage, seconds):
+    """Keep a sample of a sign-in stage's latency"""
+    key = LATENCY_KEY.format(stage)
+    frappe.cache().lpush(key, round(seconds * 1000, 1))
+    frappe.cache().ltrim(key, 0, LATENCY_SAMPLES - 1)
+
+
+def _percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+@frappe.whitelist()
+def get_auth_latency():
+    """p50 / p99 sign-in latency in milliseconds over the recent samples, per stage"""
+    frappe.only_for("System Manager")
+
+    report = {}
+    for stage in LATENCY_STAGES:
+        samples = sorted(float(s) for s in frappe.cache().lrange(LATENCY_KEY.format(stage), 0, -1))
+        report[stage] = {
+            "samples": len(samples),
+            "p50": _percentile(samples, 0.5) if samples else None,
+            "p99": _percentile(samples, 0.99) if samples else None,
+        }
+    return report
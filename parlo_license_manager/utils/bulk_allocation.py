@@ -0,0 +1,298 @@
+import json
+
+import frappe
+from frappe import _
+from parlo_license_manager.utils.license_generator import (
+    _allocate_license, validate_phones_e164, reserve_license_numbers, update_used_licenses
+)
+from parlo_license_manager.utils.email_prefilter import email_key
+from parlo_license_manager.utils.search_index import index_documents
+from parlo_license_manager.utils.welcome_email import queue_welcome_emails
+
+# Rows inserted and committed together; override with
+# parlo_bulk_allocation_chunk_size in site_config.json
+DEFAULT_CHUNK_SIZE = 500
+# Length of the name column (varchar(140))
+NAME_LENGTH = 140
+
+NO_LICENSES_ERROR = "No available licenses for this organization. Please contact Parlo Relationship Manager."
+DUPLICATE_ERROR = "Contact already has a license allocated for this organization"
+
+
+def _get_chunk_size():
+    return max(1, int(frappe.conf.get("parlo_bulk_allocation_chunk_size") or DEFAULT_CHUNK_SIZE))
+
+
+def _child_row(parent, parentfield, idx, now, user, values):
+    row = {
+        "name": frappe.generate_hash(length=10),
+        "parent": parent,
+        "parenttype": "Contact",
+        "parentfield": parentfield,
+        "idx": idx,
+        "docstatus": 0,
+        "creation": now,
+        "modified": now,
+        "owner": user,
+        "modified_by": user,
+    }
+    row.update(values)
+    return row
+
+
+def _insert_rows(doctype, rows, chunk_size):
+    if not rows:
+        return
+    fields = list(rows[0].keys())
+    frappe.db.bulk_insert(doctype, fields, [[row[f] for f in fields] for row in rows], chunk_size=chunk_size)
+
+
+def _get_contact_names(items, organization):
+    """
+    Name Contacts like Contact.autoname does ("Full Name-Organization"),
+    falling back to appending the license number when the name is taken
+    Names are cut to the column length and compared case-insensitively, as
+    the name column's collation does.
+    """
+    bases = {}
+    for item in items:
+        full_name = item["full_name"] or item["data"].get("email") or item["data"].get("phone") or "Contact"
+        bases[item["index"]] = f"{full_name}-{organization}"[:NAME_LENGTH]
+
+    taken = set()
+    unique_bases = list(set(bases.values()))
+    for i in range(0, len(unique_bases), 500):
+        chunk = unique_bases[i:i + 500]
+        taken.update(name.lower() for name in frappe.db.sql_list(f"""
+            SELECT name FROM `tabContact`
+            WHERE name IN ({', '.join(['%s'] * len(chunk))})
+        """, tuple(chunk)))
+
+    for item in items:
+        name = bases[item["index"]]
+        if name.lower() in taken:
+            suffix = f"-{item['license_number']}"
+            name = name[:NAME_LENGTH - len(suffix)] + suffix
+        taken.add(name.lower())
+        item["contact"] = name
+
+
+def _insert_chunk(items, organization, campaign_code, has_whitelist, chunk_size):
+    """Insert Contacts, their child rows and Whitelist rows for one chunk"""
+    now = frappe.utils.now()
+    user = frappe.session.user
+
+    _get_contact_names(items, organization)
+
+    contacts, emails, phones, links, whitelist = [], [], [], [], []
+    for item in items:
+        data = item["data"]
+        email = data.get("email") or ""
+        phone = data.get("phone") or ""
+
+        contacts.append({
+            "name": item["contact"],
+            "creation": now,
+            "modified": now,
+            "owner": user,
+            "modified_by": user,
+            "docstatus": 0,
+            "first_name": data.get("first_name", ""),
+            "last_name": data.get("last_name", ""),
+            "full_name": item["full_name"],
+            "email_id": email,
+            "phone": phone,
+            "status": "Passive",
+            "has_parlo_license": 1,
+            "license_organization": organization,
+            "license_number": item["license_number"],
+            "license_allocated_date": now,
+            "license_campaign_code": data.get("campaign_code") or campaign_code,
+        })
+
+        if email:
+            emails.append(_child_row(item["contact"], "email_ids", 1, now, user, {
+                "email_id": email,
+                "is_primary": 1
+            }))
+
+        if phone:
+            phones.append(_child_row(item["contact"], "phone_nos", 1, now, user, {
+                "phone": phone,
+                "is_primary_phone": 1
+            }))
+
+        links.append(_child_row(item["contact"], "links", 1, now, user, {
+            "link_doctype": "Organization",
+            "link_name": organization
+        }))
+
+        if has_whitelist:
+            whitelist.append({
+                "creation": now,
+                "modified": now,
+                "owner": user,
+                "modified_by": user,
+                "docstatus": 0,
+                "contact": item["contact"],
+                "email": email,
+                "phone": phone,
+                "license_number": item["license_number"],
+                "organization": organization,
+                "allocated_date": now,
+                "status": "Active",
+            })
+
+    _insert_rows("Contact", contacts, chunk_size)
+    _insert_rows("Contact Email", emails, chunk_size)
+    _insert_rows("Contact Phone", phones, chunk_size)
+    _insert_rows("Dynamic Link", links, chunk_size)
+    _insert_rows("Parlo Whitelist", whitelist, chunk_size)
+    
+    # Bulk inserts skip doc_events, so index the new license holders here
+    index_documents("Contact", [{
+        "name": item["contact"],
+        "scope": organization,
+        "emails": [item["data"].get("email")],
+        "phones": [item["data"].get("phone")],
+        "names": [item["full_name"]],
+    } for item in items])
+
+
+def _allocate_licenses_bulk(records, organization, on_result=None):
+    """
+    Allocate licenses for many contacts with set-based inserts
+    records are contact_data dicts as accepted by allocate_license (an
+    optional campaign_code overrides the organization's). Returns one
+    result per record in the same shape as allocate_license; on_result, if
+    given, is called as on_result(index, result) once a row is final.
+
+    Rows are written with frappe.db.bulk_insert, which skips Contact
+    validate / after_insert / on_update and every other app's doc_events.
+    This app's effects are applied by hand: the search index
+    (index_documents), the license stats (update_used_licenses) and the
+    welcome emails. The access map needs nothing, new Contacts have no user.
+    A chunk that fails is rolled back and its rows retried one by one
+    through _allocate_license with their reserved numbers, so only the
+    offending rows fail.
+    """
+    from parlo_license_manager.utils.bulk_validation import find_existing_allocations
+
+    results = [None] * len(records)
+
+    def finish(index, result):
+        results[index] = result
+        if on_result:
+            on_result(index, result)
+
+    org = frappe.db.get_value("Organization", organization,
+        ["has_parlo_license", "available_licenses", "campaign_code"], as_dict=True)
+
+    if not org:
+        error = _("Organization not found")
+    elif not org.has_parlo_license:
+        error = _("Parlo License is not enabled for this organization")
+    else:
+        error = None
+
+    if error:
+        for index in range(len(records)):
+            finish(index, {"success": False, "error": error})
+        return results
+
+    # Normalize phones for the whole batch at once
+    formatted, valid = validate_phones_e164([(r.get("phone") or "") for r in records])
+
+    items = []
+    for index, record in enumerate(records):
+        data = dict(record)
+        if data.get("phone") and valid[index]:
+            data["phone"] = formatted[index]
+        data["email"] = (data.get("email") or "").strip()
+        items.append({
+            "index": index,
+            "data": data,
+            "full_name": " ".join(filter(None, [data.get("first_name"), data.get("last_name")])).strip(),
+        })
+
+    # Duplicate check against existing allocations and earlier rows of the batch
+    existing_emails, existing_phones = find_existing_allocations(
+        organization,
+        {i["data"]["email"] for i in items if i["data"]["email"]},
+        {i["data"]["phone"] for i in items if i["data"].get("phone")}
+    )
+
+    candidates = []
+    for item in items:
+        email = email_key(item["data"]["email"])
+        phone = item["data"].get("phone")
+        if (email and email in existing_emails) or (phone and phone in existing_phones):
+            finish(item["index"], {"success": False, "error": _(DUPLICATE_ERROR)})
+            continue
+        if email:
+            existing_emails.add(email)
+        if phone:
+            existing_phones.add(phone)
+        candidates.append(item)
+
+    # Validate capacity once; rows beyond the available count fail
+    available = max(0, org.available_licenses or 0)
+    for item in candidates[available:]:
+        finish(item["index"], {"success": False, "error": _(NO_LICENSES_ERROR)})
+    candidates = candidates[:available]
+
+    if not candidates:
+        return results
+
+    # Reserve the series block once and commit it so rolled back chunks
+    # never hand their numbers out again
+    license_numbers = reserve_license_numbers(organization, len(candidates))
+    frappe.db.commit()
+
+    for item, license_number in zip(candidates, license_numbers):
+        item["license_number"] = license_number
+
+    has_whitelist = bool(frappe.db.exists("DocType", "Parlo Whitelist"))
+    chunk_size = _get_chunk_size()
+
+    for start in range(0, len(candidates), chunk_size):
+        chunk = candidates[start:start + chunk_size]
+        try:
+            _insert_chunk(chunk, organization, org.campaign_code, has_whitelist, chunk_size)
+
+            if not update_used_licenses(organization, len(chunk)):
+                frappe.throw(_(NO_LICENSES_ERROR))
+
+            frappe.db.commit()
+        except Exception as e:
+            frappe.db.rollback()
+            frappe.log_error(f"Bulk license allocation error: {str(e)}", "License Allocation")
+            for item in chunk:
+                finish(item["index"], _allocate_license(item["data"], organization, item["license_number"]))
+            continue
+
+        for item in chunk:
+            finish(item["index"], {
+                "success": True,
+                "license_number": item["license_number"],
+                "contact": item["contact"]
+            })
+
+        try:
+            queue_welcome_emails((item["data"], organization, item["license_number"]) for item in chunk)
+        except Exception as e:
+            frappe.log_error(f"Welcome email error: {str(e)}", "Email Send")
+
+    return results
+
+
+@frappe.whitelist()
+def allocate_licenses_bulk(records, organization):
+    """
+    Allocate licenses to many contacts in chunked transactions
+    Returns: list with one allocate_license style result per record
+    """
+    if isinstance(records, str):
+        records = json.loads(records)
+
+    return _allocate_licenses_bulk(records, organization)
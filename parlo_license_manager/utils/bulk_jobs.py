@@ -0,0 +1,251 @@
+import json
+import time
+
+import frappe
+from frappe import _
+
+# Background job mode for bulk validation and allocation.
+# Job state lives in Redis under parlo_bulk_job:<job_id>; results are
+# appended to parlo_bulk_job_results:<job_id> as rows complete, so a
+# browser refresh can pick the job back up with get_bulk_job_status.
+JOB_TTL = 24 * 60 * 60
+PROGRESS_EVENT = "parlo_bulk_job_progress"
+PROGRESS_INTERVAL = 1.0
+PROGRESS_BATCH = 50
+
+
+def _state_key(job_id):
+    return f"parlo_bulk_job:{job_id}"
+
+
+def _results_key(job_id):
+    return f"parlo_bulk_job_results:{job_id}"
+
+
+def _user_jobs_key(user):
+    return f"parlo_bulk_jobs:{user}"
+
+
+def get_job_state(job_id):
+    return frappe.cache().get_value(_state_key(job_id))
+
+
+def _save_job_state(state):
+    frappe.cache().set_value(_state_key(state["job_id"]), state, expires_in_sec=JOB_TTL)
+
+
+class BulkJobProgress:
+    """Track per-row progress of a bulk job and publish it in batches"""
+
+    def __init__(self, job_id, total=0):
+        self.job_id = job_id
+        self.total = total
+        self.processed = 0
+        self.valid = 0
+        self.invalid = 0
+        self.started = time.monotonic()
+        self._last_flush = 0
+        self._pending = []
+
+    def __call__(self, record, ok):
+        self.processed += 1
+        if ok:
+            self.valid += 1
+        else:
+            self.invalid += 1
+
+        self._pending.append(record)
+
+        if len(self._pending) >= PROGRESS_BATCH or time.monotonic() - self._last_flush >= PROGRESS_INTERVAL:
+            self.flush()
+
+    def set_total(self, total):
+        self.total = total
+        self.flush()
+
+    def get_eta(self):
+        """Seconds remaining based on the average time per processed row"""
+        if not self.processed or not self.total:
+            return None
+
+        elapsed = time.monotonic() - self.started
+        return round(elapsed / self.processed * max(0, self.total - self.processed), 1)
+
+    def flush(self, status=None):
+        """Persist pending rows and publish the current counters"""
+        cache = frappe.cache()
+
+        if self._pending:
+            key = cache.make_key(_results_key(self.job_id))
+            pipe = cache.pipeline()
+            pipe.rpush(key, *[json.dumps(r, default=str) for r in self._pending])
+            pipe.expire(key, JOB_TTL)
+            pipe.execute()
+            self._pending = []
+
+        state = get_job_state(self.job_id) or {"job_id": self.job_id}
+        state.update({
+            "status": status or state.get("status") or "Running",
+            "total": self.total,
+            "processed": self.processed,
+            "valid": self.valid,
+            "invalid": self.invalid,
+            "eta": self.get_eta(),
+            "updated_at": frappe.utils.now()
+        })
+        _save_job_state(state)
+        self._last_flush = time.monotonic()
+
+        frappe.publish_realtime(PROGRESS_EVENT, state, user=state.get("owner"))
+        return state
+
+    def replace_results(self, records):
+        """Replace persisted rows with the final records of the job"""
+        frappe.cache().delete_value(_results_key(self.job_id))
+        self._pending = list(records)
+
+
+def _enqueue_job(job_type, method, organization_name, total=0, **kwargs):
+    job_id = frappe.generate_hash(length=16)
+    user = frappe.session.user
+
+    _save_job_state({
+        "job_id": job_id,
+        "job_type": job_type,
+        "organization": organization_name,
+        "owner": user,
+        "status": "Queued",
+        "total": total,
+        "processed": 0,
+        "valid": 0,
+        "invalid": 0,
+        "eta": None,
+        "result": None,
+        "created_at": frappe.utils.now()
+    })
+
+    frappe.cache().hset(_user_jobs_key(user), job_id, organization_name)
+
+    frappe.enqueue(
+        method,
+        queue="long",
+        timeout=frappe.conf.get("parlo_bulk_job_timeout") or 4 * 60 * 60,
+        bulk_job_id=job_id,
+        organization_name=organization_name,
+        **kwargs
+    )
+
+    return {"success": True, "job_id": job_id}
+
+
+def _finish_job(progress, result):
+    """Store the summary of a finished job and publish the final state"""
+    summary = {k: v for k, v in result.items() if k not in ("records", "allocated_records", "failed_records")}
+    status = "Completed" if result.get("success") else "Failed"
+
+    state = progress.flush(status=status)
+    state["result"] = summary
+    _save_job_state(state)
+
+    frappe.publish_realtime(PROGRESS_EVENT, state, user=state.get("owner"))
+
+
+def run_bulk_validation(bulk_job_id, file_content, organization_name, filename=None):
+    """Background job: validate an uploaded sheet and persist the records"""
+    from parlo_license_manager.utils.bulk_upload import _validate_bulk_upload
+
+    progress = BulkJobProgress(bulk_job_id)
+    result = _validate_bulk_upload(file_content, organization_name, progress=progress, filename=filename,
+        allow_bulk_verification=True)
+
+    # Duplicate checks run after the remote checks, so store the final records
+    progress.replace_results(result.get("records") or [])
+    progress.valid = result.get("valid_records", progress.valid)
+    progress.invalid = result.get("invalid_records", progress.invalid)
+    _finish_job(progress, result)
+
+
+def run_bulk_allocation(bulk_job_id, validated_records, organization_name):
+    """Background job: allocate licenses for validated records"""
+    from parlo_license_manager.utils.bulk_upload import _process_bulk_allocation
+
+    progress = BulkJobProgress(bulk_job_id, total=len(validated_records))
+    result = _process_bulk_allocation(validated_records, organization_name, progress=progress)
+    _finish_job(progress, result)
+
+
+@frappe.whitelist()
+def enqueue_bulk_validation(file_content, organization_name, filename=None):
+    """Queue validation of a bulk upload file and return the job id"""
+    return _enqueue_job(
+        "Validation",
+        "parlo_license_manager.utils.bulk_jobs.run_bulk_validation",
+        organization_name,
+        file_content=file_content,
+        filename=filename
+    )
+
+
+@frappe.whitelist()
+def enqueue_bulk_allocation(validated_records, organization_name):
+    """Queue license allocation for validated records and return the job id"""
+    if isinstance(validated_records, str):
+        validated_records = json.loads(validated_records)
+
+    return _enqueue_job(
+        "Allocation",
+        "parlo_license_manager.utils.bulk_jobs.run_bulk_allocation",
+        organization_name,
+        total=len(validated_records),
+        validated_records=validated_records
+    )
+
+
+@frappe.whitelist()
+def get_bulk_job_status(job_id, start=0, page_length=0):
+    """
+    Get progress of a bulk job
+    Rows persisted so far are returned when page_length is set
+    """
+    state = get_job_state(job_id)
+    if not state:
+        return {"success": False, "error": "Job not found or expired"}
+
+    if state.get("owner") != frappe.session.user and "System Manager" not in frappe.get_roles():
+        frappe.throw(_("You don't have access to this job"), frappe.PermissionError)
+
+    state = dict(state, success=True)
+
+    page_length = int(page_length or 0)
+    if page_length:
+        start = int(start or 0)
+        cache = frappe.cache()
+        rows = cache.lrange(_results_key(job_id), start, start + page_length - 1)
+        state["rows"] = [json.loads(row) for row in rows]
+        state["start"] = start
+
+    return state
+
+
+@frappe.whitelist()
+def get_bulk_jobs(organization_name=None):
+    """List bulk jobs of the current user that have not expired yet"""
+    user = frappe.session.user
+    cache = frappe.cache()
+
+    jobs = []
+    for job_id, organization in (cache.hgetall(_user_jobs_key(user)) or {}).items():
+        if isinstance(job_id, bytes):
+            job_id = job_id.decode()
+
+        state = get_job_state(job_id)
+        if not state:
+            cache.hdel(_user_jobs_key(user), job_id)
+            continue
+
+        if organization_name and state.get("organization") != organization_name:
+            continue
+
+        jobs.append(state)
+
+    return sorted(jobs, key=lambda j: j.get("created_at") or "", reverse=True)
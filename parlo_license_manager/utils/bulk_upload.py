@@ -1,24 +1,39 @@
 import frappe
-import pandas as pd
 import io
 from frappe import _
 from parlo_license_manager.api.parlo_integration import ParloAPI
 from parlo_license_manager.api.million_verifier import MillionVerifierAPI
-from parlo_license_manager.utils.license_generator import validate_phone_e164, allocate_license
+from parlo_license_manager.utils.bulk_allocation import _allocate_licenses_bulk
+from parlo_license_manager.utils.bulk_validation import (
+    validate_records, check_duplicates, resolve_deferred_verifications, get_bulk_verification_threshold
+)
+from parlo_license_manager.utils.email_prefilter import EmailPrefilter
+from parlo_license_manager.utils.upload_reader import UploadReader
 
 @frappe.whitelist()
-def validate_bulk_upload(file_content, organization_name):
+def validate_bulk_upload(file_content, organization_name, filename=None):
     """
-    Validate bulk upload Excel file
+    Validate bulk upload Excel or CSV file
     Returns: List of validated records with status
     """
+    return _validate_bulk_upload(file_content, organization_name, filename=filename)
+
+def _validate_bulk_upload(file_content, organization_name, progress=None, filename=None,
+        allow_bulk_verification=False):
+    """
+    Validate bulk upload file, reporting each row to progress
+    Rows are streamed from the file in chunks; used directly by the
+    background job in utils.bulk_jobs. Only that job sets
+    allow_bulk_verification: a Million Verifier bulk job is polled until it
+    finishes, which must not hold a web worker.
+    """
     try:
-        # Read Excel file
-        df = pd.read_excel(io.BytesIO(file_content))
+        # Open the file for streaming (.xlsx, .xls or .csv)
+        reader = UploadReader(file_content, filename)
         
         # Check required columns
         required_cols = ['phonenumber', 'full_name', 'email']
-        missing_cols = [col for col in required_cols if col not in df.columns]
+        missing_cols = [col for col in required_cols if col not in reader.columns]
         if missing_cols:
             return {
                 "success": False,
@@ -49,124 +64,49 @@ def validate_bulk_upload(file_content, organization_name):
                 "error": "No licenses available. Please contact Parlo Relationship Manager."
             }
         
-        if len(df) > available:
+        row_count = reader.count_rows()
+        if row_count > available:
             return {
                 "success": False,
-                "error": f"Insufficient licenses. Available license count is {available} and requested licenses on excel sheet is {len(df)}. Please contact Parlo Relationship Manager."
+                "error": f"Insufficient licenses. Available license count is {available} and requested licenses on excel sheet is {row_count}. Please contact Parlo Relationship Manager."
             }
         
-        # Validate each record
+        if progress:
+            progress.set_total(row_count)
+        
+        # Large uploads validated in the background verify emails with one
+        # Million Verifier bulk job
+        bulk_verification = allow_bulk_verification and row_count >= get_bulk_verification_threshold()
+        
+        # Stream rows in chunks and run the remote checks concurrently per chunk
+        has_campaign_code = 'campaign_code' in reader.columns
         parlo_api = ParloAPI()
         verifier_api = MillionVerifierAPI()
-        
+        prefilter = EmailPrefilter()
         results = []
-        for idx, row in df.iterrows():
-            record = {
-                "row": idx + 1,
-                "phone": str(row.get('phonenumber', '')).strip(),
-                "email": str(row.get('email', '')).strip(),
-                "name": str(row.get('full_name', '')).strip(),
-                "campaign_code": str(row.get('campaign_code', '')).strip() if 'campaign_code' in df.columns else '',
-                "valid": False,
-                "errors": [],
-                "validation_method": None
-            }
-            
-            # Skip if both phone and email are empty/nan
-            if (not record['phone'] or record['phone'] == 'nan') and \
-               (not record['email'] or record['email'] == 'nan'):
-                record['errors'].append("Both phone and email are missing")
-                results.append(record)
-                continue
-            
-            # Validate phone first if present (as per requirement: search mobile first)
-            phone_valid = False
-            if record['phone'] and record['phone'] != 'nan':
-                is_valid, formatted = validate_phone_e164(record['phone'])
-                if is_valid:
-                    # Check with Parlo
-                    parlo_result = parlo_api.search_user(phone_number=formatted)
-                    if parlo_result['status_code'] == 200:
-                        phone_valid = True
-                        record['phone'] = formatted
-                        record['validation_method'] = 'Phone - Parlo Verified'
-                    elif parlo_result['status_code'] == 404:
-                        # User not in Parlo, but phone format is valid (E164 validation)
-                        phone_valid = True
-                        record['phone'] = formatted
-                        record['validation_method'] = 'Phone - E164 Format Valid'
-                    else:
-                        record['errors'].append(f"Phone validation failed: {parlo_result['message']}")
-                else:
-                    record['errors'].append("Invalid phone format (E164 required)")
-            
-            # If phone invalid/missing, try email (fallback to email if mobile fails)
-            email_valid = False
-            if not phone_valid and record['email'] and record['email'] != 'nan':
-                # Basic email format check
-                if '@' not in record['email']:
-                    record['errors'].append("Invalid email format")
-                else:
-                    # Check with Parlo first
-                    parlo_result = parlo_api.search_user(email=record['email'])
-                    if parlo_result['status_code'] == 200:
-                        email_valid = True
-                        record['validation_method'] = 'Email - Parlo Verified'
-                    elif parlo_result['status_code'] == 404:
-                        # Try Million Verifier as fallback
-                        verify_result = verifier_api.verify_email(record['email'])
-                        if verify_result['valid']:
-                            email_valid = True
-                            record['validation_method'] = 'Email - Million Verifier Valid'
-                        else:
-                            record['errors'].append(f"Email validation failed: {verify_result.get('error', 'Invalid email')}")
-                    else:
-                        record['errors'].append(f"Email check failed: {parlo_result['message']}")
-            
-            # If both mobile and email are provided and mobile failed, try email
-            # This implements the requirement: "if both email and mobile number for a record, 
-            # search mobile number first and if invalid then search for email"
-            if not phone_valid and not email_valid and record['phone'] and record['email']:
-                if record['phone'] != 'nan' and record['email'] != 'nan':
-                    # Already tried above, but ensure we note this in validation method
-                    record['validation_method'] = 'Both phone and email validation failed'
-            
-            # Set overall validity - one of them must be valid as per requirement
-            record['valid'] = phone_valid or email_valid
-            
-            # Check if already allocated
-            if record['valid']:
-                # Check by email in Contact Email child table
-                if record['email'] and record['email'] != 'nan':
-                    existing = frappe.db.sql("""
-                        SELECT c.name 
-                        FROM `tabContact` c
-                        JOIN `tabContact Email` ce ON ce.parent = c.name
-                        WHERE ce.email_id = %s 
-                        AND c.license_organization = %s
-                        LIMIT 1
-                    """, (record['email'], organization_name))
-                    
-                    if existing:
-                        record['valid'] = False
-                        record['errors'].append("License already allocated to this email")
-                
-                # Check by phone in Contact Phone child table
-                if record['valid'] and record['phone'] and record['phone'] != 'nan':
-                    existing = frappe.db.sql("""
-                        SELECT c.name 
-                        FROM `tabContact` c
-                        JOIN `tabContact Phone` cp ON cp.parent = c.name
-                        WHERE cp.phone = %s 
-                        AND c.license_organization = %s
-                        LIMIT 1
-                    """, (record['phone'], organization_name))
-                    
-                    if existing:
-                        record['valid'] = False
-                        record['errors'].append("License already allocated to this phone number")
+        for chunk in reader.iter_chunks():
+            records = []
+            for row in chunk:
+                records.append({
+                    "row": len(results) + len(records) + 1,
+                    "phone": row.get('phonenumber', ''),
+                    "email": row.get('email', ''),
+                    "name": row.get('full_name', ''),
+                    "campaign_code": row.get('campaign_code', '') if has_campaign_code else '',
+                    "valid": False,
+                    "errors": [],
+                    "validation_method": None
+                })
             
-            results.append(record)
+            validate_records(records, parlo_api=parlo_api, verifier_api=verifier_api, progress=progress,
+                defer_verification=bulk_verification, prefilter=prefilter)
+            results.extend(records)
+        
+        if bulk_verification:
+            resolve_deferred_verifications(results, verifier_api)
+        
+        # Check existing allocations and in-file duplicates in bulk
+        check_duplicates(results, organization_name)
         
         # Count valid records
         valid_count = sum(1 for r in results if r['valid'])
@@ -193,7 +133,10 @@ def validate_bulk_upload(file_content, organization_name):
             "available_licenses": available,
             "records": results,
             "can_proceed": can_proceed,
-            "warning_message": warning_message
+            "warning_message": warning_message,
+            "search_cache": parlo_api.get_cache_stats(),
+            "verification_cache": verifier_api.get_cache_stats(),
+            "prefilter": prefilter.get_stats()
         }
         
     except Exception as e:
@@ -205,6 +148,13 @@ def process_bulk_allocation(validated_records, organization_name):
     """
     Process bulk license allocation for validated records
     """
+    return _process_bulk_allocation(validated_records, organization_name)
+
+def _process_bulk_allocation(validated_records, organization_name, progress=None):
+    """
+    Process bulk license allocation, reporting each row to progress
+    Used directly by the background job in utils.bulk_jobs
+    """
     try:
         if isinstance(validated_records, str):
             import json
@@ -230,6 +180,25 @@ def process_bulk_allocation(validated_records, organization_name):
         allocated = []
         failed = []
         
+        # Prepare contact data for every valid record
+        contacts = []
+        for record in valid_records:
+            name_parts = record['name'].split() if record.get('name') else ['']
+            contacts.append({
+                "first_name": name_parts[0] if name_parts else "",
+                "last_name": ' '.join(name_parts[1:]) if len(name_parts) > 1 else "",
+                "email": record['email'] if record['email'] != 'nan' else "",
+                "phone": record['phone'] if record['phone'] != 'nan' else "",
+                "campaign_code": record.get('campaign_code') or None
+            })
+        
+        def report(index, result):
+            if progress:
+                progress(valid_records[index], result['success'])
+        
+        # Allocate all licenses in chunked transactions
+        results = iter(_allocate_licenses_bulk(contacts, organization_name, on_result=report))
+        
         for record in validated_records:
             if not record.get('valid'):
                 failed.append({
@@ -237,19 +206,11 @@ def process_bulk_allocation(validated_records, organization_name):
                     "name": record.get('name'),
                     "errors": record.get('errors', ['Invalid record'])
                 })
+                if progress:
+                    progress(failed[-1], False)
                 continue
             
-            # Prepare contact data
-            name_parts = record['name'].split() if record.get('name') else ['']
-            contact_data = {
-                "first_name": name_parts[0] if name_parts else "",
-                "last_name": ' '.join(name_parts[1:]) if len(name_parts) > 1 else "",
-                "email": record['email'] if record['email'] != 'nan' else "",
-                "phone": record['phone'] if record['phone'] != 'nan' else ""
-            }
-            
-            # Allocate license using Organization
-            result = allocate_license(contact_data, organization_name)
+            result = next(results)
             
             if result['success']:
                 record['license_number'] = result['license_number']
@@ -260,15 +221,6 @@ def process_bulk_allocation(validated_records, organization_name):
                     "phone": record.get('phone'),
                     "license_number": result['license_number']
                 })
-                
-                # If campaign code provided, update the contact
-                if record.get('campaign_code'):
-                    try:
-                        contact = frappe.get_doc("Contact", result['contact'])
-                        contact.license_campaign_code = record['campaign_code']
-                        contact.save(ignore_permissions=True)
-                    except:
-                        pass
             else:
                 failed.append({
                     "row": record.get('row'),
@@ -308,6 +260,8 @@ def process_bulk_allocation(validated_records, organization_name):
 @frappe.whitelist()
 def download_error_records(failed_records):
     """Generate Excel file with failed records for re-upload"""
+    import pandas as pd
+    
     try:
         if isinstance(failed_records, str):
             import json
@@ -346,6 +300,8 @@ def download_error_records(failed_records):
 @frappe.whitelist()
 def get_bulk_upload_template():
     """Generate Excel template for bulk upload"""
+    import pandas as pd
+    
     try:
         # Create sample DataFrame
         df = pd.DataFrame({
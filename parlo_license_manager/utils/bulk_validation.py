@@ -0,0 +1,343 @@
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+import frappe
+from parlo_license_manager.api.parlo_integration import ParloAPI
+from parlo_license_manager.api.million_verifier import MillionVerifierAPI
+from parlo_license_manager.utils.email_prefilter import email_key
+from parlo_license_manager.utils.license_generator import validate_phone_e164, validate_phones_e164
+from parlo_license_manager.utils.search_index import chunks
+
+# Upper bound for parlo_bulk_validation_concurrency in site_config.json.
+# Keep parlo_http_pool_maxsize at least as large so threads do not wait
+# for a pooled connection.
+DEFAULT_CONCURRENCY = 8
+MAX_CONCURRENCY = 32
+
+# Number of values per IN (...) clause in the duplicate lookups
+DUPLICATE_QUERY_CHUNK = 500
+
+# Uploads validated in the background (utils.bulk_jobs) with at least this
+# many rows verify emails with one Million Verifier bulk job instead of one
+# call per address; override with million_verifier_bulk_threshold in
+# site_config.json
+BULK_VERIFICATION_THRESHOLD = 1000
+
+
+def get_validation_concurrency(max_workers=None):
+    """Resolve the number of rows validated in parallel"""
+    if max_workers is None:
+        max_workers = frappe.conf.get("parlo_bulk_validation_concurrency") or DEFAULT_CONCURRENCY
+
+    return max(1, min(int(max_workers), MAX_CONCURRENCY))
+
+
+def get_bulk_verification_threshold():
+    """Row count from which uploads use bulk email verification"""
+    return int(frappe.conf.get("million_verifier_bulk_threshold") or BULK_VERIFICATION_THRESHOLD)
+
+
+def is_blank(value):
+    """Check for empty cells as they come out of the Excel reader"""
+    return not value or value == 'nan'
+
+
+def apply_email_verification(record, verify_result):
+    """Apply a Million Verifier result to a record; returns whether it passed"""
+    if verify_result and verify_result['valid']:
+        record['validation_method'] = 'Email - Million Verifier Valid'
+        return True
+
+    error = (verify_result or {}).get('error', 'Invalid email')
+    record['errors'].append(f"Email validation failed: {error}")
+    return False
+
+
+def validate_record_remote(record, parlo_api, verifier_api, phone_check=None, defer_verification=False):
+    """
+    Run the remote checks for a single record
+    Phone is searched first; email is the fallback if the phone is invalid.
+    phone_check is the precomputed (is_valid, formatted) E164 result, if any.
+    With defer_verification, emails unknown to Parlo are only marked for
+    resolve_deferred_verifications instead of being verified one by one.
+    Only the record dict is touched, so this is safe to run in a worker thread
+    (API errors are logged through the clients' defer_errors).
+    """
+    # Skip if both phone and email are empty/nan
+    if is_blank(record['phone']) and is_blank(record['email']):
+        record['errors'].append("Both phone and email are missing")
+        return record
+
+    # Validate phone first if present (as per requirement: search mobile first)
+    phone_valid = False
+    if not is_blank(record['phone']):
+        is_valid, formatted = phone_check or validate_phone_e164(record['phone'])
+        if is_valid:
+            # Check with Parlo
+            parlo_result = parlo_api.search_user(phone_number=formatted)
+            if parlo_result['status_code'] == 200:
+                phone_valid = True
+                record['phone'] = formatted
+                record['validation_method'] = 'Phone - Parlo Verified'
+            elif parlo_result['status_code'] == 404:
+                # User not in Parlo, but phone format is valid (E164 validation)
+                phone_valid = True
+                record['phone'] = formatted
+                record['validation_method'] = 'Phone - E164 Format Valid'
+            else:
+                record['errors'].append(f"Phone validation failed: {parlo_result['message']}")
+        else:
+            record['errors'].append("Invalid phone format (E164 required)")
+
+    # If phone invalid/missing, try email (fallback to email if mobile fails)
+    email_valid = False
+    if not phone_valid and not is_blank(record['email']):
+        # Rejected by the local pre-filter, or basic email format check
+        if record.get('_email_error'):
+            record['errors'].append(record['_email_error'])
+            record['_email_skipped'] = True
+        elif '@' not in record['email']:
+            record['errors'].append("Invalid email format")
+        else:
+            # Check with Parlo first
+            parlo_result = parlo_api.search_user(email=record['email'])
+            if parlo_result['status_code'] == 200:
+                email_valid = True
+                record['validation_method'] = 'Email - Parlo Verified'
+            elif parlo_result['status_code'] == 404:
+                # Try Million Verifier as fallback
+                if defer_verification:
+                    record['_verify_email'] = True
+                else:
+                    email_valid = apply_email_verification(record, verifier_api.verify_email(record['email']))
+            else:
+                record['errors'].append(f"Email check failed: {parlo_result['message']}")
+
+    # If both mobile and email are provided and both failed, note it
+    if not phone_valid and not email_valid:
+        if not is_blank(record['phone']) and not is_blank(record['email']):
+            record['validation_method'] = 'Both phone and email validation failed'
+
+    # Set overall validity - one of them must be valid as per requirement
+    record['valid'] = phone_valid or email_valid
+    return record
+
+
+def validate_records(records, max_workers=None, parlo_api=None, verifier_api=None, progress=None,
+        defer_verification=False, prefilter=None):
+    """
+    Run remote checks for many records on a bounded thread pool
+    Records are updated in place and returned in their original order.
+    progress, if given, is called as progress(record, ok) in row order
+    from the calling thread. prefilter, an EmailPrefilter, rejects
+    emails locally before any remote call.
+    """
+    parlo_api = parlo_api or ParloAPI()
+    verifier_api = verifier_api or MillionVerifierAPI()
+    max_workers = get_validation_concurrency(max_workers)
+
+    # Normalize the whole phone column at once
+    formatted, valid = validate_phones_e164([r['phone'] for r in records])
+    phone_checks = list(zip(valid, formatted))
+
+    # Local email checks over the whole column
+    if prefilter:
+        prefilter.apply(records, is_blank)
+
+    # Stored Million Verifier results are loaded once for the whole batch
+    with verifier_api.batch(r['email'] for r in records if not is_blank(r['email'])):
+        _run_remote_checks(records, parlo_api, verifier_api, phone_checks, max_workers, progress,
+            defer_verification)
+
+    if prefilter:
+        prefilter.collect(records)
+
+    return records
+
+
+def _remote_checks_task(record, parlo_api, verifier_api, phone_check, defer_verification):
+    """
+    validate_record_remote for a worker thread
+    Never raises: an unexpected error fails the row and is returned for the
+    calling thread to log, as workers must not use the database connection.
+    """
+    try:
+        validate_record_remote(record, parlo_api, verifier_api, phone_check, defer_verification)
+        return None
+    except Exception as e:
+        record['errors'].append(f"Validation error: {str(e)}")
+        record['valid'] = False
+        return f"Bulk validation error in row {record.get('row')}: {frappe.get_traceback()}"
+
+
+def _run_remote_checks(records, parlo_api, verifier_api, phone_checks, max_workers, progress,
+        defer_verification=False):
+    if max_workers == 1 or len(records) <= 1:
+        for record, phone_check in zip(records, phone_checks):
+            validate_record_remote(record, parlo_api, verifier_api, phone_check, defer_verification)
+            if progress:
+                progress(record, record['valid'])
+        return
+
+    # The API clients keep errors raised in the workers and write them
+    # from this thread when the blocks exit
+    with parlo_api.defer_errors(), verifier_api.defer_errors():
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="parlo-validate") as executor:
+            # Each task runs in a copy of the request context so frappe.local
+            # (conf, cache) resolves inside the worker threads
+            futures = [
+                executor.submit(
+                    contextvars.copy_context().run,
+                    _remote_checks_task, record, parlo_api, verifier_api, phone_check, defer_verification
+                )
+                for record, phone_check in zip(records, phone_checks)
+            ]
+            errors = []
+            for record, future in zip(records, futures):
+                error = future.result()
+                if error:
+                    errors.append(error)
+                if progress:
+                    progress(record, record['valid'])
+
+    for error in errors:
+        frappe.log_error(error, "Bulk Validation")
+
+
+def resolve_deferred_verifications(records, verifier_api, max_workers=None):
+    """
+    Verify emails marked by validate_record_remote with one bulk job
+    Falls back to verifying the addresses one by one if the bulk job fails.
+    """
+    pending = [r for r in records if r.pop('_verify_email', False)]
+    if not pending:
+        return records
+
+    emails = list(dict.fromkeys(email_key(r['email']) for r in pending))
+    try:
+        results = verifier_api.verify_emails_bulk(emails)
+    except Exception as e:
+        frappe.log_error(f"Million Verifier bulk verification error: {str(e)}", "Email Validation")
+        results = _verify_emails_individually(emails, verifier_api, max_workers)
+
+    for record in pending:
+        if apply_email_verification(record, results.get(email_key(record['email']))):
+            record['valid'] = True
+
+    return records
+
+
+def _verify_email_task(verifier_api, email):
+    """verify_email for a worker thread; unexpected errors are returned, not logged"""
+    try:
+        return verifier_api.verify_email(email), None
+    except Exception as e:
+        return {"valid": False, "error": str(e)}, f"Million Verifier error for {email}: {frappe.get_traceback()}"
+
+
+def _verify_emails_individually(emails, verifier_api, max_workers=None):
+    max_workers = get_validation_concurrency(max_workers)
+    results, errors = {}, []
+
+    with verifier_api.batch(emails), verifier_api.defer_errors():
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="parlo-verify") as executor:
+            futures = [
+                executor.submit(contextvars.copy_context().run, _verify_email_task, verifier_api, email)
+                for email in emails
+            ]
+            for email, future in zip(emails, futures):
+                results[email], error = future.result()
+                if error:
+                    errors.append(error)
+
+    for error in errors:
+        frappe.log_error(error, "Email Validation")
+    return results
+
+
+def find_existing_allocations(organization_name, emails=(), phones=(), chunk_size=DUPLICATE_QUERY_CHUNK):
+    """
+    Resolve which emails and phones already hold a license in the organization
+    Returns: (set of email_key emails, set of phones)
+    """
+    existing_emails = set()
+    existing_phones = set()
+
+    for chunk in chunks(set(emails), chunk_size):
+        rows = frappe.db.sql_list(f"""
+            SELECT DISTINCT ce.email_id
+            FROM `tabContact` c
+            JOIN `tabContact Email` ce ON ce.parent = c.name
+            WHERE c.license_organization = %s
+            AND ce.email_id IN ({', '.join(['%s'] * len(chunk))})
+        """, (organization_name, *chunk))
+        existing_emails.update(email_key(email) for email in rows if email)
+
+    for chunk in chunks(set(phones), chunk_size):
+        rows = frappe.db.sql_list(f"""
+            SELECT DISTINCT cp.phone
+            FROM `tabContact` c
+            JOIN `tabContact Phone` cp ON cp.parent = c.name
+            WHERE c.license_organization = %s
+            AND cp.phone IN ({', '.join(['%s'] * len(chunk))})
+        """, (organization_name, *chunk))
+        existing_phones.update(phone for phone in rows if phone)
+
+    return existing_emails, existing_phones
+
+
+def check_duplicates(records, organization_name):
+    """
+    Flag valid records that already hold a license or repeat an earlier row
+    Existing allocations are resolved with a few chunked queries for the whole
+    upload; in-file duplicates keep the first valid row and flag the rest.
+    """
+    candidates = [r for r in records if r['valid']]
+    if not candidates:
+        return records
+
+    formatted_phones, valid_phones = validate_phones_e164([r['phone'] for r in candidates])
+
+    emails = set()
+    phones = set()
+    for record, formatted, phone_ok in zip(candidates, formatted_phones, valid_phones):
+        if not is_blank(record['email']):
+            record['_email_key'] = email_key(record['email'])
+            emails.update((record['email'], record['_email_key']))
+        if not is_blank(record['phone']):
+            record['_phone_key'] = formatted if phone_ok else record['phone'].strip()
+            phones.update((record['phone'], record['_phone_key']))
+
+    existing_emails, existing_phones = find_existing_allocations(organization_name, emails, phones)
+
+    seen_emails = {}
+    seen_phones = {}
+    for record in candidates:
+        email_key = record.pop('_email_key', None)
+        phone_key = record.pop('_phone_key', None)
+
+        # Check if already allocated
+        if email_key and email_key in existing_emails:
+            record['valid'] = False
+            record['errors'].append("License already allocated to this email")
+        elif phone_key and (phone_key in existing_phones or record['phone'] in existing_phones):
+            record['valid'] = False
+            record['errors'].append("License already allocated to this phone number")
+
+        if not record['valid']:
+            continue
+
+        # Check for the same email/phone earlier in the upload
+        if email_key and email_key in seen_emails:
+            record['valid'] = False
+            record['errors'].append(f"Duplicate email in upload (same as row {seen_emails[email_key]})")
+        elif phone_key and phone_key in seen_phones:
+            record['valid'] = False
+            record['errors'].append(f"Duplicate phone number in upload (same as row {seen_phones[phone_key]})")
+        else:
+            if email_key:
+                seen_emails[email_key] = record['row']
+            if phone_key:
+                seen_phones[phone_key] = record['row']
+
+    return records
@@ -0,0 +1,223 @@
+import functools
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+import frappe
+
+# Local checks run over the whole email column before any remote call.
+# Rows rejected here never reach Parlo or Million Verifier.
+# Tunables in site_config.json:
+#   parlo_disposable_domains  - extra domains to treat as disposable
+#   parlo_email_mx_check      - set to 0 to skip the DNS lookup per domain
+DISPOSABLE_DOMAINS_FILE = os.path.join(os.path.dirname(__file__), "disposable_domains.txt")
+DNS_TIMEOUT = 3
+DNS_CONCURRENCY = 8
+
+INVALID_FORMAT_ERROR = "Invalid email format"
+DISPOSABLE_ERROR = "Disposable email addresses are not allowed"
+NO_MAIL_DOMAIN_ERROR = "Email domain does not accept mail"
+
+LOCAL_PART = r"[a-z0-9!#$%&'*+/=?^_`{|}~-]+(?:\.[a-z0-9!#$%&'*+/=?^_`{|}~-]+)*"
+DOMAIN_PART = r"(?:[a-z0-9](?:[a-z0-9-]{0,61}[a-z0-9])?\.)+(?:[a-z]{2,63}|xn--[a-z0-9-]{1,59})"
+EMAIL_PATTERN = re.compile(rf"^(?=.{{3,254}}$)(?=[^@]{{1,64}}@){LOCAL_PART}@{DOMAIN_PART}$")
+
+
+def _encode_domain(domain):
+    try:
+        return domain.rstrip(".").encode("idna").decode("ascii")
+    except UnicodeError:
+        return None
+
+
+def normalize_email(email, encode_domain=_encode_domain):
+    """
+    Lowercase an address and IDNA-encode its domain
+    Returns: normalized address, or None if it cannot be encoded
+    """
+    email = (email or "").strip().lower()
+    local, at, domain = email.rpartition("@")
+    if not at or not local or not domain:
+        return None
+
+    domain = encode_domain(domain)
+    if not domain:
+        return None
+
+    return f"{local}@{domain}"
+
+
+_encode_domain_cached = functools.lru_cache(maxsize=4096)(_encode_domain)
+
+
+def email_key(email):
+    """
+    Key addresses are compared, deduplicated and cached by
+    The normalized address where there is one, else the lowercased text.
+    """
+    text = (email or "").strip().lower()
+    return normalize_email(text, _encode_domain_cached) or text
+
+
+@functools.lru_cache(maxsize=1)
+def _load_disposable_domains():
+    with open(DISPOSABLE_DOMAINS_FILE) as f:
+        return frozenset(
+            line.strip().lower()
+            for line in f
+            if line.strip() and not line.startswith("#")
+        )
+
+
+def get_disposable_domains():
+    """Bundled disposable domains plus any configured in site_config"""
+    extra = frappe.conf.get("parlo_disposable_domains") or []
+    if not extra:
+        return _load_disposable_domains()
+    return _load_disposable_domains() | frozenset(d.strip().lower() for d in extra)
+
+
+def is_disposable_domain(domain, disposable_domains):
+    """Match the domain and each parent domain against the blocklist"""
+    labels = domain.split(".")
+    return any(".".join(labels[i:]) in disposable_domains for i in range(len(labels) - 1))
+
+
+@functools.lru_cache(maxsize=1)
+def _get_resolver():
+    """dnspython resolver, or None when dnspython is not installed"""
+    try:
+        import dns.resolver
+    except ImportError:
+        return None
+
+    resolver = dns.resolver.Resolver()
+    resolver.lifetime = DNS_TIMEOUT
+    return resolver
+
+
+def domain_accepts_mail(domain):
+    """
+    Check for MX records, falling back to an A record (RFC 5321 implicit MX)
+    Only NXDOMAIN or no MX and no A record mean False. Returns None when the
+    answer is unknown (no resolver, timeouts, every nameserver failing), so
+    the row goes on to the remote checks.
+    """
+    resolver = _get_resolver()
+    if not resolver:
+        return None
+
+    import dns.exception
+    import dns.resolver
+
+    for record_type in ("MX", "A"):
+        try:
+            resolver.resolve(domain, record_type)
+            return True
+        except dns.resolver.NoAnswer:
+            continue
+        except dns.resolver.NXDOMAIN:
+            return False
+        except dns.exception.DNSException:
+            return None
+    return False
+
+
+class EmailPrefilter:
+    """
+    Per-upload email pre-filter
+    Each distinct address and domain is checked once, with the DNS answers
+    cached for the lifetime of the instance (one upload).
+    """
+
+    def __init__(self, mx_check=None):
+        if mx_check is None:
+            mx_check = bool(frappe.conf.get("parlo_email_mx_check", 1))
+
+        self.mx_check = mx_check and _get_resolver() is not None
+        self.disposable_domains = get_disposable_domains()
+        self._domains = {}
+        self.checked = 0
+        self.rejected = 0
+        self.remote_calls_saved = 0
+
+    def check_emails(self, emails):
+        """
+        Check a column of addresses
+        Returns: list of (normalized email or None, error or None) per value
+        """
+        unique = {}
+        for email in emails:
+            if email and email not in unique:
+                unique[email] = None
+
+        # Domains repeat heavily within an upload; encode and classify each once
+        encode_domain = functools.lru_cache(maxsize=None)(_encode_domain)
+        disposable = functools.lru_cache(maxsize=None)(
+            lambda domain: is_disposable_domain(domain, self.disposable_domains)
+        )
+
+        for email in unique:
+            normalized = normalize_email(email, encode_domain)
+            if not normalized or not EMAIL_PATTERN.match(normalized):
+                unique[email] = (None, INVALID_FORMAT_ERROR)
+            elif disposable(normalized.rpartition("@")[2]):
+                unique[email] = (normalized, DISPOSABLE_ERROR)
+            else:
+                unique[email] = (normalized, None)
+
+        if self.mx_check:
+            self._resolve_domains({
+                normalized.rpartition("@")[2]
+                for normalized, error in unique.values()
+                if not error
+            })
+            for email, (normalized, error) in unique.items():
+                if not error and self._domains.get(normalized.rpartition("@")[2]) is False:
+                    unique[email] = (normalized, NO_MAIL_DOMAIN_ERROR)
+
+        return [unique[email] if email else (None, None) for email in emails]
+
+    def _resolve_domains(self, domains):
+        """Look up domains not seen earlier in this upload, concurrently"""
+        pending = [d for d in domains if d not in self._domains]
+        if not pending:
+            return
+
+        with ThreadPoolExecutor(max_workers=min(DNS_CONCURRENCY, len(pending)), thread_name_prefix="parlo-dns") as executor:
+            for domain, accepts in zip(pending, executor.map(domain_accepts_mail, pending)):
+                self._domains[domain] = accepts
+
+    def apply(self, records, is_blank):
+        """
+        Normalize record emails and mark the ones that fail local checks
+        Marked records skip the remote email checks in validate_record_remote.
+        """
+        emails = [None if is_blank(r['email']) else r['email'] for r in records]
+        for record, (normalized, error) in zip(records, self.check_emails(emails)):
+            if is_blank(record['email']):
+                continue
+
+            self.checked += 1
+            if error:
+                self.rejected += 1
+                record['_email_error'] = error
+            else:
+                record['email'] = normalized
+
+        return records
+
+    def collect(self, records):
+        """Count the remote calls skipped for marked records"""
+        for record in records:
+            record.pop('_email_error', None)
+            if record.pop('_email_skipped', False):
+                self.remote_calls_saved += 1
+
+    def get_stats(self):
+        return {
+            "checked": self.checked,
+            "rejected": self.rejected,
+            "remote_calls_saved": self.remote_calls_saved,
+            "domains_resolved": len(self._domains)
+        }
@@ -0,0 +1,307 @@
+import hmac
+import json
+import time
+from contextlib import contextmanager
+
+import frappe
+
+# Request instrumentation.
+# before_request starts a trace that counts and times every frappe.db.sql
+# call and every outbound HTTP call made through api.resilience. Blocks
+# run under span(name) (the permission hooks) are timed as spans of the
+# trace. after_request adds the trace to histograms in one Redis hash:
+#   parlo_request_*  per whitelisted app method / app page ("endpoint")
+#   parlo_hook_*     per span name, summed over the request
+# metrics() exposes them in Prometheus text format. With
+# parlo_sample_slow_requests set in site_config.json, requests slower than
+# parlo_slow_request_ms are kept with their breakdown for get_slow_requests.
+METRICS_KEY = "parlo_metrics"
+SLOW_REQUESTS_KEY = "parlo_slow_requests"
+SLOW_REQUESTS_KEPT = 100
+DEFAULT_SLOW_REQUEST_MS = 1000
+SLOW_QUERIES_KEPT = 10
+
+APP_METHOD_PREFIX = "parlo_license_manager."
+APP_PAGES = {"parlo-auth": "www.parlo_auth", "parlo-dashboard": "www.parlo_dashboard"}
+METRICS_METHOD = "parlo_license_manager.utils.instrumentation.metrics"
+
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+# metric -> (trace value, buckets, help)
+METRICS = {
+    "duration_seconds": ("wall", SECONDS_BUCKETS, "Wall time"),
+    "db_queries": ("db_queries", COUNT_BUCKETS, "Database queries"),
+    "db_seconds": ("db_time", SECONDS_BUCKETS, "Time spent in database queries"),
+    "http_calls": ("http_calls", COUNT_BUCKETS, "Outbound HTTP calls"),
+    "http_seconds": ("http_time", SECONDS_BUCKETS, "Time spent in outbound HTTP calls"),
+}
+KINDS = {"request": "per request", "hook": "per hook, summed over a request"}
+
+
+class Trace:
+    """Counters of one request; spans read them before and after a call"""
+
+    def __init__(self, endpoint, sample):
+        self.endpoint = endpoint
+        self.sample = sample
+        self.started = time.perf_counter()
+        self.db_queries = 0
+        self.db_time = 0.0
+        self.http_calls = 0
+        self.http_time = 0.0
+        self.hooks = {}
+        self.queries = []
+        self.http = []
+
+    def counters(self):
+        return (self.db_queries, self.db_time, self.http_calls, self.http_time)
+
+    def add_span(self, name, wall, before):
+        db_queries, db_time, http_calls, http_time = (a - b for a, b in zip(self.counters(), before))
+        totals = self.hooks.setdefault(name, {
+            "calls": 0, "wall": 0.0, "db_queries": 0, "db_time": 0.0, "http_calls": 0, "http_time": 0.0
+        })
+        totals["calls"] += 1
+        totals["wall"] += wall
+        totals["db_queries"] += db_queries
+        totals["db_time"] += db_time
+        totals["http_calls"] += http_calls
+        totals["http_time"] += http_time
+
+
+def get_trace():
+    return getattr(frappe.local, "parlo_trace", None)
+
+
+def get_endpoint(request):
+    """Endpoint name of an app method or page request, else None"""
+    path = (request.path if request else "").strip("/")
+
+    if path.startswith("api/method/"):
+        method = path[len("api/method/"):]
+        if method.startswith(APP_METHOD_PREFIX) and method != METRICS_METHOD:
+            return method[len(APP_METHOD_PREFIX):]
+        return None
+
+    return APP_PAGES.get(path)
+
+
+def _slow_request_ms():
+    return float(frappe.conf.get("parlo_slow_request_ms") or DEFAULT_SLOW_REQUEST_MS)
+
+
+def _patch_db(trace):
+    """Count and time frappe.db.sql for the rest of the request"""
+    sql = frappe.db.sql
+
+    def timed_sql(query, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return sql(query, *args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - started
+            trace.db_queries += 1
+            trace.db_time += elapsed
+            if trace.sample:
+                trace.queries.append((elapsed, str(query)))
+
+    frappe.db.sql = timed_sql
+
+
+def start_request():
+    """before_request hook"""
+    if not frappe.db:
+        return
+
+    trace = Trace(get_endpoint(getattr(frappe.local, "request", None)),
+        bool(frappe.conf.get("parlo_sample_slow_requests")))
+    frappe.local.parlo_trace = trace
+    _patch_db(trace)
+
+
+def end_request(response=None, request=None):
+    """after_request hook"""
+    trace = get_trace()
+    if not trace:
+        return
+    frappe.local.parlo_trace = None
+
+    wall = time.perf_counter() - trace.started
+    try:
+        record(trace, wall)
+        if trace.sample and trace.endpoint and wall * 1000 >= _slow_request_ms():
+            _keep_slow_request(trace, wall, getattr(response, "status_code", None))
+    except Exception:
+        # Metrics must never fail the request
+        frappe.log_error(frappe.get_traceback(), "Parlo Metrics")
+
+
+@contextmanager
+def span(name):
+    """Time the block as a span of the current request's trace"""
+    trace = get_trace()
+    if not trace:
+        yield
+        return
+
+    before = trace.counters()
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.add_span(name, time.perf_counter() - started, before)
+
+
+def record_http(endpoint, seconds, status_code=None):
+    """Count an outbound HTTP call in the current trace"""
+    trace = get_trace()
+    if not trace:
+        return
+
+    trace.http_calls += 1
+    trace.http_time += seconds
+    if trace.sample:
+        trace.http.append({"endpoint": endpoint, "ms": round(seconds * 1000, 1), "status": status_code})
+
+
+def bucket_index(value, buckets):
+    """Index of the first bucket holding value; len(buckets) is +Inf"""
+    for i, bound in enumerate(buckets):
+        if value <= bound:
+            return i
+    return len(buckets)
+
+
+def _observe(pipe, key, kind, label, values):
+    for metric, (attr, buckets, _help) in METRICS.items():
+        value = values[attr]
+        field = f"{kind}_{metric}|{label}"
+        pipe.hincrby(key, f"{field}|{bucket_index(value, buckets)}", 1)
+        pipe.hincrbyfloat(key, f"{field}|sum", value)
+        pipe.hincrby(key, f"{field}|count", 1)
+
+
+def record(trace, wall):
+    """Add a finished trace to the histograms"""
+    if not trace.endpoint and not trace.hooks:
+        return
+
+    key = frappe.cache().make_key(METRICS_KEY)
+    pipe = frappe.cache().pipeline()
+
+    if trace.endpoint:
+        _observe(pipe, key, "request", trace.endpoint, {
+            "wall": wall, "db_queries": trace.db_queries, "db_time": trace.db_time,
+            "http_calls": trace.http_calls, "http_time": trace.http_time,
+        })
+
+    for name, totals in trace.hooks.items():
+        _observe(pipe, key, "hook", name, totals)
+
+    pipe.execute()
+
+
+def _keep_slow_request(trace, wall, status_code):
+    queries = sorted(trace.queries, key=lambda q: q[0], reverse=True)[:SLOW_QUERIES_KEPT]
+    breakdown = {
+        "endpoint": trace.endpoint,
+        "at": frappe.utils.now(),
+        "user": frappe.session.user if getattr(frappe.local, "session", None) else None,
+        "status": status_code,
+        "wall_ms": round(wall * 1000, 1),
+        "db_queries": trace.db_queries,
+        "db_ms": round(trace.db_time * 1000, 1),
+        "http_calls": trace.http_calls,
+        "http_ms": round(trace.http_time * 1000, 1),
+        "hooks": {
+            name: {"calls": totals["calls"], "ms": round(totals["wall"] * 1000, 1), "db_queries": totals["db_queries"]}
+            for name, totals in trace.hooks.items()
+        },
+        "slowest_queries": [{"ms": round(t * 1000, 1), "query": " ".join(q.split())[:500]} for t, q in queries],
+        "http": trace.http,
+    }
+
+    key = frappe.cache().make_key(SLOW_REQUESTS_KEY)
+    pipe = frappe.cache().pipeline()
+    pipe.lpush(key, json.dumps(breakdown, default=str))
+    pipe.ltrim(key, 0, SLOW_REQUESTS_KEPT - 1)
+    pipe.execute()
+
+
+def _decode(value):
+    return value.decode() if isinstance(value, bytes) else value
+
+
+def _escape(label):
+    return label.replace("\\", "\\\\").replace('"', '\\"')
+
+
+def render_prometheus(fields):
+    """Prometheus text exposition of the raw histogram hash fields"""
+    series = {}
+    for field, value in fields.items():
+        name, label, part = field.rsplit("|", 2)
+        series.setdefault(name, {}).setdefault(label, {})[part] = float(value)
+
+    label_names = {"request": "endpoint", "hook": "function"}
+    lines = []
+    for kind, description in KINDS.items():
+        for metric, (_attr, buckets, help_text) in METRICS.items():
+            name = f"{kind}_{metric}"
+            full_name = f"parlo_{name}"
+            lines.append(f"# HELP {full_name} {help_text} {description}")
+            lines.append(f"# TYPE {full_name} histogram")
+
+            for label, parts in sorted(series.get(name, {}).items()):
+                selector = f'{label_names[kind]}="{_escape(label)}"'
+                cumulative = 0
+                for i, bound in enumerate(buckets + ("+Inf",)):
+                    cumulative += parts.get(str(i), 0)
+                    lines.append(f'{full_name}_bucket{{{selector},le="{bound}"}} {int(cumulative)}')
+                lines.append(f"{full_name}_sum{{{selector}}} {parts.get('sum', 0)}")
+                lines.append(f"{full_name}_count{{{selector}}} {int(parts.get('count', 0))}")
+
+    return "\n".join(lines) + "\n"
+
+
+def _authorized():
+    """System Managers, or a scraper sending the parlo_metrics_token bearer token"""
+    token = frappe.conf.get("parlo_metrics_token")
+    header = frappe.get_request_header("Authorization") or ""
+    if token and hmac.compare_digest(header, f"Bearer {token}"):
+        return True
+    return "System Manager" in frappe.get_roles()
+
+
+@frappe.whitelist(allow_guest=True)
+def metrics():
+    """Histograms in Prometheus text format"""
+    from werkzeug.wrappers import Response
+
+    if not _authorized():
+        raise frappe.PermissionError
+
+    pipe = frappe.cache().pipeline()
+    pipe.hgetall(frappe.cache().make_key(METRICS_KEY))
+    fields = {_decode(k): _decode(v) for k, v in pipe.execute()[0].items()}
+
+    return Response(render_prometheus(fields), mimetype="text/plain; version=0.0.4")
+
+
+@frappe.whitelist()
+def get_slow_requests(limit=20):
+    """Breakdowns of the most recent slow requests"""
+    frappe.only_for("System Manager")
+
+    pipe = frappe.cache().pipeline()
+    pipe.lrange(frappe.cache().make_key(SLOW_REQUESTS_KEY), 0, int(limit) - 1)
+    return [json.loads(_decode(v)) for v in pipe.execute()[0]]
+
+
+@frappe.whitelist()
+def reset_metrics():
+    """Drop all histograms and kept slow requests"""
+    frappe.only_for("System Manager")
+    frappe.cache().delete(frappe.cache().make_key(METRICS_KEY))
+    frappe.cache().delete(frappe.cache().make_key(SLOW_REQUESTS_KEY))
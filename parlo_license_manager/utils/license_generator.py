@@ -1,35 +1,141 @@
 import frappe
+import functools
 import re
 from frappe import _
+from parlo_license_manager.utils.license_stats import on_licenses_used
+
+def get_license_prefix(organization_name, prefix=None):
+    """Get the organization's license prefix, generating it on first use"""
+    if not prefix:
+        prefix = frappe.db.get_value("Organization", organization_name, "license_prefix")
+    
+    if not prefix:
+        # Generate default prefix from organization name
+        org_abbr = ''.join([word[0].upper() for word in organization_name.split()[:3]])
+        prefix = f"{org_abbr}-"
+        frappe.db.set_value("Organization", organization_name, "license_prefix", prefix, update_modified=False)
+    
+    return prefix
+
+def format_license_number(prefix, number):
+    """Format license number with prefix and padded number"""
+    return f"{prefix}{str(number).zfill(5)}"
+
+def reserve_license_series(organization_name, count=1):
+    """
+    Atomically reserve a block of count series numbers for an organization
+    A single UPDATE increments current_license_series, so concurrent callers
+    always receive disjoint ranges. Numbers of failed allocations are not reused.
+    The UPDATE bumps modified, so saving an Organization loaded before the
+    reservation fails check_if_latest instead of writing the old series back.
+    Returns: (first, last) series numbers of the reserved block
+    """
+    count = int(count)
+    if count < 1:
+        frappe.throw(_("License count must be at least 1"))
+    
+    if frappe.db.db_type == "postgres":
+        last = frappe.db.sql("""
+            UPDATE `tabOrganization`
+            SET current_license_series = COALESCE(current_license_series, 0) + %s,
+                modified = %s
+            WHERE name = %s
+            RETURNING current_license_series
+        """, (count, frappe.utils.now(), organization_name))
+    else:
+        frappe.db.sql("""
+            UPDATE `tabOrganization`
+            SET current_license_series = LAST_INSERT_ID(IFNULL(current_license_series, 0) + %s),
+                modified = %s
+            WHERE name = %s
+        """, (count, frappe.utils.now(), organization_name))
+        # LAST_INSERT_ID() keeps its previous value when no row matched
+        last, updated = frappe.db.sql("SELECT LAST_INSERT_ID(), ROW_COUNT()")[0]
+        last = [(last,)] if updated > 0 else None
+    
+    if not last or not last[0][0]:
+        frappe.throw(_("Organization not found"))
+    
+    last = int(last[0][0])
+    return last - count + 1, last
+
+def reserve_license_numbers(organization_name, count=1):
+    """
+    Reserve count license numbers in one round trip
+    Returns: list of license numbers, e.g. ["ORG-00001", "ORG-00002"]
+    """
+    org = frappe.db.get_value("Organization", organization_name,
+        ["has_parlo_license", "license_prefix"], as_dict=True)
+    
+    if not org or not org.has_parlo_license:
+        frappe.throw(_("Parlo License is not enabled for this organization"))
+    
+    prefix = get_license_prefix(organization_name, org.license_prefix)
+    first, last = reserve_license_series(organization_name, count)
+    
+    return [format_license_number(prefix, number) for number in range(first, last + 1)]
 
 def generate_license_number(organization_name):
     """
     Generate a unique license number using organization prefix and series
     Format: PREFIX-XXXXX (e.g., ORG-00001)
     """
-    # Get organization doc
-    org = frappe.get_doc("Organization", organization_name)
-    
-    if not org.has_parlo_license:
-        frappe.throw(_("Parlo License is not enabled for this organization"))
+    return reserve_license_numbers(organization_name, 1)[0]
+
+def update_used_licenses(organization_name, delta):
+    """
+    Atomically change used_licenses by delta and recompute available_licenses
+    Increments only apply while enough licenses are available. Like
+    reserve_license_series, the UPDATE bumps modified so stale Organization
+    docs cannot save the old counters back.
+    Returns: True if the counters were updated
+    """
+    delta = int(delta)
+    returning = "RETURNING name" if frappe.db.db_type == "postgres" else ""
     
-    if not org.license_prefix:
-        # Generate default prefix from organization name
-        org_abbr = ''.join([word[0].upper() for word in organization_name.split()[:3]])
-        org.license_prefix = f"{org_abbr}-"
-        org.save(ignore_permissions=True)
+    # available_licenses is assigned first so it reads the old used_licenses
+    # on both MariaDB (left to right) and Postgres (snapshot) semantics
+    if delta > 0:
+        result = frappe.db.sql(f"""
+            UPDATE `tabOrganization`
+            SET available_licenses = COALESCE(total_licenses, 0) - COALESCE(used_licenses, 0) - %s,
+                used_licenses = COALESCE(used_licenses, 0) + %s,
+                modified = %s
+            WHERE name = %s
+            AND COALESCE(total_licenses, 0) - COALESCE(used_licenses, 0) >= %s
+            {returning}
+        """, (delta, delta, frappe.utils.now(), organization_name, delta))
+    else:
+        result = frappe.db.sql(f"""
+            UPDATE `tabOrganization`
+            SET available_licenses = COALESCE(total_licenses, 0) - GREATEST(COALESCE(used_licenses, 0) + %s, 0),
+                used_licenses = GREATEST(COALESCE(used_licenses, 0) + %s, 0),
+                modified = %s
+            WHERE name = %s
+            {returning}
+        """, (delta, delta, frappe.utils.now(), organization_name))
     
-    # Increment series
-    org.current_license_series = (org.current_license_series or 0) + 1
-    next_number = org.current_license_series
+    # modified always changes, so ROW_COUNT() counts every matched row
+    updated = bool(result) if returning else frappe.db.sql("SELECT ROW_COUNT()")[0][0] > 0
     
-    # Format license number with prefix and padded number
-    license_number = f"{org.license_prefix}{str(next_number).zfill(5)}"
+    # Same cache the Organization on_update hook clears
+    frappe.cache().hdel("organization_data", organization_name)
     
-    # Save the updated series
-    org.save(ignore_permissions=True)
+    if updated:
+        on_licenses_used(organization_name, delta)
     
-    return license_number
+    return updated
+
+# E164 format: + followed by 1-15 digits. Digits are spelled [0-9]: Python's
+# \d also matches non-ASCII digits while pyarrow's RE2 does not, and the
+# scalar and vectorized paths of validate_phones_e164 must agree
+E164_REGEX = r'^\+[1-9][0-9]{1,14}$'
+E164_PATTERN = re.compile(E164_REGEX)
+NON_PHONE_CHARS = re.compile(r'[^0-9+]')
+DEFAULT_COUNTRY_CODE = '+971'
+
+# Below this size validate_phones_e164 loops in Python instead of loading pandas
+VECTORIZE_THRESHOLD = 64
 
 def validate_phone_e164(phone_number):
     """
@@ -37,39 +143,108 @@ def validate_phone_e164(phone_number):
     Returns: (is_valid, formatted_number)
     """
     # Remove all non-digit characters except +
-    cleaned = re.sub(r'[^\d+]', '', str(phone_number))
+    cleaned = NON_PHONE_CHARS.sub('', str(phone_number))
     
-    # E164 format: + followed by 1-15 digits
-    pattern = r'^\+[1-9]\d{1,14}$'
+    if not cleaned:
+        return False, None
     
-    if re.match(pattern, cleaned):
+    if E164_PATTERN.match(cleaned):
         return True, cleaned
     
     # Try to add UAE code if missing + 
     if not cleaned.startswith('+'):
         # Remove leading 0 if present
-        cleaned = cleaned.lstrip('0')
-        cleaned_with_uae = '+971' + cleaned
-        if re.match(pattern, cleaned_with_uae):
+        cleaned_with_uae = DEFAULT_COUNTRY_CODE + cleaned.lstrip('0')
+        if E164_PATTERN.match(cleaned_with_uae):
             return True, cleaned_with_uae
     
     return False, None
 
+@functools.lru_cache(maxsize=None)
+def _has_pyarrow():
+    try:
+        import pyarrow  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+def validate_phones_e164(phone_numbers):
+    """
+    Validate many phone numbers in E164 format
+    Accepts a pandas Series or a list and returns (formatted, valid) of the same
+    kind; formatted is None where the number is invalid. Series and lists of
+    VECTORIZE_THRESHOLD or more numbers are handled with vectorized string
+    operations on pyarrow-backed strings; smaller lists, and everything when
+    pyarrow is missing, go through validate_phone_e164. Both paths give the
+    same results.
+    """
+    is_series = hasattr(phone_numbers, "index") and hasattr(phone_numbers, "astype")
+    
+    if not _has_pyarrow() or (not is_series and len(phone_numbers) < VECTORIZE_THRESHOLD):
+        checked = [validate_phone_e164(p) for p in phone_numbers]
+        formatted = [c[1] for c in checked]
+        valid = [c[0] for c in checked]
+        
+        if is_series:
+            import pandas as pd
+            return (pd.Series(formatted, index=phone_numbers.index, dtype=object),
+                pd.Series(valid, index=phone_numbers.index, dtype=bool))
+        
+        return formatted, valid
+    
+    import pandas as pd
+    
+    series = phone_numbers if is_series else pd.Series(phone_numbers, dtype=object)
+    
+    # Missing cells are invalid, same as their 'nan'/'None' text in the scalar check
+    cleaned = series.astype(object).fillna('').astype(str).astype("string[pyarrow]")
+    cleaned = cleaned.str.replace(NON_PHONE_CHARS.pattern, '', regex=True)
+    present = cleaned.str.len() > 0
+    valid = present & cleaned.str.match(E164_REGEX)
+    
+    # Try to add UAE code where the + is missing
+    with_uae = DEFAULT_COUNTRY_CODE + cleaned.str.lstrip('0')
+    uae_valid = present & ~valid & ~cleaned.str.startswith('+') & with_uae.str.match(E164_REGEX)
+    
+    formatted = cleaned.where(valid, with_uae).astype(object)
+    valid = (valid | uae_valid).astype(bool)
+    formatted = formatted.where(valid, None)
+    
+    if is_series:
+        return formatted, valid
+    
+    valid = valid.tolist()
+    return [f if ok else None for f, ok in zip(formatted.tolist(), valid)], valid
+
 @frappe.whitelist()
 def allocate_license(contact_data, organization_name):
     """
     Allocate license to a contact
     """
+    return _allocate_license(contact_data, organization_name)
+
+def _allocate_license(contact_data, organization_name, license_number=None):
+    """
+    Allocate license to a contact
+    license_number may be pre-reserved with reserve_license_numbers
+    """
     try:
         # Get organization
-        if not frappe.db.exists("Organization", organization_name):
-            frappe.throw(_("Organization not found"))
+        org = frappe.db.get_value("Organization", organization_name,
+            ["has_parlo_license", "available_licenses", "campaign_code"], as_dict=True)
         
-        org = frappe.get_doc("Organization", organization_name)
+        if not org:
+            frappe.throw(_("Organization not found"))
         
         if not org.has_parlo_license:
             frappe.throw(_("Parlo License is not enabled for this organization"))
         
+        # Store phone numbers in E164 format where possible
+        if contact_data.get("phone"):
+            formatted, valid = validate_phones_e164([contact_data.get("phone")])
+            if valid[0]:
+                contact_data["phone"] = formatted[0]
+        
         # Check if contact already exists with this email/phone for this org
         filters = {"license_organization": organization_name}
         
@@ -100,11 +275,12 @@ def allocate_license(contact_data, organization_name):
                 frappe.throw(_("Contact already has a license allocated for this organization"))
         
         # Check available licenses
-        if org.available_licenses <= 0:
+        if (org.available_licenses or 0) <= 0:
             frappe.throw(_("No available licenses for this organization. Please contact Parlo Relationship Manager."))
         
         # Generate license number using prefix and series
-        license_number = generate_license_number(organization_name)
+        if not license_number:
+            license_number = generate_license_number(organization_name)
         
         # Create Contact
         contact = frappe.new_doc("Contact")
@@ -130,7 +306,7 @@ def allocate_license(contact_data, organization_name):
         contact.license_organization = organization_name
         contact.license_number = license_number
         contact.license_allocated_date = frappe.utils.now()
-        contact.license_campaign_code = org.campaign_code
+        contact.license_campaign_code = contact_data.get("campaign_code") or org.campaign_code
         
         # Link to organization
         contact.append("links", {
@@ -151,29 +327,13 @@ def allocate_license(contact_data, organization_name):
             whitelist.insert(ignore_permissions=True)
         
         # Update organization license count
-        org.used_licenses = (org.used_licenses or 0) + 1
-        org.available_licenses = org.total_licenses - org.used_licenses
-        org.save(ignore_permissions=True)
+        if not update_used_licenses(organization_name, 1):
+            frappe.throw(_("No available licenses for this organization. Please contact Parlo Relationship Manager."))
         
         frappe.db.commit()
         
-        # Send welcome email if SMTP configured
-        try:
-            if contact_data.get("email") and frappe.db.get_single_value("Email Account", "default_outgoing"):
-                frappe.sendmail(
-                    recipients=[contact_data.get("email")],
-                    subject=f"Welcome to {organization_name} - License Allocated",
-                    message=f"""
-                    <p>Dear {contact_data.get('first_name', 'User')},</p>
-                    <p>Your license has been successfully allocated.</p>
-                    <p><strong>License Number:</strong> {license_number}</p>
-                    <p><strong>Organization:</strong> {organization_name}</p>
-                    <p>Thank you for joining us!</p>
-                    """,
-                    delayed=False
-                )
-        except Exception as e:
-            frappe.log_error(f"Welcome email error: {str(e)}", "Email Send")
+        # Queue welcome email; sent once SMTP is configured
+        send_welcome_email(contact_data, organization_name, license_number)
         
         return {
             "success": True,
@@ -186,6 +346,15 @@ def allocate_license(contact_data, organization_name):
         frappe.log_error(f"License allocation error: {str(e)}", "License Allocation")
         return {"success": False, "error": str(e)}
 
+def send_welcome_email(contact_data, organization_name, license_number):
+    """Queue the license welcome email; delivery happens in a background worker"""
+    from parlo_license_manager.utils.welcome_email import queue_welcome_email
+
+    try:
+        queue_welcome_email(contact_data, organization_name, license_number)
+    except Exception as e:
+        frappe.log_error(f"Welcome email error: {str(e)}", "Email Send")
+
 @frappe.whitelist()
 def deallocate_license(contact_name, organization_name):
     """Deallocate a license (for cancellations)"""
@@ -206,10 +375,7 @@ def deallocate_license(contact_name, organization_name):
         contact.save(ignore_permissions=True)
         
         # Update organization
-        org = frappe.get_doc("Organization", organization_name)
-        org.used_licenses = max(0, (org.used_licenses or 0) - 1)
-        org.available_licenses = org.total_licenses - org.used_licenses
-        org.save(ignore_permissions=True)
+        update_used_licenses(organization_name, -1)
         
         # Delete whitelist entry if exists
         if frappe.db.exists("DocType", "Parlo Whitelist"):
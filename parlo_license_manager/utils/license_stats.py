@@ -0,0 +1,190 @@
+import time
+
+import frappe
+
+# Per-organization license statistics kept in a Redis hash.
+# The hash is built with one recount and then adjusted incrementally by
+# allocation, deallocation and Lead changes instead of being recounted on
+# every view. STATS_TTL (parlo_license_stats_ttl in site_config.json) bounds
+# how long increments are trusted before the next read recounts;
+# get_license_stats(force_refresh=True) recounts immediately.
+STATS_KEY = "parlo_org_license_stats:{0}"
+STATS_TTL = 24 * 60 * 60
+UNALLOCATED_LEAD_STATUSES = ("Converted", "Do Not Contact")
+COUNTERS = ("total_licenses", "used_licenses", "available_licenses", "allocated_contacts", "unallocated_leads")
+
+# Apply increments only while the hash exists, so a missing or expired
+# entry is rebuilt by a full recount instead of starting from zero
+ADJUST_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return 0
+end
+for i = 1, #ARGV - 1, 2 do
+    redis.call('HINCRBY', KEYS[1], ARGV[i], ARGV[i + 1])
+end
+redis.call('HSET', KEYS[1], 'updated_at', ARGV[#ARGV])
+return 1
+"""
+
+
+def _key(organization_name):
+    return frappe.cache().make_key(STATS_KEY.format(organization_name))
+
+
+def _execute(*commands):
+    """Run raw Redis commands on made keys in one round trip"""
+    pipe = frappe.cache().pipeline()
+    for command, *args in commands:
+        getattr(pipe, command)(*args)
+    return pipe.execute()
+
+
+def _decode(value):
+    return value.decode() if isinstance(value, bytes) else value
+
+
+def _after_commit(callback):
+    """Run callback once the current transaction commits (immediately if unsupported)"""
+    hooks = getattr(frappe.db, "after_commit", None)
+    if hooks is not None:
+        hooks.add(callback)
+    else:
+        callback()
+
+
+def compute_license_stats(organization_name):
+    """Recount the statistics for an organization and store them"""
+    org = frappe.db.get_value("Organization", organization_name,
+        ["total_licenses", "used_licenses", "available_licenses", "campaign_code"], as_dict=True)
+    if not org:
+        return None
+
+    allocated_contacts = frappe.db.count("Contact", {
+        "license_organization": organization_name,
+        "has_parlo_license": 1
+    })
+
+    unallocated_leads = 0
+    if org.campaign_code:
+        unallocated_leads = frappe.db.count("Lead", {
+            "campaign_code": org.campaign_code,
+            "status": ["not in", UNALLOCATED_LEAD_STATUSES]
+        })
+
+    now = time.time()
+    stats = {
+        "total_licenses": int(org.total_licenses or 0),
+        "used_licenses": int(org.used_licenses or 0),
+        "available_licenses": int(org.available_licenses or 0),
+        "allocated_contacts": allocated_contacts,
+        "unallocated_leads": unallocated_leads,
+        "computed_at": now,
+        "updated_at": now,
+    }
+
+    key = _key(organization_name)
+    _execute(
+        ("delete", key),
+        ("hset", key, None, None, stats),
+        ("expire", key, int(frappe.conf.get("parlo_license_stats_ttl") or STATS_TTL))
+    )
+
+    return stats
+
+
+def get_license_stats(organization_name, force_refresh=False):
+    """
+    License statistics for an organization from the cache
+    Recounts when missing or when force_refresh is set. computed_at is the
+    last recount, updated_at the last change and age the seconds since it.
+    """
+    stats = None
+    if not force_refresh:
+        raw = _execute(("hgetall", _key(organization_name)))[0]
+        stats = {_decode(k): _decode(v) for k, v in raw.items()}
+
+    if not stats or "computed_at" not in stats:
+        stats = compute_license_stats(organization_name)
+        if not stats:
+            return None
+
+    result = {field: int(float(stats.get(field) or 0)) for field in COUNTERS}
+    result["computed_at"] = float(stats["computed_at"])
+    result["updated_at"] = float(stats["updated_at"])
+    result["age"] = round(time.time() - result["updated_at"], 1)
+    return result
+
+
+def adjust_license_stats(organization_name, **deltas):
+    """Apply counter increments once the current transaction commits"""
+    deltas = {field: int(delta) for field, delta in deltas.items() if delta}
+    if not organization_name or not deltas:
+        return
+
+    args = [value for pair in deltas.items() for value in pair] + [time.time()]
+
+    _after_commit(lambda: _execute(("eval", ADJUST_SCRIPT, 1, _key(organization_name), *args)))
+
+
+def invalidate_license_stats(organization_name):
+    """Drop the cached statistics; the next read recounts"""
+    _after_commit(lambda: _execute(("delete", _key(organization_name))))
+
+
+def on_licenses_used(organization_name, delta):
+    """Allocation (+) or deallocation (-) of delta licenses"""
+    adjust_license_stats(
+        organization_name,
+        used_licenses=delta,
+        available_licenses=-delta,
+        allocated_contacts=delta
+    )
+
+
+def _organizations_for_campaign(campaign_code):
+    if not campaign_code:
+        return []
+    return frappe.get_all("Organization", filters={"campaign_code": campaign_code}, pluck="name")
+
+
+def on_leads_allocated(campaign_code, count):
+    """count unallocated leads of a campaign were converted"""
+    for organization_name in _organizations_for_campaign(campaign_code):
+        adjust_license_stats(organization_name, unallocated_leads=-count)
+
+
+def _is_unallocated(lead):
+    return bool(lead and lead.get("campaign_code") and lead.get("status") not in UNALLOCATED_LEAD_STATUSES)
+
+
+def update_lead_stats(doc, method=None):
+    """doc_events hook: count a Lead in or out of its campaign's unallocated leads"""
+    before = doc.get_doc_before_save() if method != "on_trash" else doc
+    after = None if method == "on_trash" else doc
+
+    was, now = _is_unallocated(before), _is_unallocated(after)
+    old_code = before.get("campaign_code") if before else None
+    new_code = after.get("campaign_code") if after else None
+
+    if was and (not now or old_code != new_code):
+        for organization_name in _organizations_for_campaign(old_code):
+            adjust_license_stats(organization_name, unallocated_leads=-1)
+
+    if now and (not was or old_code != new_code):
+        for organization_name in _organizations_for_campaign(new_code):
+            adjust_license_stats(organization_name, unallocated_leads=1)
+
+
+def update_organization_stats(doc):
+    """Organization saved: totals or campaign may have changed"""
+    before = doc.get_doc_before_save()
+    if before and before.campaign_code == doc.campaign_code and \
+            before.has_parlo_license == doc.has_parlo_license:
+        adjust_license_stats(
+            doc.name,
+            total_licenses=(doc.total_licenses or 0) - (before.total_licenses or 0),
+            used_licenses=(doc.used_licenses or 0) - (before.used_licenses or 0),
+            available_licenses=(doc.available_licenses or 0) - (before.available_licenses or 0)
+        )
+    else:
+        invalidate_license_stats(doc.name)
@@ -1,45 +1,45 @@
 import frappe
 from frappe import _
+from parlo_license_manager.utils.license_stats import get_license_stats
+
+# Per-organization list of license managers, see get_license_managers
+LICENSE_MANAGERS_CACHE = "parlo_license_managers"
 
 @frappe.whitelist()
-def get_organization_license_info(organization_name):
-    """Get license information for an organization"""
+def get_organization_license_info(organization_name, force_refresh=False):
+    """
+    Get license information for an organization
+    Counts come from the license stats cache; force_refresh recounts them.
+    stats_updated_at / stats_age tell how fresh the counts are.
+    """
     
     if not frappe.has_permission("Organization", "read", organization_name):
         frappe.throw(_("You don't have permission to view this organization"))
     
-    org = frappe.get_doc("Organization", organization_name)
+    org = frappe.db.get_value("Organization", organization_name,
+        ["has_parlo_license", "campaign_code", "license_prefix", "license_status"], as_dict=True)
     
-    if not org.has_parlo_license:
+    if not org or not org.has_parlo_license:
         return {
             "enabled": False,
             "message": "Parlo License is not enabled for this organization"
         }
     
-    # Get allocated contacts count
-    allocated_contacts = frappe.db.count("Contact", {
-        "license_organization": organization_name,
-        "has_parlo_license": 1
-    })
-    
-    # Get leads count if campaign code exists
-    lead_count = 0
-    if org.campaign_code:
-        lead_count = frappe.db.count("Lead", {
-            "campaign_code": org.campaign_code,
-            "status": ["not in", ["Converted", "Do Not Contact"]]
-        })
+    stats = get_license_stats(organization_name, force_refresh=frappe.utils.cint(force_refresh))
     
     return {
         "enabled": True,
-        "total_licenses": org.total_licenses or 0,
-        "used_licenses": org.used_licenses or 0,
-        "available_licenses": org.available_licenses or 0,
-        "allocated_contacts": allocated_contacts,
-        "unallocated_leads": lead_count,
+        "total_licenses": stats["total_licenses"],
+        "used_licenses": stats["used_licenses"],
+        "available_licenses": stats["available_licenses"],
+        "allocated_contacts": stats["allocated_contacts"],
+        "unallocated_leads": stats["unallocated_leads"],
         "campaign_code": org.campaign_code,
         "license_prefix": org.license_prefix,
-        "status": org.license_status
+        "status": org.license_status,
+        "stats_computed_at": stats["computed_at"],
+        "stats_updated_at": stats["updated_at"],
+        "stats_age": stats["age"]
     }
 
 @frappe.whitelist()
@@ -67,6 +67,9 @@ def update_license_counts(organization_name):
     
     frappe.db.commit()
     
+    # Rebuild the cached stats from the corrected counts
+    get_license_stats(organization_name, force_refresh=True)
+    
     return {
         "success": True,
         "used": used_count,
@@ -74,47 +77,61 @@ def update_license_counts(organization_name):
         "total": org.total_licenses
     }
 
+def _load_license_managers(organization_name):
+    """System Managers and the organization's license managers, enabled users only"""
+    
+    managers = frappe.db.sql("""
+        SELECT DISTINCT u.name AS user, u.full_name, 'System Manager' AS role
+        FROM `tabHas Role` hr
+        JOIN `tabUser` u ON u.name = hr.parent
+        WHERE hr.parenttype = 'User'
+        AND hr.role = 'System Manager'
+        AND u.enabled = 1
+        ORDER BY u.name
+    """, as_dict=True)
+    
+    seen = {m.user for m in managers}
+    for manager in frappe.db.sql("""
+        SELECT u.name AS user, u.full_name, 'License Manager' AS role
+        FROM `tabOrganization Admin User` au
+        JOIN `tabUser` u ON u.name = au.user
+        WHERE au.parenttype = 'Organization'
+        AND au.parentfield = 'license_managers'
+        AND au.parent = %s
+        AND u.enabled = 1
+        ORDER BY au.idx
+    """, organization_name, as_dict=True):
+        if manager.user not in seen:
+            seen.add(manager.user)
+            managers.append(manager)
+    
+    return [dict(m) for m in managers]
+
 @frappe.whitelist()
 def get_license_managers(organization_name):
     """Get list of users who can manage licenses for an organization"""
     
-    org = frappe.get_doc("Organization", organization_name)
-    
-    if not org.has_parlo_license:
+    if not frappe.db.get_value("Organization", organization_name, "has_parlo_license"):
         return []
     
-    managers = []
-    
-    # Get users with System Manager role
-    system_managers = frappe.get_all("Has Role",
-        filters={"role": "System Manager"},
-        pluck="parent"
-    )
-    
-    for user in system_managers:
-        user_doc = frappe.get_doc("User", user)
-        if user_doc.enabled:
-            managers.append({
-                "user": user,
-                "full_name": user_doc.full_name,
-                "role": "System Manager"
-            })
-    
-    # Get users from license_managers field
-    if org.license_managers:
-        for user in org.license_managers.split(","):
-            user = user.strip()
-            if frappe.db.exists("User", user):
-                user_doc = frappe.get_doc("User", user)
-                if user_doc.enabled and user not in [m["user"] for m in managers]:
-                    managers.append({
-                        "user": user,
-                        "full_name": user_doc.full_name,
-                        "role": "License Manager"
-                    })
+    managers = frappe.cache().hget(LICENSE_MANAGERS_CACHE, organization_name)
+    if managers is None:
+        managers = _load_license_managers(organization_name)
+        frappe.cache().hset(LICENSE_MANAGERS_CACHE, organization_name, managers)
     
     return managers
 
+def clear_license_managers_cache(doc, method=None):
+    """
+    doc_events hook for Organization and User
+    An Organization change affects its own list; a User change (roles,
+    enabled, name) can affect every organization's.
+    """
+    if doc.doctype == "Organization":
+        frappe.cache().hdel(LICENSE_MANAGERS_CACHE, doc.name)
+    else:
+        frappe.cache().delete_value(LICENSE_MANAGERS_CACHE)
+
 @frappe.whitelist()
 def add_license_manager(organization_name, user_email):
     """Add a user as license manager for an organization"""
@@ -0,0 +1,265 @@
+import re
+
+import frappe
+
+# Search index for license holders (Contacts, scoped by license
+# organization) and campaign leads (Leads, scoped by campaign code).
+# Each document is stored as a few Parlo Search Term rows:
+#   email / email_local / email_domain - lowercased address and its parts
+#   phone                              - digits reversed, for suffix matching
+#   name                               - lowercased name tokens
+# Lookups are prefix matches on (reference_doctype, scope, kind, term),
+# so they are index range scans instead of LIKE '%term%' table scans.
+INDEX_DOCTYPE = "Parlo Search Term"
+UNALLOCATED_LEAD_STATUSES = ("Converted", "Do Not Contact")
+CHUNK_SIZE = 500
+MIN_PHONE_DIGITS = 3
+
+NON_DIGITS = re.compile(r"\D")
+PHONE_TERM = re.compile(r"^[\d\s()+\-.]+$")
+NAME_TOKENS = re.compile(r"\w+", re.UNICODE)
+
+
+def email_terms(email):
+    email = (email or "").strip().lower()
+    local, at, domain = email.rpartition("@")
+    if not at:
+        return []
+    return [("email", email), ("email_local", local), ("email_domain", domain)]
+
+
+def phone_terms(phone):
+    digits = NON_DIGITS.sub("", phone or "")
+    return [("phone", digits[::-1])] if digits else []
+
+
+def name_terms(name):
+    return [("name", token) for token in NAME_TOKENS.findall((name or "").lower())]
+
+
+def build_terms(emails=(), phones=(), names=()):
+    """Distinct (kind, term) pairs for a document"""
+    terms = []
+    for email in emails:
+        terms.extend(email_terms(email))
+    for phone in phones:
+        terms.extend(phone_terms(phone))
+    for name in names:
+        terms.extend(name_terms(name))
+    return list(dict.fromkeys((kind, term[:140]) for kind, term in terms if term))
+
+
+def chunks(values, size=CHUNK_SIZE):
+    """Split values into lists of at most size"""
+    values = list(values)
+    for i in range(0, len(values), size):
+        yield values[i:i + size]
+
+
+def remove_from_index(doctype, names):
+    """Drop the terms of the given documents"""
+    for chunk in chunks(names):
+        frappe.db.sql(f"""
+            DELETE FROM `tab{INDEX_DOCTYPE}`
+            WHERE reference_doctype = %s
+            AND reference_name IN ({', '.join(['%s'] * len(chunk))})
+        """, (doctype, *chunk))
+
+
+def index_documents(doctype, entries):
+    """
+    Replace the terms of many documents with set-based writes
+    entries: dicts with name, scope and lists of emails, phones, names
+    """
+    if not entries:
+        return
+
+    remove_from_index(doctype, [e["name"] for e in entries])
+
+    now = frappe.utils.now()
+    user = frappe.session.user
+    rows = []
+    for entry in entries:
+        for kind, term in build_terms(entry.get("emails") or (), entry.get("phones") or (), entry.get("names") or ()):
+            rows.append([
+                frappe.generate_hash(length=12), now, now, user, user, 0,
+                doctype, entry["name"], entry["scope"], kind, term
+            ])
+
+    if rows:
+        frappe.db.bulk_insert(
+            INDEX_DOCTYPE,
+            ["name", "creation", "modified", "owner", "modified_by", "docstatus",
+             "reference_doctype", "reference_name", "scope", "kind", "term"],
+            rows,
+            chunk_size=CHUNK_SIZE
+        )
+
+
+def _child_values(doctype, parents, field):
+    """field of a Contact child table grouped by parent"""
+    values = {}
+    for chunk in chunks(parents):
+        for parent, value in frappe.db.sql(f"""
+            SELECT parent, {field} FROM `tab{doctype}`
+            WHERE parenttype = 'Contact'
+            AND parent IN ({', '.join(['%s'] * len(chunk))})
+        """, tuple(chunk)):
+            values.setdefault(parent, []).append(value)
+    return values
+
+
+def index_contacts(names):
+    """(Re)index Contacts by name; non license holders are dropped"""
+    names = list(names)
+    if not names:
+        return
+
+    contacts = []
+    for chunk in chunks(names):
+        contacts.extend(frappe.db.sql(f"""
+            SELECT name, full_name, first_name, last_name, email_id, phone, mobile_no,
+                has_parlo_license, license_organization
+            FROM `tabContact`
+            WHERE name IN ({', '.join(['%s'] * len(chunk))})
+        """, tuple(chunk), as_dict=True))
+
+    holders = [c for c in contacts if c.has_parlo_license and c.license_organization]
+    emails = _child_values("Contact Email", [c.name for c in holders], "email_id")
+    phones = _child_values("Contact Phone", [c.name for c in holders], "phone")
+
+    remove_from_index("Contact", set(names) - {c.name for c in holders})
+    index_documents("Contact", [{
+        "name": c.name,
+        "scope": c.license_organization,
+        "emails": emails.get(c.name, []) + [c.email_id],
+        "phones": phones.get(c.name, []) + [c.phone, c.mobile_no],
+        "names": [c.full_name or " ".join(filter(None, [c.first_name, c.last_name]))],
+    } for c in holders])
+
+
+def index_leads(names):
+    """(Re)index Leads by name; leads without a campaign or already converted are dropped"""
+    names = list(names)
+    if not names:
+        return
+
+    leads = []
+    for chunk in chunks(names):
+        leads.extend(frappe.db.sql(f"""
+            SELECT name, lead_name, email_id, mobile_no, phone, campaign_code, status
+            FROM `tabLead`
+            WHERE name IN ({', '.join(['%s'] * len(chunk))})
+        """, tuple(chunk), as_dict=True))
+
+    indexed = [l for l in leads if l.campaign_code and l.status not in UNALLOCATED_LEAD_STATUSES]
+
+    remove_from_index("Lead", set(names) - {l.name for l in indexed})
+    index_documents("Lead", [{
+        "name": l.name,
+        "scope": l.campaign_code,
+        "emails": [l.email_id],
+        "phones": [l.mobile_no, l.phone],
+        "names": [l.lead_name],
+    } for l in indexed])
+
+
+def update_contact_index(doc, method=None):
+    """doc_events hook: keep a Contact's terms in sync"""
+    index_contacts([doc.name])
+
+
+def update_lead_index(doc, method=None):
+    """doc_events hook: keep a Lead's terms in sync"""
+    index_leads([doc.name])
+
+
+def remove_document_index(doc, method=None):
+    """doc_events hook: drop a deleted document's terms"""
+    remove_from_index(doc.doctype, [doc.name])
+
+
+def rebuild_search_index(batch_size=5000):
+    """Rebuild the whole index (bench execute or patch)"""
+    frappe.db.sql(f"DELETE FROM `tab{INDEX_DOCTYPE}`")
+
+    for doctype, condition, index in (
+        ("Contact", "has_parlo_license = 1", index_contacts),
+        ("Lead", "IFNULL(campaign_code, '') != ''", index_leads),
+    ):
+        last = ""
+        while True:
+            names = frappe.db.sql_list(f"""
+                SELECT name FROM `tab{doctype}`
+                WHERE {condition} AND name > %s
+                ORDER BY name
+                LIMIT %s
+            """, (last, batch_size))
+            if not names:
+                break
+
+            index(names)
+            frappe.db.commit()
+            last = names[-1]
+
+
+def _like_prefix(text):
+    text = text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"{text}%"
+
+
+def parse_search_term(search_term):
+    """
+    Turn user input into [(kinds, prefix)]; every entry must match
+    "@domain" -> domain prefix, "a@b" -> address prefix, digits -> phone
+    suffix, anything else -> name token or email local-part prefixes
+    """
+    term = (search_term or "").strip().lower()
+    if not term:
+        return []
+
+    if "@" in term:
+        if term.startswith("@"):
+            return [(("email_domain",), term[1:])] if term[1:] else []
+        return [(("email",), term)]
+
+    digits = NON_DIGITS.sub("", term)
+    if PHONE_TERM.match(term) and len(digits) >= MIN_PHONE_DIGITS:
+        return [(("phone",), digits[::-1])]
+
+    tokens = NAME_TOKENS.findall(term)
+    if len(tokens) == 1:
+        return [(("name", "email_local"), tokens[0])]
+    return [(("name",), token) for token in tokens]
+
+
+def search_index(doctype, scope, search_term, limit=20):
+    """
+    Names of documents in scope matching search_term, best first
+    Each part of the term is a prefix lookup; multi-word names must match
+    every word.
+    """
+    parts = parse_search_term(search_term)
+    if not parts or not scope:
+        return []
+
+    def condition(alias, kinds, prefix):
+        sql = f"""{alias}.reference_doctype = %s AND {alias}.scope = %s
+            AND {alias}.kind IN ({', '.join(['%s'] * len(kinds))}) AND {alias}.term LIKE %s"""
+        return sql, [doctype, scope, *kinds, _like_prefix(prefix)]
+
+    joins, join_values = [], []
+    for i, (kinds, prefix) in enumerate(parts[1:], start=1):
+        sql, values = condition(f"t{i}", kinds, prefix)
+        joins.append(f"JOIN `tab{INDEX_DOCTYPE}` t{i} ON t{i}.reference_name = t0.reference_name AND {sql}")
+        join_values.extend(values)
+
+    where, where_values = condition("t0", *parts[0])
+
+    return frappe.db.sql_list(f"""
+        SELECT DISTINCT t0.reference_name
+        FROM `tab{INDEX_DOCTYPE}` t0
+        {' '.join(joins)}
+        WHERE {where}
+        LIMIT %s
+    """, (*join_values, *where_values, int(limit)))
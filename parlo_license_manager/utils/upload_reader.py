@@ -0,0 +1,126 @@
+import base64
+import csv
+import io
+from itertools import islice
+
+# Streaming readers for bulk upload files. Rows are read lazily in chunks
+# (read-only openpyxl for .xlsx, the csv module for .csv) so memory stays
+# flat regardless of sheet size. Legacy .xls files go through pandas.
+DEFAULT_CHUNK_SIZE = 1000
+
+XLSX_MAGIC = b"PK\x03\x04"
+XLS_MAGIC = b"\xd0\xcf\x11\xe0"
+
+
+def decode_file_content(file_content):
+    """Accept raw bytes, text, or a base64 data URL from the browser"""
+    if isinstance(file_content, (bytes, bytearray)):
+        return bytes(file_content)
+
+    if isinstance(file_content, str):
+        if file_content.startswith("data:") and ";base64," in file_content:
+            return base64.b64decode(file_content.split(";base64,", 1)[1])
+        return file_content.encode("utf-8")
+
+    raise ValueError("Unsupported file content")
+
+
+def detect_format(file_content, filename=None):
+    """Detect upload format from the file name, falling back to magic bytes"""
+    extension = (filename or "").rsplit(".", 1)[-1].lower() if filename and "." in filename else ""
+    if extension in ("csv", "xlsx", "xls"):
+        return extension
+
+    if file_content.startswith(XLSX_MAGIC):
+        return "xlsx"
+    if file_content.startswith(XLS_MAGIC):
+        return "xls"
+    return "csv"
+
+
+def cell_to_str(value):
+    """Render a cell the way users typed it (no trailing .0 on whole numbers)"""
+    if value is None:
+        return ""
+    if isinstance(value, float):
+        if value != value:  # NaN
+            return ""
+        if value.is_integer():
+            return str(int(value))
+    return str(value).strip()
+
+
+def _is_empty_row(values):
+    return all(v is None or v == "" for v in values)
+
+
+class UploadReader:
+    """Read a bulk upload sheet as chunks of row dicts"""
+
+    def __init__(self, file_content, filename=None):
+        self.content = decode_file_content(file_content)
+        self.format = detect_format(self.content, filename)
+        self._columns = None
+
+    @property
+    def columns(self):
+        if self._columns is None:
+            rows = self._iter_raw_rows()
+            self._columns = next(rows, None) or []
+            rows.close()
+        return self._columns
+
+    def _iter_raw_rows(self):
+        """Yield header then data rows as lists of strings, skipping empty rows"""
+        if self.format == "xlsx":
+            yield from self._iter_xlsx()
+        elif self.format == "xls":
+            yield from self._iter_xls()
+        else:
+            yield from self._iter_csv()
+
+    def _iter_xlsx(self):
+        from openpyxl import load_workbook
+
+        workbook = load_workbook(io.BytesIO(self.content), read_only=True, data_only=True)
+        try:
+            for values in workbook.active.iter_rows(values_only=True):
+                if not _is_empty_row(values):
+                    yield [cell_to_str(v) for v in values]
+        finally:
+            workbook.close()
+
+    def _iter_xls(self):
+        import pandas as pd
+
+        df = pd.read_excel(io.BytesIO(self.content), dtype=object)
+        yield [cell_to_str(c) for c in df.columns]
+        for values in df.itertuples(index=False, name=None):
+            if not _is_empty_row(values):
+                yield [cell_to_str(v) for v in values]
+
+    def _iter_csv(self):
+        text = io.TextIOWrapper(io.BytesIO(self.content), encoding="utf-8-sig", newline="")
+        for values in csv.reader(text):
+            if not _is_empty_row(values):
+                yield [v.strip() for v in values]
+
+    def iter_rows(self):
+        """Yield each data row as a dict keyed by header"""
+        rows = self._iter_raw_rows()
+        header = next(rows, None) or []
+        for values in rows:
+            yield dict(zip(header, values))
+
+    def iter_chunks(self, chunk_size=DEFAULT_CHUNK_SIZE):
+        """Yield lists of up to chunk_size row dicts"""
+        rows = self.iter_rows()
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                return
+            yield chunk
+
+    def count_rows(self):
+        """Count data rows without keeping them"""
+        return sum(1 for _ in self._iter_raw_rows()) - 1 if self.columns else 0
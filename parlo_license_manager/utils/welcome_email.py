@@ -0,0 +1,310 @@
+import json
+import random
+import time
+
+import frappe
+
+# Outbound queue for license welcome emails.
+# Allocation pushes a small JSON payload onto a Redis list and returns;
+# drain_welcome_emails sends them in batches from a background worker.
+# Tunables in site_config.json:
+#   parlo_welcome_email_batch_size    - emails sent per drain batch
+#   parlo_welcome_email_rate_limit    - emails per minute per SMTP account
+#   parlo_welcome_email_max_attempts  - attempts before an email is dropped
+QUEUE_KEY = "parlo_welcome_email_queue"
+RETRY_KEY = "parlo_welcome_email_retry"
+STATS_KEY = "parlo_welcome_email_stats"
+DRAIN_FLAG_KEY = "parlo_welcome_email_drain_scheduled"
+
+DEFAULT_BATCH_SIZE = 100
+DEFAULT_RATE_LIMIT = 300
+DEFAULT_MAX_ATTEMPTS = 5
+RETRY_BASE_DELAY = 30
+RETRY_MAX_DELAY = 60 * 60
+DRAIN_FLAG_TTL = 10 * 60
+
+WELCOME_SUBJECT = "Welcome to {{ organization }} - License Allocated"
+WELCOME_TEMPLATE = """
+<p>Dear {{ first_name or 'User' }},</p>
+<p>Your license has been successfully allocated.</p>
+<p><strong>License Number:</strong> {{ license_number }}</p>
+<p><strong>Organization:</strong> {{ organization }}</p>
+<p>Thank you for joining us!</p>
+"""
+
+
+def _key(name):
+    return frappe.cache().make_key(name)
+
+
+def _execute(*commands):
+    """
+    Run raw Redis commands on made keys in one round trip
+    Goes through a pipeline so RedisWrapper never prefixes a key twice.
+    """
+    pipe = frappe.cache().pipeline()
+    for command, *args in commands:
+        getattr(pipe, command)(*args)
+    return pipe.execute()
+
+
+def _conf_int(key, default):
+    return int(frappe.conf.get(key) or default)
+
+
+def queue_welcome_emails(items):
+    """
+    Queue welcome emails for allocated licenses
+    items: iterable of (contact_data, organization_name, license_number)
+    """
+    payloads = [
+        json.dumps({
+            "email": contact_data.get("email"),
+            "first_name": contact_data.get("first_name") or "",
+            "organization": organization_name,
+            "license_number": license_number,
+            "attempts": 0,
+        })
+        for contact_data, organization_name, license_number in items
+        if contact_data.get("email")
+    ]
+
+    if not payloads:
+        return 0
+
+    _execute(("rpush", _key(QUEUE_KEY), *payloads))
+    schedule_drain()
+    return len(payloads)
+
+
+def queue_welcome_email(contact_data, organization_name, license_number):
+    """Queue the license welcome email for a single contact"""
+    return queue_welcome_emails([(contact_data, organization_name, license_number)])
+
+
+def schedule_drain():
+    """Enqueue a drain job unless one is already pending"""
+    (scheduled,) = _execute(("set", _key(DRAIN_FLAG_KEY), 1, DRAIN_FLAG_TTL, None, True))
+    if scheduled:
+        frappe.enqueue(
+            "parlo_license_manager.utils.welcome_email.drain_welcome_emails",
+            queue="short",
+            enqueue_after_commit=True
+        )
+
+
+def get_outgoing_account():
+    """Name of the default outgoing Email Account, if any"""
+    return frappe.db.get_value("Email Account", {"default_outgoing": 1, "enable_outgoing": 1}, "name")
+
+
+def _rate_key(account):
+    """Budget key of the account's current one-minute window"""
+    return _key(f"parlo_welcome_email_rate:{account}:{int(time.time() // 60)}")
+
+
+def _acquire_rate(key, wanted):
+    """
+    Take up to wanted sends from a per-minute budget (see _rate_key)
+    Counted in Redis so the limit holds across all workers.
+    """
+    limit = _conf_int("parlo_welcome_email_rate_limit", DEFAULT_RATE_LIMIT)
+
+    used, _expire = _execute(("incrby", key, wanted), ("expire", key, 120))
+
+    granted = max(0, min(wanted, limit - (used - wanted)))
+    if granted < wanted:
+        # Give back what was not granted
+        _release_rate(key, wanted - granted)
+    return granted
+
+
+def _release_rate(key, count):
+    if count > 0:
+        _execute(("decrby", key, count))
+
+
+def _defer_drain():
+    """
+    Hold off drain jobs until the rate window rolls over
+    Keeps the drain flag set for the rest of the minute, so neither this
+    drain nor new allocations enqueue jobs that would find no budget; the
+    leftovers go out with the next allocation or scheduler run after that.
+    """
+    ttl = max(1, 60 - int(time.time() % 60))
+    _execute(("set", _key(DRAIN_FLAG_KEY), 1, ttl))
+
+
+def _pop_batch(size):
+    # MULTI/EXEC, so concurrent drains never pop the same rows
+    rows, _trimmed = _execute(
+        ("lrange", _key(QUEUE_KEY), 0, size - 1),
+        ("ltrim", _key(QUEUE_KEY), size, -1)
+    )
+    return [json.loads(row) for row in rows]
+
+
+def _schedule_retry(item, error):
+    """Retry later with jittered exponential backoff, or give up"""
+    item["attempts"] = item.get("attempts", 0) + 1
+    item["last_error"] = str(error)[:500]
+
+    if item["attempts"] >= _conf_int("parlo_welcome_email_max_attempts", DEFAULT_MAX_ATTEMPTS):
+        _incr_stat("dropped")
+        frappe.log_error(
+            f"Welcome email to {item.get('email')} dropped after {item['attempts']} attempts: {item['last_error']}",
+            "Email Send"
+        )
+        return
+
+    delay = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * (2 ** (item["attempts"] - 1)))
+    delay = delay * random.uniform(0.8, 1.2)
+    _execute(("zadd", _key(RETRY_KEY), {json.dumps(item): time.time() + delay}))
+    _incr_stat("retried")
+
+
+def _promote_due_retries():
+    """Move retries whose backoff has elapsed back onto the queue"""
+    now = time.time()
+    (due,) = _execute(("zrangebyscore", _key(RETRY_KEY), 0, now))
+    if not due:
+        return 0
+
+    _execute(("zremrangebyscore", _key(RETRY_KEY), 0, now), ("rpush", _key(QUEUE_KEY), *due))
+    return len(due)
+
+
+def _queue_depth():
+    return _execute(("llen", _key(QUEUE_KEY)))[0]
+
+
+def _incr_stat(field, amount=1):
+    _execute(("hincrby", _key(STATS_KEY), field, amount))
+
+
+def _render_batch(items):
+    """
+    Render subject and body for a batch
+    Templates are compiled once per batch and the organization part of
+    the context (subject included) is built once per organization.
+    """
+    jenv = frappe.get_jenv()
+    subject_template = jenv.from_string(WELCOME_SUBJECT)
+    body_template = jenv.from_string(WELCOME_TEMPLATE)
+
+    contexts = {}
+    for item in items:
+        organization = item["organization"]
+        if organization not in contexts:
+            context = {"organization": organization}
+            context["subject"] = subject_template.render(context)
+            contexts[organization] = context
+
+        context = contexts[organization]
+        item["subject"] = context["subject"]
+        item["message"] = body_template.render(
+            context,
+            first_name=item.get("first_name"),
+            license_number=item.get("license_number")
+        )
+    return items
+
+
+def drain_welcome_emails(max_batches=None):
+    """
+    Background job: send queued welcome emails in rate-limited batches
+    Also runs from the scheduler to pick up retries and anything left over.
+    """
+    _execute(("delete", _key(DRAIN_FLAG_KEY)))
+
+    _promote_due_retries()
+
+    account = get_outgoing_account()
+    if not account:
+        # No SMTP configured; keep the queue until one is
+        return {"sent": 0, "pending": _queue_depth()}
+
+    sender = frappe.db.get_value("Email Account", account, "email_id")
+
+    batch_size = _conf_int("parlo_welcome_email_batch_size", DEFAULT_BATCH_SIZE)
+    sent = 0
+    batches = 0
+    rate_limited = False
+    started = time.monotonic()
+
+    while max_batches is None or batches < max_batches:
+        rate_key = _rate_key(account)
+        granted = _acquire_rate(rate_key, batch_size)
+        if not granted:
+            rate_limited = True
+            break
+
+        items = _pop_batch(granted)
+        # Only spend the budget of the emails actually popped
+        _release_rate(rate_key, granted - len(items))
+        if not items:
+            break
+
+        batches += 1
+        for item in _render_batch(items):
+            try:
+                frappe.sendmail(
+                    recipients=[item["email"]],
+                    subject=item.pop("subject"),
+                    message=item.pop("message"),
+                    sender=sender,
+                    delayed=False
+                )
+                sent += 1
+            except Exception as e:
+                item.pop("subject", None)
+                item.pop("message", None)
+                _schedule_retry(item, e)
+
+        frappe.db.commit()
+
+    elapsed = time.monotonic() - started
+    if sent:
+        _incr_stat("sent", sent)
+    _execute(("hset", _key(STATS_KEY), "last_drain", json.dumps({
+        "at": frappe.utils.now(),
+        "sent": sent,
+        "seconds": round(elapsed, 3),
+        "per_second": round(sent / elapsed, 2) if elapsed else 0
+    })))
+
+    pending = _queue_depth()
+    if pending and rate_limited:
+        # Another job now would spin on an empty budget until the minute ends
+        _defer_drain()
+    elif pending:
+        # More arrived meanwhile; continue in a new job
+        schedule_drain()
+
+    return {"sent": sent, "pending": pending}
+
+
+@frappe.whitelist()
+def get_welcome_email_stats():
+    """Queue depth and delivery throughput of welcome emails"""
+    frappe.only_for("System Manager")
+
+    queue_depth, retry_depth, raw_stats = _execute(
+        ("llen", _key(QUEUE_KEY)),
+        ("zcard", _key(RETRY_KEY)),
+        ("hgetall", _key(STATS_KEY))
+    )
+    stats = {
+        (k.decode() if isinstance(k, bytes) else k): (v.decode() if isinstance(v, bytes) else v)
+        for k, v in (raw_stats or {}).items()
+    }
+    last_drain = json.loads(stats.pop("last_drain")) if stats.get("last_drain") else None
+
+    return {
+        "queue_depth": queue_depth,
+        "retry_depth": retry_depth,
+        "sent": int(stats.get("sent") or 0),
+        "retried": int(stats.get("retried") or 0),
+        "dropped": int(stats.get("dropped") or 0),
+        "last_drain": last_drain
+    }
@@ -1,5 +1,6 @@
 import frappe
 import json
+import time
 
 def get_context(context):
     context.no_cache = 1
@@ -35,7 +36,9 @@ def get_context(context):
 def authenticate():
     """Handle authentication from web form"""
     from parlo_license_manager.api.parlo_integration import authenticate_user
+    from parlo_license_manager.utils.auth_provisioning import record_latency
     
+    started = time.monotonic()
     data = json.loads(frappe.form_dict.data)
     email = data.get('email')
     phone = data.get('phone')
@@ -52,10 +55,13 @@ def authenticate():
     if result['success']:
         # Create session and redirect to dashboard
         if email:
+            session_started = time.monotonic()
             user = frappe.db.get_value("User", {"email": email}, "name")
             if user:
                 frappe.local.login_manager.login_as(user)
-        
+            record_latency("session", time.monotonic() - session_started)
+    
+    record_latency("total", time.monotonic() - started)
     return result
 
 @frappe.whitelist(allow_guest=True)
@@ -1,5 +1,19 @@
+import base64
+import json
+from collections import Counter
+
 import frappe
 from frappe import _
+from parlo_license_manager.utils.access_map import LICENSE_MANAGER, get_user_access
+from parlo_license_manager.utils.auth_provisioning import is_provisioning
+from parlo_license_manager.utils.license_stats import get_license_stats, on_leads_allocated
+from parlo_license_manager.utils.search_index import search_index, remove_from_index
+
+# Dashboard lists are paged with keyset pagination on (creation, name)
+DEFAULT_PAGE_LENGTH = 50
+MAX_PAGE_LENGTH = 200
+UNALLOCATED_LEAD_STATUSES = ("Converted", "Do Not Contact")
+SEARCH_LIMIT = 20
 
 def get_context(context):
     """Get context for dashboard page"""
@@ -9,6 +23,11 @@ def get_context(context):
         frappe.local.flags.redirect_location = "/parlo-auth"
         raise frappe.Redirect
     
+    # Organization access is still being set up after sign-in
+    if is_provisioning(frappe.session.user):
+        context.provisioning = True
+        return context
+    
     # Get organization from multiple sources
     organization_name = None
     
@@ -64,41 +83,16 @@ def get_context(context):
     context.org = org
     context.campaign_code = org.campaign_code
     
-    # Get allocated licenses (from Contacts)
-    allocated_licenses = frappe.db.sql("""
-        SELECT 
-            c.name, c.first_name, c.last_name,
-            ce.email_id, cp.phone, 
-            c.license_number, c.license_allocated_date
-        FROM `tabContact` c
-        LEFT JOIN `tabContact Email` ce ON ce.parent = c.name AND ce.is_primary = 1
-        LEFT JOIN `tabContact Phone` cp ON cp.parent = c.name AND cp.is_primary_phone = 1
-        WHERE c.license_organization = %s
-        AND c.has_parlo_license = 1
-        ORDER BY c.creation DESC
-    """, organization_name, as_dict=True)
-    
-    # Get unallocated leads (from Leads filtered by campaign code)
-    unallocated_leads = []
-    if org.campaign_code:
-        unallocated_leads = frappe.get_all("Lead", 
-            filters={
-                "campaign_code": org.campaign_code,
-                "status": ["not in", ["Converted", "Do Not Contact"]]
-            },
-            fields=[
-                "name", "lead_name", "email_id", "mobile_no",
-                "parlo_verified", "creation"
-            ],
-            order_by="creation desc"
-        )
-    
-    # Statistics
-    context.total_licenses = org.total_licenses or 0
-    context.used_licenses = org.used_licenses or 0
-    context.available_licenses = org.available_licenses or 0
-    context.allocated_licenses = allocated_licenses
-    context.unallocated_leads = unallocated_leads
+    # Statistics come from the license stats cache; the allocated and
+    # unallocated lists are loaded page by page from get_allocated_licenses
+    # / get_unallocated_leads. The tab counts (allocated_contacts,
+    # unallocated_leads) are counted with the same conditions as those lists.
+    stats = get_license_stats(organization_name)
+    context.total_licenses = stats["total_licenses"]
+    context.used_licenses = stats["used_licenses"]
+    context.available_licenses = stats["available_licenses"]
+    context.allocated_contacts = stats["allocated_contacts"]
+    context.unallocated_leads = stats["unallocated_leads"]
     
     # Add percentage calculations
     if context.total_licenses > 0:
@@ -120,93 +114,161 @@ def get_context(context):
 def get_user_organizations():
     """Get organizations the current user has access to"""
     
-    user = frappe.session.user
-    
-    # Check if user is System Manager
+    # System Manager sees every licensed organization
     if "System Manager" in frappe.get_roles():
         return frappe.get_all("Organization", 
                              filters={"has_parlo_license": 1},
                              pluck="name")
     
-    # Check if user has License Manager role
-    if "License Manager" in frappe.get_roles():
-        # Get organizations where user is a license manager
-        orgs = frappe.db.sql("""
-            SELECT DISTINCT o.name 
-            FROM `tabOrganization` o
-            WHERE o.has_parlo_license = 1
-            AND (
-                o.license_managers LIKE %s
-                OR EXISTS (
-                    SELECT 1 FROM `tabHas Role` hr
-                    WHERE hr.parent = %s
-                    AND hr.role = 'License Manager'
-                )
-            )
-        """, (f"%{user}%", user), as_list=True)
-        
-        return [org[0] for org in orgs] if orgs else []
-    
-    # For Organization Members - get from contact links
-    if "Organization Member" in frappe.get_roles() or True:  # Allow for all authenticated users
-        # First check if user has a contact
-        contact = frappe.db.get_value("Contact", {"user": user}, "name")
-        
-        if contact:
-            # Get organizations from Dynamic Links
-            orgs = frappe.db.sql("""
-                SELECT DISTINCT dl.link_name
-                FROM `tabDynamic Link` dl
-                WHERE dl.parent = %s
-                AND dl.link_doctype = 'Organization'
-                AND EXISTS (
-                    SELECT 1 FROM `tabOrganization` o 
-                    WHERE o.name = dl.link_name 
-                    AND o.has_parlo_license = 1
-                )
-            """, contact, as_list=True)
-            
-            if orgs:
-                return [org[0] for org in orgs]
-        
-        # Also check Contact Links table (in case using different structure)
-        orgs = frappe.db.sql("""
-            SELECT DISTINCT cl.link_name
-            FROM `tabContact` c
-            JOIN `tabContact Link` cl ON cl.parent = c.name
-            WHERE c.user = %s
-            AND cl.link_doctype = 'Organization'
-            AND EXISTS (
-                SELECT 1 FROM `tabOrganization` o 
-                WHERE o.name = cl.link_name 
-                AND o.has_parlo_license = 1
-            )
-        """, user, as_list=True)
-        
-        if orgs:
-            return [org[0] for org in orgs]
-    
-    return []
+    # License managers and members (from contact links) via the access map
+    return sorted(get_user_access())
 
 def is_organization_admin(organization_name):
     """Check if current user is admin for the organization"""
     
-    user = frappe.session.user
-    
     if "System Manager" in frappe.get_roles():
         return True
     
-    if "License Manager" in frappe.get_roles():
-        org = frappe.get_doc("Organization", organization_name)
-        # Check if user is in license_managers field
-        if org.license_managers and user in org.license_managers:
-            return True
+    access = get_user_access().get(organization_name)
+    return bool(access and access["role"] == LICENSE_MANAGER)
+
+def check_organization_access(organization):
+    """Throw unless the current user may view the organization's dashboard"""
+    if "System Manager" in frappe.get_roles():
+        return
+    
+    if organization not in get_user_organizations():
+        frappe.throw(_("You don't have access to this organization"), frappe.PermissionError)
+
+def encode_cursor(row):
+    """Opaque cursor pointing after row, from its (creation, name)"""
+    value = json.dumps([str(row["creation"]), row["name"]])
+    return base64.urlsafe_b64encode(value.encode()).decode()
+
+def decode_cursor(cursor):
+    """(creation, name) from a cursor made by encode_cursor"""
+    try:
+        creation, name = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+    except Exception:
+        frappe.throw(_("Invalid cursor"))
+    return creation, name
+
+def _page_args(cursor, page_length, sort_order):
+    """
+    Keyset condition, ORDER BY and LIMIT for a (creation, name) page
+    Returns: (condition, values, order_by, limit)
+    """
+    page_length = min(max(frappe.utils.cint(page_length) or DEFAULT_PAGE_LENGTH, 1), MAX_PAGE_LENGTH)
+    descending = (sort_order or "desc").lower() != "asc"
+    op = "<" if descending else ">"
+    direction = "DESC" if descending else "ASC"
+    
+    condition, values = "", ()
+    if cursor:
+        creation, name = decode_cursor(cursor)
+        condition = f"AND ({{alias}}.creation {op} %s OR ({{alias}}.creation = %s AND {{alias}}.name {op} %s))"
+        values = (creation, creation, name)
+    
+    order_by = f"{{alias}}.creation {direction}, {{alias}}.name {direction}"
+    return condition, values, order_by, page_length
+
+def like_prefix(text):
+    """LIKE pattern matching values that start with text (index friendly)"""
+    text = text.strip().replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"{text}%"
+
+def _page_response(rows, page_length):
+    """Trim the look-ahead row and build the next cursor"""
+    has_more = len(rows) > page_length
+    rows = rows[:page_length]
+    return {
+        "rows": rows,
+        "has_more": has_more,
+        "next_cursor": encode_cursor(rows[-1]) if has_more else None
+    }
+
+@frappe.whitelist()
+def get_allocated_licenses(organization, cursor=None, page_length=DEFAULT_PAGE_LENGTH, sort_order="desc", filter_text=None):
+    """
+    One page of contacts holding a license in the organization
+    filter_text matches the start of the license number or full name
+    Returns: rows, has_more and next_cursor for the following page
+    """
+    check_organization_access(organization)
+    
+    condition, values, order_by, page_length = _page_args(cursor, page_length, sort_order)
+    
+    filter_condition, filter_values = "", ()
+    if filter_text and filter_text.strip():
+        prefix = like_prefix(filter_text)
+        filter_condition = "AND (c.license_number LIKE %s OR c.full_name LIKE %s)"
+        filter_values = (prefix, prefix)
     
-    return False
+    rows = frappe.db.sql(f"""
+        SELECT 
+            c.name, c.first_name, c.last_name,
+            ce.email_id, cp.phone, 
+            c.license_number, c.license_allocated_date, c.creation
+        FROM `tabContact` c
+        LEFT JOIN `tabContact Email` ce ON ce.parent = c.name AND ce.is_primary = 1
+        LEFT JOIN `tabContact Phone` cp ON cp.parent = c.name AND cp.is_primary_phone = 1
+        WHERE c.license_organization = %s
+        AND c.has_parlo_license = 1
+        {filter_condition}
+        {condition.format(alias="c")}
+        ORDER BY {order_by.format(alias="c")}
+        LIMIT %s
+    """, (organization, *filter_values, *values, page_length + 1), as_dict=True)
+    
+    return _page_response(rows, page_length)
+
+@frappe.whitelist()
+def get_unallocated_leads(organization, cursor=None, page_length=DEFAULT_PAGE_LENGTH, sort_order="desc",
+        filter_text=None, parlo_verified=None):
+    """
+    One page of leads with the organization's campaign code and no license
+    filter_text matches the start of the lead name, email or mobile
+    Returns: rows, has_more and next_cursor for the following page
+    """
+    check_organization_access(organization)
+    
+    campaign_code = frappe.db.get_value("Organization", organization, "campaign_code")
+    if not campaign_code:
+        return {"rows": [], "has_more": False, "next_cursor": None}
+    
+    condition, values, order_by, page_length = _page_args(cursor, page_length, sort_order)
+    
+    filter_condition, filter_values = "", ()
+    if filter_text and filter_text.strip():
+        prefix = like_prefix(filter_text)
+        filter_condition = "AND (l.lead_name LIKE %s OR l.email_id LIKE %s OR l.mobile_no LIKE %s)"
+        filter_values = (prefix, prefix, prefix)
+    
+    if parlo_verified not in (None, ""):
+        filter_condition += " AND l.parlo_verified = %s"
+        filter_values += (frappe.utils.cint(parlo_verified),)
+    
+    rows = frappe.db.sql(f"""
+        SELECT l.name, l.lead_name, l.email_id, l.mobile_no, l.parlo_verified, l.creation
+        FROM `tabLead` l
+        WHERE l.campaign_code = %s
+        AND l.status NOT IN ({', '.join(['%s'] * len(UNALLOCATED_LEAD_STATUSES))})
+        {filter_condition}
+        {condition.format(alias="l")}
+        ORDER BY {order_by.format(alias="l")}
+        LIMIT %s
+    """, (campaign_code, *UNALLOCATED_LEAD_STATUSES, *filter_values, *values, page_length + 1), as_dict=True)
+    
+    return _page_response(rows, page_length)
 
 @frappe.whitelist()
 def search_contacts_and_leads(search_term, organization):
-    """Search for contacts and leads by email or phone"""
+    """
+    Search contacts and leads by email, phone or name
+    Email and name parts match by prefix, phone numbers by suffix, using
+    the Parlo Search Term index
+    """
+    check_organization_access(organization)
     
     results = {
         "allocated": [],
@@ -214,57 +276,35 @@ def search_contacts_and_leads(search_term, organization):
     }
     
     # Search in Contacts (allocated)
-    if "@" in search_term:
-        # Email search
-        allocated = frappe.db.sql("""
+    contact_names = search_index("Contact", organization, search_term, limit=SEARCH_LIMIT)
+    if contact_names:
+        results["allocated"] = frappe.db.sql(f"""
             SELECT c.name, c.first_name, c.last_name,
                    ce.email_id as email_id, cp.phone as mobile_no,
                    c.license_number
             FROM `tabContact` c
-            JOIN `tabContact Email` ce ON ce.parent = c.name
-            LEFT JOIN `tabContact Phone` cp ON cp.parent = c.name AND cp.is_primary_phone = 1
-            WHERE c.license_organization = %s
-            AND c.has_parlo_license = 1
-            AND ce.email_id LIKE %s
-            LIMIT 20
-        """, (organization, f"%{search_term}%"), as_dict=True)
-    else:
-        # Phone search
-        allocated = frappe.db.sql("""
-            SELECT c.name, c.first_name, c.last_name,
-                   ce.email_id as email_id, cp.phone as mobile_no,
-                   c.license_number
-            FROM `tabContact` c
-            JOIN `tabContact Phone` cp ON cp.parent = c.name
             LEFT JOIN `tabContact Email` ce ON ce.parent = c.name AND ce.is_primary = 1
-            WHERE c.license_organization = %s
+            LEFT JOIN `tabContact Phone` cp ON cp.parent = c.name AND cp.is_primary_phone = 1
+            WHERE c.name IN ({', '.join(['%s'] * len(contact_names))})
+            AND c.license_organization = %s
             AND c.has_parlo_license = 1
-            AND cp.phone LIKE %s
-            LIMIT 20
-        """, (organization, f"%{search_term}%"), as_dict=True)
-    
-    results["allocated"] = allocated
+        """, (*contact_names, organization), as_dict=True)
     
     # Search in Leads (unallocated)
-    org = frappe.get_doc("Organization", organization)
-    
-    if org.campaign_code:
-        lead_filters = {
-            "campaign_code": org.campaign_code,
-            "status": ["not in", ["Converted", "Do Not Contact"]]
-        }
-        
-        if "@" in search_term:
-            lead_filters["email_id"] = ["like", f"%{search_term}%"]
-        else:
-            lead_filters["mobile_no"] = ["like", f"%{search_term}%"]
-        
-        results["unallocated"] = frappe.get_all("Lead",
-            filters=lead_filters,
-            fields=["name", "lead_name", "email_id", "mobile_no", 
-                    "parlo_verified"],
-            limit=20
-        )
+    campaign_code = frappe.db.get_value("Organization", organization, "campaign_code")
+    
+    if campaign_code:
+        lead_names = search_index("Lead", campaign_code, search_term, limit=SEARCH_LIMIT)
+        if lead_names:
+            results["unallocated"] = frappe.get_all("Lead",
+                filters={
+                    "name": ["in", lead_names],
+                    "campaign_code": campaign_code,
+                    "status": ["not in", UNALLOCATED_LEAD_STATUSES]
+                },
+                fields=["name", "lead_name", "email_id", "mobile_no", 
+                        "parlo_verified"]
+            )
     
     return results
 
@@ -272,7 +312,7 @@ def search_contacts_and_leads(search_term, organization):
 def allocate_licenses_to_leads(lead_names, organization):
     """Allocate licenses to selected leads"""
     
-    from parlo_license_manager.utils.license_generator import allocate_license
+    from parlo_license_manager.utils.bulk_allocation import _allocate_licenses_bulk
     
     if isinstance(lead_names, str):
         import json
@@ -294,41 +334,71 @@ def allocate_licenses_to_leads(lead_names, organization):
         "failed": []
     }
     
+    # Load all selected leads in one query
+    leads = {
+        lead.name: lead
+        for lead in frappe.get_all("Lead",
+            filters={"name": ["in", lead_names]},
+            fields=["name", "lead_name", "email_id", "mobile_no", "status", "campaign_code"]
+        )
+    }
+    
+    to_allocate = []
     for lead_name in lead_names:
-        try:
-            lead = frappe.get_doc("Lead", lead_name)
-            
-            # Prepare contact data
-            name_parts = lead.lead_name.split() if lead.lead_name else [""]
-            contact_data = {
-                "first_name": name_parts[0] if name_parts else "",
-                "last_name": " ".join(name_parts[1:]) if len(name_parts) > 1 else "",
-                "email": lead.email_id,
-                "phone": lead.mobile_no
-            }
-            
-            result = allocate_license(contact_data, organization)
-            
-            if result["success"]:
-                # Update lead status
-                lead.status = "Converted"
-                lead.save(ignore_permissions=True)
-                results["success"].append({
-                    "lead": lead_name,
-                    "license": result["license_number"]
-                })
-            else:
-                results["failed"].append({
-                    "lead": lead_name,
-                    "error": result["error"]
-                })
-                
-        except Exception as e:
+        lead = leads.get(lead_name)
+        if not lead:
             results["failed"].append({
                 "lead": lead_name,
-                "error": str(e)
+                "error": f"Lead {lead_name} not found"
+            })
+            continue
+        to_allocate.append(lead)
+    
+    # Prepare contact data
+    contacts = []
+    for lead in to_allocate:
+        name_parts = lead.lead_name.split() if lead.lead_name else [""]
+        contacts.append({
+            "first_name": name_parts[0] if name_parts else "",
+            "last_name": " ".join(name_parts[1:]) if len(name_parts) > 1 else "",
+            "email": lead.email_id,
+            "phone": lead.mobile_no
+        })
+    
+    converted = []
+    for lead, result in zip(to_allocate, _allocate_licenses_bulk(contacts, organization)):
+        if result["success"]:
+            converted.append(lead.name)
+            results["success"].append({
+                "lead": lead.name,
+                "license": result["license_number"]
+            })
+        else:
+            results["failed"].append({
+                "lead": lead.name,
+                "error": result["error"]
             })
     
+    # Update lead status
+    if converted:
+        frappe.db.sql(f"""
+            UPDATE `tabLead`
+            SET status = 'Converted', modified = %s, modified_by = %s
+            WHERE name IN ({', '.join(['%s'] * len(converted))})
+        """, (frappe.utils.now(), frappe.session.user, *converted))
+        
+        # Converted leads are no longer searchable or counted as unallocated
+        remove_from_index("Lead", converted)
+
+        by_campaign = Counter(
+            leads[name].campaign_code for name in converted
+            if leads[name].status not in UNALLOCATED_LEAD_STATUSES
+        )
+        for campaign_code, count in by_campaign.items():
+            on_leads_allocated(campaign_code, count)
+
+        frappe.db.commit()
+    
     return results
 
 @frappe.whitelist()
@@ -369,9 +439,7 @@ def request_organization_access(organization, reason=""):
     
     # Send email to admins if SMTP configured
     if frappe.db.get_single_value("Email Account", "default_outgoing"):
-        admins = []
-        if org.license_managers:
-            admins = [u for u in org.license_managers.split(',')]
+        admins = [m.user for m in org.license_managers if m.user]
         
         if admins:
             frappe.sendmail(